@@ -0,0 +1,76 @@
+"""
+Loads the signed-in user together with their Profile and Subscription.
+
+`AccountBackend` replaces Django's per-request user lookup with one
+`select_related` query, so views, forms and the free-plan checks that read
+`request.user.profile` or `request.user.subscription` don't each add a query.
+
+When ACCOUNT_CACHE_TIMEOUT is set the loaded user is also kept in Django's
+cache. Saving the user, their profile (settings_update) or their
+subscription (PayFast ITNs, cancellations) drops the cached copy once the
+transaction commits. Bump CACHE_VERSION when the cached shape changes.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Profile, Subscription
+
+CACHE_VERSION = 1
+
+
+def _cache_key(user_id):
+    return f'account:v{CACHE_VERSION}:{user_id}'
+
+
+def load_user(user_id):
+    """Returns the user with their profile and subscription attached, or None."""
+    timeout = settings.ACCOUNT_CACHE_TIMEOUT
+    if timeout:
+        user = cache.get(_cache_key(user_id))
+        if user is not None:
+            return user
+    user = User.objects.select_related('profile', 'subscription').filter(pk=user_id).first()
+    if user is not None and timeout:
+        cache.set(_cache_key(user_id), user, timeout)
+    return user
+
+
+def invalidate(user_id):
+    if settings.ACCOUNT_CACHE_TIMEOUT:
+        transaction.on_commit(partial(cache.delete, _cache_key(user_id)))
+
+
+def invalidate_many(user_ids):
+    """Like `invalidate` for the users of a bulk update, which sends no signals."""
+    if settings.ACCOUNT_CACHE_TIMEOUT:
+        transaction.on_commit(partial(cache.delete_many, [_cache_key(user_id) for user_id in user_ids]))
+
+
+class AccountBackend(ModelBackend):
+    """The default model backend, with the profile and subscription loaded alongside the user."""
+
+    def get_user(self, user_id):
+        user = load_user(user_id)
+        return user if self.user_can_authenticate(user) else None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_for_user(sender, instance, **kwargs):
+    # Covers password changes (the session hash) and last_login updates too.
+    invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_for_account(sender, instance, **kwargs):
+    invalidate(instance.user_id)
@@ -1,11 +1,10 @@
 from django.contrib import admin
-from .models import Customer, Invoice, InvoiceItem, Quote, QuoteItem, Profile, Subscription, InventoryItem
-from django.utils import timezone
-from datetime import timedelta
+from .models import Customer, DocumentSequence, Invoice, InvoiceItem, Quote, QuoteItem, Profile, Subscription, InventoryItem, RecurringInvoice, RecurringInvoiceItem, deferred_totals
 from django.urls import reverse
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.utils.html import format_html
+from . import bulk_export, conversion
 
 # -------------------
 # Invoice Admin Setup
@@ -37,24 +36,37 @@ class InvoiceAdmin(admin.ModelAdmin):
         return format_html('<a class="button" href="{}" target="_blank">PDF</a>', url)
     pdf_link.short_description = 'Download PDF'
 
+    # Totals are stored columns, so with the customer joined in a page of rows is a single query.
+    list_select_related = ('customer',)
     # ✅ Use 'status' here as well
     list_filter = ('status', 'tax_rate', 'user')
     search_fields = ('customer__name', 'id')
     autocomplete_fields = ['customer'] # Makes customer selection easier
+    actions = ['download_pdfs_zip']
+
+    @admin.action(description="Download selected invoices as a ZIP of PDFs")
+    def download_pdfs_zip(self, request, queryset):
+        ids = list(queryset.order_by('invoice_date', 'id').values_list('pk', flat=True))
+        return bulk_export.zip_response('invoice', ids, 'invoices.zip', base_url=request.build_absolute_uri('/'))
+
+    def save_related(self, request, form, formsets, change):
+        # Recalculate the stored totals once for the whole inline formset.
+        with deferred_totals():
+            super().save_related(request, form, formsets, change)
 
     @admin.display(description='Customer Name', ordering='customer__name')
     def customer_name(self, obj):
         return obj.customer.name
 
-    @admin.display(description='Subtotal')
+    @admin.display(description='Subtotal', ordering='subtotal')
     def get_subtotal(self, obj):
         return f"R{obj.subtotal:.2f}"
 
-    @admin.display(description='Tax')
+    @admin.display(description='Tax', ordering='tax_amount')
     def get_tax(self, obj):
         return f"R{obj.tax_amount:.2f}"
 
-    @admin.display(description='Total')
+    @admin.display(description='Total', ordering='total')
     def get_total(self, obj):
         return f"R{obj.total:.2f}"
 
@@ -71,11 +83,22 @@ class QuoteAdmin(admin.ModelAdmin):
         'id', 'customer_name', 'quote_date', 'status',
         'get_total', 'is_converted', 'view_link'
     )
+    list_select_related = ('customer', 'invoice')
     list_filter = ('status', 'user')
     search_fields = ('customer__name', 'id')
-    actions = ['convert_to_invoice_action']
+    actions = ['convert_to_invoice_action', 'download_pdfs_zip']
     autocomplete_fields = ['customer']
 
+    @admin.action(description="Download selected quotes as a ZIP of PDFs")
+    def download_pdfs_zip(self, request, queryset):
+        ids = list(queryset.order_by('quote_date', 'id').values_list('pk', flat=True))
+        return bulk_export.zip_response('quote', ids, 'quotes.zip', base_url=request.build_absolute_uri('/'))
+
+    def save_related(self, request, form, formsets, change):
+        # Recalculate the stored totals once for the whole inline formset.
+        with deferred_totals():
+            super().save_related(request, form, formsets, change)
+
     @admin.display(boolean=True, description='Converted?')
     def is_converted(self, obj):
         return obj.invoice is not None
@@ -83,29 +106,8 @@ class QuoteAdmin(admin.ModelAdmin):
     @admin.action(description="Convert selected accepted quotes to invoices")
     def convert_to_invoice_action(self, request, queryset):
         # Filter for quotes that are accepted and not yet converted
-        eligible_quotes = queryset.filter(status='accepted', invoice__isnull=True)
-        converted_count = 0
-        for quote in eligible_quotes:
-            # Re-using the logic from your view is a good idea.
-            # For simplicity here, we'll just create the invoice.
-            new_invoice = Invoice.objects.create(
-                user=quote.user,
-                customer=quote.customer,
-                invoice_date=timezone.now().date(),
-                due_date=timezone.now().date() + timedelta(days=30),
-                tax_rate=quote.tax_rate
-            )
-            for item in quote.items.all():
-                InvoiceItem.objects.create(
-                    invoice=new_invoice,
-                    description=item.description,
-                    long_description=item.long_description,
-                    quantity=item.quantity,
-                    unit_price=item.unit_price
-                )
-            quote.invoice = new_invoice
-            quote.save()
-            converted_count += 1
+        eligible_ids = list(queryset.filter(status='accepted', invoice__isnull=True).values_list('pk', flat=True))
+        converted_count = len(conversion.convert_quotes(eligible_ids))
 
         if converted_count:
             self.message_user(request, f"{converted_count} invoice(s) created successfully.")
@@ -116,7 +118,7 @@ class QuoteAdmin(admin.ModelAdmin):
     def customer_name(self, obj):
         return obj.customer.name
 
-    @admin.display(description='Total')
+    @admin.display(description='Total', ordering='total')
     def get_total(self, obj):
         return f"R{obj.total:.2f}"
 
@@ -142,6 +144,27 @@ class InventoryItemAdmin(admin.ModelAdmin):
     list_filter = ('user',)
     ordering = ('name',)
 
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'document_type', 'next_number', 'updated_at')
+    search_fields = ('user__username',)
+    list_filter = ('document_type',)
+    list_select_related = ('user',)
+
+class RecurringInvoiceItemInline(admin.TabularInline):
+    model = RecurringInvoiceItem
+    extra = 1
+
+@admin.register(RecurringInvoice)
+class RecurringInvoiceAdmin(admin.ModelAdmin):
+    inlines = [RecurringInvoiceItemInline]
+    list_display = ('customer', 'user', 'frequency', 'next_run_date', 'end_date', 'run_count', 'is_active')
+    search_fields = ('customer__name', 'user__username')
+    list_filter = ('frequency', 'is_active')
+    list_select_related = ('customer', 'user')
+    autocomplete_fields = ['customer']
+    readonly_fields = ('run_count',)
+
 # -------------------
 # Register Models
 # -------------------
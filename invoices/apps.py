@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class InvoicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'invoices'
+
+    def ready(self):
+        from . import accounts  # noqa: F401 -- connects the account cache invalidation handlers
+        from . import entitlements  # noqa: F401 -- connects the entitlement cache invalidation handlers
+        from . import notifications  # noqa: F401 -- connects the unread-notification cache handlers
+        from . import prerender  # noqa: F401 -- connects the PDF pre-render signal handlers
+        from . import stats  # noqa: F401 -- connects the dashboard stats invalidation handlers
+        from . import usage  # noqa: F401 -- connects the free-plan usage counter handlers
@@ -1,10 +1,11 @@
-from .models import Notification
+from . import notifications
 
 def notifications_context(request):
     if request.user.is_authenticated:
-        unread_notifications = request.user.notifications.filter(is_read=False)
+        # Served from the cache; see notifications.py.
+        summary = notifications.get_unread_summary(request.user.pk)
         return {
-            'unread_notifications': unread_notifications,
-            'unread_notification_count': unread_notifications.count(),
+            'unread_notifications': summary['latest'],
+            'unread_notification_count': summary['count'],
         }
-    return {}
\ No newline at end of file
+    return {}
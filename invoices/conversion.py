@@ -0,0 +1,90 @@
+"""
+Quote-to-invoice conversion, shared by the quote page, the bulk endpoint and the admin action.
+
+Converting any number of quotes takes a fixed handful of queries. The quotes
+are locked and read in one query. Each owner's invoice numbers are reserved
+as one block. The invoices, their copied line items and the quote updates
+are each written in bulk. Everything happens in one transaction, so a
+failure leaves no half-converted quotes or used-up invoice numbers behind.
+Bulk writes send no signals, so the usage counters, dashboard stats and PDF
+pre-rendering that the signal handlers normally handle are updated here.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import prerender, stats, usage
+from .models import DocumentSequence, Invoice, InvoiceItem, Profile, Quote, QuoteItem
+from .totals import TOTAL_FIELDS, calculate_totals
+
+INVOICE_DUE_DAYS = 30
+BATCH_SIZE = 500
+
+
+def convert_quotes(quote_ids, limit=None):
+    """
+    Turns the given quotes that have no invoice yet into unpaid invoices with the same
+    customer, tax rate and line items, and marks the quotes accepted. `limit` caps how many
+    are converted (oldest first). Returns {quote id: new invoice}.
+    """
+    if limit is not None and limit <= 0:
+        return {}
+    today = timezone.now().date()
+    with transaction.atomic():
+        # Locking the quotes stops a concurrent conversion of the same quote from creating a second invoice.
+        quotes = list(
+            Quote.objects.select_for_update().filter(pk__in=quote_ids, invoice__isnull=True)
+            .order_by('quote_date', 'id').only('pk', 'user_id', 'customer_id', 'tax_rate')[:limit]
+        )
+        if not quotes:
+            return {}
+
+        items_by_quote = defaultdict(list)
+        for row in QuoteItem.objects.filter(quote__in=quotes).order_by('quote_id', 'id').values(
+            'quote_id', 'description', 'long_description', 'quantity', 'unit_price'
+        ):
+            items_by_quote[row.pop('quote_id')].append(row)
+
+        quotes_by_user = defaultdict(list)
+        for quote in quotes:
+            quotes_by_user[quote.user_id].append(quote)
+        prefixes = dict(Profile.objects.filter(user_id__in=quotes_by_user).values_list('user_id', 'invoice_prefix'))
+
+        invoices = {}
+        for user_id, user_quotes in quotes_by_user.items():
+            first_number = DocumentSequence.objects.allocate(user_id, 'invoice', count=len(user_quotes))
+            for offset, quote in enumerate(user_quotes):
+                items = items_by_quote[quote.pk]
+                totals = calculate_totals([(item['quantity'], item['unit_price']) for item in items], quote.tax_rate)
+                invoices[quote.pk] = Invoice(
+                    user_id=user_id,
+                    customer_id=quote.customer_id,
+                    invoice_number=f"{prefixes.get(user_id, 'INV-')}{first_number + offset}",
+                    invoice_date=today,
+                    due_date=today + timedelta(days=INVOICE_DUE_DAYS),
+                    tax_rate=quote.tax_rate,
+                    status='unpaid',
+                    **dict(zip(TOTAL_FIELDS, totals)),
+                )
+        Invoice.objects.bulk_create(invoices.values(), batch_size=BATCH_SIZE)
+
+        InvoiceItem.objects.bulk_create(
+            (InvoiceItem(invoice=invoices[quote_id], **item) for quote_id, items in items_by_quote.items() for item in items),
+            batch_size=BATCH_SIZE,
+        )
+
+        now = timezone.now()
+        for quote in quotes:
+            quote.invoice = invoices[quote.pk]
+            quote.status = 'accepted'
+            quote.updated_at = now
+        Quote.objects.bulk_update(quotes, ['invoice', 'status', 'updated_at'], batch_size=BATCH_SIZE)
+
+        for user_id, user_quotes in quotes_by_user.items():
+            usage.add(user_id, Invoice, len(user_quotes))
+            stats.invalidate(user_id)
+        for invoice in invoices.values():
+            prerender.schedule(invoice)
+    return invoices
@@ -0,0 +1,117 @@
+"""
+What a user's plan entitles them to, cached per user.
+
+`get(user_id)` returns an Entitlement: whether the user has Pro and, on the
+Free Plan, the per-model item limit. The free-plan checks in usage.py (and so
+the create views, imports and quote conversion) read it instead of the
+subscription row. A Pro entitlement is cached until the end of its paid
+period at the latest, so it never outlives the subscription even when the
+expiry job hasn't run yet. Saving or deleting a Subscription drops the
+cached copy once the transaction commits.
+
+`expire_lapsed` is the expiry job (the expire_subscriptions command). One
+UPDATE moves every Pro subscription whose paid period has ended to
+'expired'. update() sends no signals, so it drops the affected users'
+cached entitlements and accounts itself. Bump CACHE_VERSION when the cached
+shape changes.
+"""
+from datetime import datetime, time, timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import accounts
+from .models import Subscription
+
+CACHE_VERSION = 1
+
+
+class Entitlement:
+    """A user's plan as far as limits are concerned."""
+
+    def __init__(self, is_pro, valid_until=None):
+        self.is_pro = is_pro
+        self.valid_until = valid_until  # The last day of Pro access
+
+    @property
+    def plan(self):
+        return 'pro' if self.is_pro else 'free'
+
+    @property
+    def item_limit(self):
+        """How many objects of each kind the plan allows, or None for no limit."""
+        return None if self.is_pro else settings.FREE_PLAN_ITEM_LIMIT
+
+
+def _cache_key(user_id):
+    return f'entitlement:v{CACHE_VERSION}:{user_id}'
+
+
+def pro_subscriptions(today):
+    """Subscriptions that give Pro on `today`: paid up, whether or not they were cancelled since."""
+    return Subscription.objects.filter(plan='pro', status__in=Subscription.PRO_STATUSES, subscription_end_date__gte=today)
+
+
+def lapsed_subscriptions(today):
+    return Subscription.objects.filter(plan='pro', status__in=Subscription.PRO_STATUSES, subscription_end_date__lt=today)
+
+
+def compute(user_id, today=None):
+    """Works out a user's entitlement straight from the database."""
+    today = today or timezone.now().date()
+    valid_until = pro_subscriptions(today).filter(user_id=user_id).values_list('subscription_end_date', flat=True).first()
+    return Entitlement(valid_until is not None, valid_until)
+
+
+def _timeout(entitlement, now):
+    timeout = settings.ENTITLEMENT_CACHE_TIMEOUT
+    if entitlement.is_pro:
+        ends = datetime.combine(entitlement.valid_until + timedelta(days=1), time.min, tzinfo=now.tzinfo)
+        timeout = min(timeout, max(int((ends - now).total_seconds()), 1))
+    return timeout
+
+
+def get(user_id):
+    """Returns a user's cached entitlement, working it out on a miss."""
+    key = _cache_key(user_id)
+    entitlement = cache.get(key)
+    if entitlement is None:
+        now = timezone.now()
+        entitlement = compute(user_id, now.date())
+        cache.set(key, entitlement, _timeout(entitlement, now))
+    return entitlement
+
+
+def invalidate(user_id):
+    """Drops a user's cached entitlement once the current transaction commits, so a concurrent miss can't re-cache old data."""
+    transaction.on_commit(partial(cache.delete, _cache_key(user_id)))
+
+
+def invalidate_many(user_ids):
+    transaction.on_commit(partial(cache.delete_many, [_cache_key(user_id) for user_id in user_ids]))
+
+
+def expire_lapsed(today=None):
+    """Marks every Pro subscription whose paid period ended before `today` as expired. Returns how many it changed."""
+    today = today or timezone.now().date()
+    with transaction.atomic():
+        # Locking the rows first keeps a renewal that arrives meanwhile from being expired, and tells
+        # us whose caches to drop.
+        user_ids = list(lapsed_subscriptions(today).select_for_update().values_list('user_id', flat=True))
+        if not user_ids:
+            return 0
+        expired = lapsed_subscriptions(today).update(status='expired')
+        invalidate_many(user_ids)
+        accounts.invalidate_many(user_ids)
+    return expired
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_for_subscription(sender, instance, **kwargs):
+    invalidate(instance.user_id)
@@ -0,0 +1,93 @@
+"""
+CSV/XLSX exports of a user's invoices or quotes, one row per document or one per line item.
+
+Rows are read with `values_list(...).iterator(chunk_size=...)`, which joins the
+customer (and, for lines, the document) in the same query the way
+select_related would. The rows are written out as they arrive, through a
+StreamingHttpResponse or to a file by the export_data command. Memory stays
+flat, and the download starts before the query finishes. Document totals come
+from the stored columns. Line totals are computed in SQL and rounded to the
+cent. The column names
+match the import (see imports.py), so an invoice lines export can be imported
+again.
+"""
+from decimal import ROUND_HALF_UP
+
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.http import StreamingHttpResponse
+
+from . import spreadsheets
+from .models import Invoice, InvoiceItem, Quote, QuoteItem
+from .totals import CENTS
+
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class DocumentExport:
+    """How to export one document type: its models and the fields its rows are made of."""
+
+    def __init__(self, model, item_model, parent_field, number_field, date_field, end_date_field):
+        self.model = model
+        self.item_model = item_model
+        self.parent_field = parent_field
+        self.document_fields = [number_field, 'customer__name', date_field, end_date_field, 'status', 'tax_rate']
+        self.date_field = date_field
+
+    def headers(self, lines):
+        headers = [field.replace('customer__name', 'customer') for field in self.document_fields]
+        return headers + (['description', 'long_description', 'quantity', 'unit_price', 'line_total'] if lines else ['subtotal', 'tax_amount', 'total'])
+
+    def rows(self, user, start=None, end=None, lines=False):
+        """Returns an iterator over the export's rows (tuples in `headers` order), oldest first."""
+        if not lines:
+            queryset = self.model.objects.filter(user=user)
+            prefix, fields = '', [*self.document_fields, 'subtotal', 'tax_amount', 'total']
+            ordering = (self.date_field, 'id')
+        else:
+            prefix = f'{self.parent_field}__'
+            queryset = self.item_model.objects.filter(**{f'{prefix}user': user}).annotate(
+                line_total=ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=20, decimal_places=4)),
+            )
+            fields = [f'{prefix}{field}' for field in self.document_fields]
+            fields += ['description', 'long_description', 'quantity', 'unit_price', 'line_total']
+            ordering = (f'{prefix}{self.date_field}', self.parent_field, 'id')
+        if start:
+            queryset = queryset.filter(**{f'{prefix}{self.date_field}__gte': start})
+        if end:
+            queryset = queryset.filter(**{f'{prefix}{self.date_field}__lte': end})
+        rows = queryset.order_by(*ordering).values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+        if lines:
+            # SQL gives the unrounded product; show it to the cent as the documents do.
+            return (row[:-1] + (row[-1].quantize(CENTS, rounding=ROUND_HALF_UP),) for row in rows)
+        return rows
+
+
+EXPORTS = {
+    'invoices': DocumentExport(Invoice, InvoiceItem, 'invoice', 'invoice_number', 'invoice_date', 'due_date'),
+    'quotes': DocumentExport(Quote, QuoteItem, 'quote', 'quote_number', 'quote_date', 'valid_until'),
+}
+
+
+def stream(kind, user, file_format, start=None, end=None, lines=False):
+    """Yields the export as chunks of CSV or XLSX bytes."""
+    export = EXPORTS[kind]
+    headers, rows = export.headers(lines), export.rows(user, start, end, lines)
+    if file_format == 'xlsx':
+        return spreadsheets.write_xlsx(headers, rows, sheet_name=f"{kind.title()}{' lines' if lines else ''}")
+    return spreadsheets.write_csv(headers, rows)
+
+
+def filename(kind, file_format, start=None, end=None, lines=False):
+    parts = [kind + ('-lines' if lines else ''), start and start.isoformat(), end and end.isoformat()]
+    return f"{'_'.join(part for part in parts if part)}.{file_format}"
+
+
+def response(kind, user, file_format, start=None, end=None, lines=False):
+    """A streaming download of the export."""
+    response = StreamingHttpResponse(stream(kind, user, file_format, start, end, lines), content_type=CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename(kind, file_format, start, end, lines)}"'
+    return response
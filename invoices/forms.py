@@ -1,7 +1,10 @@
 from django import forms
 from decimal import Decimal
-from .models import Customer, InventoryItem, Quote, Invoice, Profile, InvoiceItem, QuoteItem
+from .models import Customer, DocumentSequence, InventoryItem, Quote, Invoice, Profile, InvoiceItem, QuoteItem, RecurringInvoice
 from django.contrib.auth.forms import UserCreationForm
+from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.functional import cached_property
 
 
 class SignUpForm(UserCreationForm):
@@ -39,6 +42,11 @@ class InventoryItemForm(forms.ModelForm):
 
 class ProfileForm(forms.ModelForm):
     """Form for user-specific settings."""
+    # The next numbers live in DocumentSequence rows, not on the profile; they are only written when changed.
+    invoice_next_number = forms.IntegerField(min_value=1, help_text="The next number to be used for a new invoice.")
+    quote_next_number = forms.IntegerField(min_value=1, help_text="The next number to be used for a new quote.")
+    NEXT_NUMBER_FIELDS = {'invoice_next_number': 'invoice', 'quote_next_number': 'quote'}
+
     class Meta:
         model = Profile
         exclude = ['user'] # Let the view handle the user
@@ -54,12 +62,20 @@ class ProfileForm(forms.ModelForm):
         # Format the numbering fields to have leading zeros for display
         if self.instance:
             # We use TextInput to allow for the custom string format.
-            # Django's ModelForm is smart enough to convert "0001" back to an integer 1 on save.
-            self.fields['invoice_next_number'].widget = forms.TextInput(attrs={'class': 'form-control'})
-            self.initial['invoice_next_number'] = f"{self.instance.invoice_next_number:04d}"
-
-            self.fields['quote_next_number'].widget = forms.TextInput(attrs={'class': 'form-control'})
-            self.initial['quote_next_number'] = f"{self.instance.quote_next_number:04d}"
+            # The IntegerField converts "0001" back to 1 on save.
+            self.next_numbers = DocumentSequence.objects.next_numbers(self.instance.user_id)
+            for field_name, document_type in self.NEXT_NUMBER_FIELDS.items():
+                self.fields[field_name].widget = forms.TextInput(attrs={'class': 'form-control'})
+                self.initial[field_name] = f"{self.next_numbers[document_type]:04d}"
+
+    def save(self, commit=True):
+        profile = super().save(commit=commit)
+        if commit:
+            for field_name, document_type in self.NEXT_NUMBER_FIELDS.items():
+                # Compare numbers, not the zero-padded text, so an unchanged "0042" isn't written back.
+                if self.cleaned_data[field_name] != self.next_numbers[document_type]:
+                    DocumentSequence.objects.set_next_number(profile.user_id, document_type, self.cleaned_data[field_name])
+        return profile
 
 
 class InvoiceForm(forms.ModelForm):
@@ -183,4 +199,183 @@ class QuoteItemForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for field in self.fields.values():
-            field.widget.attrs.update({'class': 'form-control'})
\ No newline at end of file
+            field.widget.attrs.update({'class': 'form-control'})
+
+class RecurringInvoiceForm(forms.ModelForm):
+    """The schedule of a recurring invoice. The customer, tax rate and line items come from the invoice it was made from."""
+
+    class Meta:
+        model = RecurringInvoice
+        fields = ['frequency', 'next_run_date', 'end_date', 'due_days', 'is_active']
+        labels = {
+            'next_run_date': 'Next invoice date',
+            'end_date': 'Last invoice date (optional)',
+            'due_days': 'Payment terms (days)',
+            'is_active': 'Active',
+        }
+        widgets = {
+            'next_run_date': forms.DateInput(attrs={'type': 'date'}),
+            'end_date': forms.DateInput(attrs={'type': 'date'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs.update({'class': 'form-check-input' if isinstance(field, forms.BooleanField) else 'form-control'})
+
+    def clean_next_run_date(self):
+        next_run_date = self.cleaned_data['next_run_date']
+        if 'next_run_date' in self.changed_data and next_run_date < timezone.now().date():
+            raise forms.ValidationError("Choose today or a later date.")
+        return next_run_date
+
+    def clean(self):
+        cleaned_data = super().clean()
+        next_run_date, end_date = cleaned_data.get('next_run_date'), cleaned_data.get('end_date')
+        if next_run_date and end_date and end_date < next_run_date:
+            self.add_error('end_date', "The last invoice date can't be before the next invoice date.")
+        return cleaned_data
+
+    def save(self, commit=True):
+        # A new frequency or date starts the schedule afresh from the next invoice date.
+        if self.instance._state.adding or {'frequency', 'next_run_date'} & set(self.changed_data):
+            self.instance.restart(self.cleaned_data['next_run_date'])
+        return super().save(commit)
+
+
+class InvoiceImportForm(forms.Form):
+    """The invoice-level columns of an invoice import row; the line item columns are checked with InvoiceItemForm."""
+    DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%Y-%m-%dT%H:%M:%S']
+
+    invoice_number = forms.CharField(max_length=50, required=False)
+    customer = forms.CharField(max_length=200)
+    invoice_date = forms.DateField(input_formats=DATE_FORMATS)
+    due_date = forms.DateField(input_formats=DATE_FORMATS, required=False)
+    status = forms.ChoiceField(choices=Invoice.STATUS_CHOICES, required=False)
+    tax_rate = forms.DecimalField(max_digits=5, decimal_places=2, min_value=0, required=False)
+
+
+class ExportForm(forms.Form):
+    """Options for the export page, submitted with GET so the download link can be bookmarked."""
+    KIND_CHOICES = (('invoices', 'Invoices'), ('quotes', 'Quotes'))
+    DETAIL_CHOICES = (('documents', 'One row per document, with totals'), ('lines', 'One row per line item'))
+    FORMAT_CHOICES = (('xlsx', 'Excel (.xlsx)'), ('csv', 'CSV'))
+
+    kind = forms.ChoiceField(choices=KIND_CHOICES, label="What are you exporting?")
+    detail = forms.ChoiceField(choices=DETAIL_CHOICES, label="Rows")
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, label="File format")
+    date_from = forms.DateField(required=False, label="Dated from", widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, label="Dated to", widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            field.widget.attrs.update({'class': 'form-select' if isinstance(field, forms.ChoiceField) else 'form-control'})
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("The start date must be on or before the end date.")
+        return cleaned_data
+
+
+class ImportForm(forms.Form):
+    """Upload form for the bulk import page."""
+    KIND_CHOICES = (('customers', 'Customers'), ('inventory', 'Inventory items'), ('invoices', 'Invoices'))
+
+    kind = forms.ChoiceField(choices=KIND_CHOICES, label="What are you importing?")
+    file = forms.FileField(label="CSV or Excel (.xlsx) file")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['kind'].widget.attrs.update({'class': 'form-select'})
+        self.fields['file'].widget.attrs.update({'class': 'form-control', 'accept': '.csv,.xlsx'})
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Upload a .csv or .xlsx file.")
+        return upload
+
+
+class LoadedItemField(forms.ModelChoiceField):
+    """An item form's hidden id, looked up in the items the formset already loaded instead of with a query per row."""
+
+    def __init__(self, formset, *args, **kwargs):
+        self.formset = formset
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.formset.items_by_pk[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
+
+class BaseItemFormSet(forms.BaseInlineFormSet):
+    """Line item formset whose validation costs one query for all the rows."""
+
+    @cached_property
+    def items_by_pk(self):
+        return {item.pk: item for item in self.get_queryset()}
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self._pk_field.name
+        field = form.fields[name]
+        form.fields[name] = LoadedItemField(self, field.queryset, initial=field.initial, required=False, widget=field.widget)
+
+
+# Built once at import rather than on every request.
+InvoiceItemFormSet = forms.inlineformset_factory(Invoice, InvoiceItem, form=InvoiceItemForm, formset=BaseItemFormSet, extra=1, can_delete=True)
+QuoteItemFormSet = forms.inlineformset_factory(Quote, QuoteItem, form=QuoteItemForm, formset=BaseItemFormSet, extra=1, can_delete=True)
+
+
+class DocumentFilterForm(forms.Form):
+    """
+    GET filters for the invoice and quote lists, applied in SQL by `filter_queryset`. The customer
+    select only renders the picked customer; the rest are searched as you type (see base.html), so
+    the page doesn't grow with the number of customers.
+    """
+    status = forms.ChoiceField(required=False)
+    customer = forms.IntegerField(required=False, widget=forms.Select(attrs={'data-search-url': reverse_lazy('customer_list')}))
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')
+        status_choices = kwargs.pop('status_choices')
+        super().__init__(*args, **kwargs)
+        self.fields['status'].choices = [('', 'All statuses'), *status_choices]
+        customer_id = self.data.get(self.add_prefix('customer'), '')
+        # Only the picked customer is looked up (and it must be the user's own).
+        self.picked_customer = dict(
+            Customer.objects.filter(user=user, pk=customer_id).values_list('pk', 'name')[:1] if customer_id.isdigit() else []
+        )
+        self.fields['customer'].widget.choices = [('', 'All customers'), *self.picked_customer.items()]
+        for field in self.fields.values():
+            field.widget.attrs.update({'class': 'form-select form-select-sm' if isinstance(field.widget, forms.Select) else 'form-control form-control-sm'})
+
+    def clean_customer(self):
+        customer_id = self.cleaned_data['customer']
+        if customer_id is not None and customer_id not in self.picked_customer:
+            raise forms.ValidationError("Select one of your customers.")
+        return customer_id
+
+    def filter_queryset(self, queryset, date_field):
+        """Narrows a queryset by the submitted filters; invalid filters are ignored."""
+        if not self.is_valid():
+            return queryset
+        data = self.cleaned_data
+        if data['status']:
+            queryset = queryset.filter(status=data['status'])
+        if data['customer']:
+            queryset = queryset.filter(customer_id=data['customer'])
+        if data['date_from']:
+            queryset = queryset.filter(**{f'{date_field}__gte': data['date_from']})
+        if data['date_to']:
+            queryset = queryset.filter(**{f'{date_field}__lte': data['date_to']})
+        return queryset
@@ -0,0 +1,63 @@
+"""
+Conditional GET support for invoice/quote PDFs and the public quote page.
+
+Validators come from a single query over the document's `updated_at` and
+those of its customer and owner's profile, plus a hash of the templates, so
+a repeat download can be answered with 304 Not Modified before any template
+or PDF work happens.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.template.loader import get_template
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+from . import pdf_cache
+
+
+@lru_cache(maxsize=None)
+def _templates_version(template_names):
+    digest = hashlib.sha256()
+    for name in template_names:
+        digest.update(get_template(name).template.source.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def document_validators(queryset, template_names):
+    """
+    Returns (etag, last_modified) for the single document in `queryset`, or None if it does not exist.
+    `template_names` are the templates the response is rendered from.
+    """
+    row = queryset.values(
+        'pk', 'updated_at', 'customer__updated_at', 'user__profile__updated_at', 'user__first_name', 'user__last_name',
+    ).first()
+    if row is None:
+        return None
+    last_modified = max(row['updated_at'], row['customer__updated_at'], row['user__profile__updated_at'])
+    if len(template_names) == 1 and template_names[0].endswith('_pdf.html'):
+        # PDFs also depend on their base template and stylesheet, which the PDF cache already hashes.
+        templates = pdf_cache.template_version(template_names[0])
+    else:
+        templates = _templates_version(tuple(template_names))
+    version = [queryset.model._meta.model_name, sorted(row.items()), templates]
+    etag = hashlib.sha256(repr(version).encode('utf-8')).hexdigest()[:32]
+    return quote_etag(etag), last_modified
+
+
+def not_modified(request, validators):
+    """Returns a 304 (or 412) response if the client's copy is current, otherwise None."""
+    etag, last_modified = validators
+    return get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+
+
+def add_validators(response, validators, public=False):
+    """Adds ETag, Last-Modified and a revalidate-every-time Cache-Control header to a response."""
+    etag, last_modified = validators
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    if public:
+        patch_cache_control(response, public=True, no_cache=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,233 @@
+"""
+Bulk import of customers, inventory items and historical invoices from CSV or XLSX files.
+
+Rows stream from the file (see spreadsheets.py) and are validated with the
+same form rules as the create pages. They are inserted CHUNK_SIZE at a time
+with bulk_create, one transaction per chunk, so memory stays flat however
+long the file is. A bad row is reported with its row number and skipped;
+it doesn't stop the import. Invoice numbers for each chunk's unnumbered
+invoices are reserved as one block from the user's sequence. bulk_create
+sends no signals, so the usage counters and dashboard stats are updated
+per chunk here.
+
+Invoice files have one row per line item. Consecutive rows with the same
+invoice_number make up one invoice, and its invoice-level columns
+(customer, dates, status, tax rate) come from the first of those rows.
+Rows without an invoice_number are single-line invoices numbered from the
+user's sequence, which each chunk first moves past the numbers it imports.
+An invoice_number the user already has, or that an earlier invoice in the
+file used, is rejected. Customers are matched by name, so import them first.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.db import transaction
+
+from . import spreadsheets, stats, usage
+from .forms import CustomerForm, InventoryItemForm, InvoiceImportForm, InvoiceItemForm
+from .models import Customer, DocumentSequence, InventoryItem, Invoice, InvoiceItem
+from .totals import TOTAL_FIELDS, calculate_totals
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 200
+INVOICE_DUE_DAYS = 30
+
+
+class ImportResult:
+    """What an import did: how many objects it created and which rows it rejected."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.created = 0
+        self.error_count = 0
+        self.errors = []  # (row number, [messages]), the first MAX_REPORTED_ERRORS only
+        self.over_limit = 0  # Valid rows left out because of the Free Plan limit
+        self.stopped_by = None  # Why the file stopped being readable part-way through, if it did
+
+    def add_error(self, row_number, messages):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, messages))
+
+    def add_form_errors(self, row_number, form):
+        self.add_error(row_number, [
+            f"{field.replace('_', ' ')}: {message}" if field != '__all__' else message
+            for field, messages in form.errors.items() for message in messages
+        ])
+
+
+def _validate(form_class, row):
+    """Returns a new form bound to the row, already cleaned. Each row gets its own form so nothing carries over."""
+    form = form_class(data=row)
+    form.is_valid()
+    return form
+
+
+def _finish_chunk(user, model, count):
+    usage.add(user.pk, model, count)
+    stats.invalidate(user.pk)
+
+
+def _import_objects(user, rows, form_class, model, result):
+    allowance = usage.remaining(user, model)
+    chunk = []
+
+    def flush():
+        with transaction.atomic():
+            model.objects.bulk_create(chunk)
+            _finish_chunk(user, model, len(chunk))
+        result.created += len(chunk)
+        chunk.clear()
+
+    for row_number, row in rows:
+        form = _validate(form_class, row)
+        if form.errors:
+            result.add_form_errors(row_number, form)
+            continue
+        if allowance is not None and result.created + len(chunk) >= allowance:
+            result.over_limit += 1
+            continue
+        obj = form.save(commit=False)
+        obj.user = user
+        chunk.append(obj)
+        if len(chunk) >= CHUNK_SIZE:
+            flush()
+    if chunk:
+        flush()
+
+
+def import_customers(user, rows, result):
+    _import_objects(user, rows, CustomerForm, Customer, result)
+
+
+def import_inventory(user, rows, result):
+    _import_objects(user, rows, InventoryItemForm, InventoryItem, result)
+
+
+def _invoice_groups(rows):
+    """Groups consecutive rows sharing an invoice_number; rows without one are groups of their own."""
+    counter = 0
+
+    def key(numbered_row):
+        nonlocal counter
+        number = (numbered_row[1].get('invoice_number') or '').strip()
+        if number:
+            return number
+        counter += 1
+        return counter
+
+    for _, group in groupby(rows, key=key):
+        yield list(group)
+
+
+def _sequence_number(number, prefix):
+    """Returns the sequence number in an imported invoice number like 'INV-12', or 0 if it doesn't follow the user's prefix."""
+    suffix = number[len(prefix):]
+    return int(suffix) if number.startswith(prefix) and suffix.isdigit() else 0
+
+
+def import_invoices(user, rows, result):
+    allowance = usage.remaining(user, Invoice)
+    customers = {name.casefold(): pk for pk, name in Customer.objects.filter(user=user).values_list('pk', 'name')}
+    prefix = user.profile.invoice_prefix
+    default_tax_rate = user.profile.vat_percentage
+    seen_numbers = set()
+    chunk = []  # (row number, invoice, items)
+
+    def flush():
+        with transaction.atomic():
+            numbers = [invoice.invoice_number for _, invoice, _ in chunk if invoice.invoice_number]
+            taken = set(Invoice.objects.filter(user=user, invoice_number__in=numbers).values_list('invoice_number', flat=True))
+            for row_number, invoice, _ in chunk:
+                if invoice.invoice_number in taken:
+                    result.add_error(row_number, [f"invoice number: You already have an invoice numbered {invoice.invoice_number}."])
+            chunk[:] = [entry for entry in chunk if entry[1].invoice_number not in taken]
+
+            # Move the sequence past this chunk's numbers before numbering the rest from it.
+            highest = max((_sequence_number(number, prefix) for number in numbers if number not in taken), default=0)
+            if highest:
+                DocumentSequence.objects.advance_past(user.pk, 'invoice', highest)
+            unnumbered = [invoice for _, invoice, _ in chunk if not invoice.invoice_number]
+            if unnumbered:
+                first_number = DocumentSequence.objects.allocate(user.pk, 'invoice', count=len(unnumbered))
+                for offset, invoice in enumerate(unnumbered):
+                    invoice.invoice_number = f"{prefix}{first_number + offset}"
+            Invoice.objects.bulk_create([invoice for _, invoice, _ in chunk])
+            for _, invoice, items in chunk:
+                for item in items:
+                    item.invoice = invoice
+            InvoiceItem.objects.bulk_create([item for _, _, items in chunk for item in items], batch_size=CHUNK_SIZE)
+            _finish_chunk(user, Invoice, len(chunk))
+        result.created += len(chunk)
+        chunk.clear()
+
+    for group in _invoice_groups(rows):
+        first_row_number, first_row = group[0]
+        header = _validate(InvoiceImportForm, first_row)
+        items, valid = [], not header.errors
+        if not valid:
+            result.add_form_errors(first_row_number, header)
+        else:
+            data = header.cleaned_data
+            customer_id = customers.get(data['customer'].casefold())
+            if customer_id is None:
+                result.add_error(first_row_number, [f"customer: No customer named '{data['customer']}'. Import your customers first."])
+                valid = False
+            elif data['invoice_number'] in seen_numbers:
+                result.add_error(first_row_number, [f"invoice number: {data['invoice_number']} is used by an earlier invoice in this file."])
+                valid = False
+        for row_number, row in group:
+            item_form = _validate(InvoiceItemForm, row)
+            if not item_form.errors:
+                items.append(item_form.save(commit=False))
+            else:
+                result.add_form_errors(row_number, item_form)
+                valid = False
+        if not valid:
+            continue
+        if allowance is not None and result.created + len(chunk) >= allowance:
+            result.over_limit += 1
+            continue
+
+        tax_rate = data['tax_rate'] if data['tax_rate'] is not None else default_tax_rate
+        number = data['invoice_number']
+        if number:
+            seen_numbers.add(number)
+        invoice = Invoice(
+            user=user,
+            customer_id=customer_id,
+            invoice_number=number or None,
+            invoice_date=data['invoice_date'],
+            due_date=data['due_date'] or data['invoice_date'] + timedelta(days=INVOICE_DUE_DAYS),
+            status=data['status'] or 'unpaid',
+            tax_rate=tax_rate,
+            **dict(zip(TOTAL_FIELDS, calculate_totals([(item.quantity, item.unit_price) for item in items], tax_rate))),
+        )
+        chunk.append((first_row_number, invoice, items))
+        if len(chunk) >= CHUNK_SIZE:
+            flush()
+    if chunk:
+        flush()
+
+
+IMPORTERS = {
+    'customers': import_customers,
+    'inventory': import_inventory,
+    'invoices': import_invoices,
+}
+
+
+def run_import(kind, user, file, filename):
+    """
+    Imports a CSV/XLSX file of `kind` ('customers', 'inventory' or 'invoices') for a user and
+    returns an ImportResult. Raises spreadsheets.SpreadsheetError if the file can't be read.
+    """
+    result = ImportResult(kind)
+    try:
+        IMPORTERS[kind](user, spreadsheets.read_rows(file, filename), result)
+    except spreadsheets.SpreadsheetError as error:
+        if not (result.created or result.error_count):
+            raise
+        # The chunks before the unreadable part are already saved; say where it stopped.
+        result.stopped_by = str(error)
+    return result
@@ -0,0 +1,122 @@
+"""
+Saving a document's line items as one diff against the stored rows.
+
+The submitted rows (from the item formset or a JSON payload) are compared
+with the stored items. New rows go in one bulk_create, changed rows in one
+bulk_update of just the changed columns, and removed rows in one DELETE ... IN.
+Unchanged rows cost nothing. bulk_create and bulk_update send no signals, so
+`save_items` itself refreshes the stored totals, the dashboard stats and PDF
+pre-rendering, which the per-item signal handlers would otherwise do once
+per row. Deletes do send them; their totals update is deferred to one
+recalculation.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import prerender, stats
+from .models import Invoice, deferred_totals
+
+ITEM_FIELDS = ('description', 'long_description', 'quantity', 'unit_price')
+BATCH_SIZE = 500
+
+
+def _same(stored, submitted):
+    # A blank optional text field may be stored as NULL and come back from a form as "".
+    return stored == submitted or (stored in (None, '') and submitted in (None, ''))
+
+
+def rows_from_formset(formset):
+    """Returns the rows a validated item formset adds, changes or deletes. Untouched forms are left out."""
+    deleted = set(map(id, formset.deleted_forms))
+    rows = []
+    for form in formset.forms:
+        pk = form.instance.pk
+        if id(form) in deleted:
+            if pk is not None:
+                rows.append({'id': pk, 'delete': True})
+        elif form.has_changed():
+            rows.append({'id': pk, **{field: form.cleaned_data.get(field) for field in ITEM_FIELDS}})
+    return rows
+
+
+def rows_from_payload(items, form_class):
+    """
+    Validates a JSON list of lines ({"id": optional, "description": ..., "quantity": ..., ...}, or
+    {"id": ..., "delete": true}) with the item form. Returns (rows, errors), where errors maps the
+    position of each bad line to its form errors.
+    """
+    if not isinstance(items, list):
+        return [], {'items': ["Expected a list of line items."]}
+    rows, errors = [], {}
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[position] = {'__all__': ["Expected an object."]}
+            continue
+        pk = item.get('id')
+        if pk is not None and not (isinstance(pk, int) or str(pk).isdigit()):
+            errors[position] = {'id': ["Expected a line item id."]}
+            continue
+        pk = int(pk) if pk is not None else None
+        if item.get('delete') and pk is not None:
+            rows.append({'id': pk, 'delete': True})
+            continue
+        form = form_class(data={field: item.get(field) for field in ITEM_FIELDS if item.get(field) is not None})
+        if form.is_valid():
+            rows.append({'id': pk, **{field: form.cleaned_data.get(field) for field in ITEM_FIELDS}})
+        else:
+            errors[position] = form.errors.get_json_data()
+    return rows, errors
+
+
+def save_items(document, rows, replace=False):
+    """
+    Applies `rows` to the document's line items. A row with an id updates that item (or deletes
+    it with "delete": true); a row without one adds an item. With `replace`, stored items that no
+    row mentions are deleted, so the rows become the complete list. Returns the number of items
+    (created, updated, deleted). Raises ValidationError for ids that aren't this document's items.
+    """
+    items = document.items
+    model, fk_name = items.model, items.field.name
+    listed = {row['id'] for row in rows if row.get('id') is not None}
+    stored = {item.pk: item for item in (items.all() if replace else items.filter(pk__in=listed))}
+    unknown = listed - stored.keys()
+    if unknown:
+        raise ValidationError(f"Unknown line item(s): {', '.join(map(str, sorted(unknown)))}.")
+
+    to_create, to_update, to_delete, changed_fields = [], [], set(), set()
+    for row in rows:
+        item = stored.get(row.get('id'))
+        if row.get('delete'):
+            if item is not None:
+                to_delete.add(item.pk)
+        elif item is None:
+            to_create.append(model(**{fk_name: document}, **{field: row.get(field) for field in ITEM_FIELDS}))
+        else:
+            changed = {field for field in ITEM_FIELDS if not _same(getattr(item, field), row.get(field))}
+            for field in changed:
+                setattr(item, field, row.get(field))
+            if changed:
+                to_update.append(item)
+                changed_fields |= changed
+    if replace:
+        to_delete |= stored.keys() - listed
+
+    if not (to_create or to_update or to_delete):
+        return 0, 0, 0
+    with transaction.atomic():
+        with deferred_totals():
+            if to_delete:
+                # Through the related manager the deleted items come back attached to `document`, so
+                # their delete signals don't look it up again. Their totals refresh runs once, on
+                # `document`, when the deferred_totals block ends.
+                items.filter(pk__in=to_delete).delete()
+            if to_update:
+                model.objects.bulk_update(to_update, sorted(changed_fields), batch_size=BATCH_SIZE)
+            if to_create:
+                model.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+            if not to_delete:
+                document.recalculate_totals(touch=True)
+        if isinstance(document, Invoice):
+            stats.invalidate(document.user_id)
+        prerender.schedule(document)
+    return len(to_create), len(to_update), len(to_delete)
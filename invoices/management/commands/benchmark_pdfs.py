@@ -0,0 +1,171 @@
+import argparse
+import io
+import json
+import math
+import platform
+import resource
+import statistics
+import sys
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from invoices import rendering
+from invoices.models import Customer, Invoice, InvoiceItem, Quote, QuoteItem
+
+LONG_DESCRIPTION = ("Supply and installation as per the agreed scope of work, including labour, "
+                    "materials, travel and a 12 month workmanship guarantee. ") * 4
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _run_count(value):
+    runs = int(value)
+    if runs < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return runs
+
+
+def _peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks PDF rendering through the real templates with synthetic invoices and quotes
+    of different sizes, and prints machine-readable JSON so CI can compare runs across commits.
+
+    All synthetic data is created inside a transaction that is rolled back at the end.
+    Peak RSS is the process high-water mark after each scenario; scenarios run from
+    smallest to largest so the growth between them is meaningful.
+    """
+    help = 'Benchmarks invoice/quote PDF rendering and prints the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', nargs='+', choices=sorted(rendering.DOCUMENT_MODELS), default=['invoice'], help='Document types to benchmark.')
+        parser.add_argument('--items', nargs='+', type=int, default=[1, 10, 100, 1000], help='Line item counts to benchmark.')
+        parser.add_argument('--runs', type=_run_count, default=3, help='Renders per scenario.')
+        parser.add_argument('--logo-size', type=int, default=600, help='Width in pixels of the synthetic logo (height is half).')
+        parser.add_argument('--long-descriptions', action='store_true', help='Also benchmark every scenario with long item descriptions.')
+        parser.add_argument('--label', default='', help='Free-form label stored in the output, e.g. a commit hash.')
+        parser.add_argument('--output', help='Write the JSON to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        rendering.warm_up()
+        results = []
+        try:
+            with transaction.atomic():
+                results = self._run_scenarios(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        report = {
+            'label': options['label'],
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'runs': options['runs'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {len(results)} benchmark results to {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+    def _run_scenarios(self, options):
+        user = User.objects.create(username=f"benchmark-{uuid.uuid4().hex[:12]}")
+        customer = Customer.objects.create(user=user, name="Benchmark Customer", email="benchmark@example.com", phone="0000000000")
+        profile = user.profile
+        profile.company_name = "Benchmark Company"
+        profile.save()
+
+        description_variants = [False, True] if options['long_descriptions'] else [False]
+        results = []
+        try:
+            for with_logo in (False, True):
+                if with_logo:
+                    profile.logo.save('benchmark-logo.png', ContentFile(self._logo_png(options['logo_size'])), save=True)
+                for document_type in options['types']:
+                    for item_count in sorted(options['items']):
+                        for long_descriptions in description_variants:
+                            document = self._create_document(document_type, user, customer, item_count, long_descriptions)
+                            self.stderr.write(f"Rendering {document_type} with {item_count} items (logo={with_logo}, long={long_descriptions})...")
+                            results.append(self._measure(document, options['runs'], {
+                                'document_type': document_type,
+                                'items': item_count,
+                                'logo': with_logo,
+                                'long_descriptions': long_descriptions,
+                            }))
+        finally:
+            # The database rows are rolled back, but a file in storage is not.
+            if profile.logo:
+                profile.logo.delete(save=False)
+        return results
+
+    def _logo_png(self, width):
+        image = Image.new('RGB', (width, max(width // 2, 1)), color=(32, 128, 96))
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def _create_document(self, document_type, user, customer, item_count, long_descriptions):
+        today = timezone.now().date()
+        long_description = LONG_DESCRIPTION if long_descriptions else None
+        if document_type == 'invoice':
+            document = Invoice.objects.create(user=user, customer=customer, due_date=today + timedelta(days=30), tax_rate=Decimal('15.00'))
+            InvoiceItem.objects.bulk_create(
+                InvoiceItem(invoice=document, description=f"Item {n}", long_description=long_description, quantity=Decimal('2'), unit_price=Decimal('149.99'))
+                for n in range(item_count)
+            )
+        else:
+            document = Quote.objects.create(user=user, customer=customer, tax_rate=Decimal('15.00'))
+            QuoteItem.objects.bulk_create(
+                QuoteItem(quote=document, description=f"Item {n}", long_description=long_description, quantity=Decimal('2'), unit_price=Decimal('149.99'))
+                for n in range(item_count)
+            )
+        # bulk_create skips the item signals that keep the stored totals up to date.
+        document.recalculate_totals()
+        return rendering.load_document(document_type, document.pk)
+
+    def _measure(self, document, runs, scenario):
+        timings = []
+        pdf = b''
+        for _ in range(runs):
+            start = time.perf_counter()
+            pdf = rendering.render_document_pdf(document)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return {
+            **scenario,
+            'latency_ms': {
+                'min': round(timings[0], 2),
+                'p50': round(_percentile(timings, 50), 2),
+                'p90': round(_percentile(timings, 90), 2),
+                'p99': round(_percentile(timings, 99), 2),
+                'max': round(timings[-1], 2),
+                'mean': round(statistics.mean(timings), 2),
+            },
+            'peak_rss_kb': _peak_rss_kb(),
+            'output_bytes': len(pdf),
+        }
+
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from invoices import entitlements
+
+
+class Command(BaseCommand):
+    """
+    Marks Pro subscriptions whose paid period has ended as expired, in one UPDATE (see
+    invoices/entitlements.py). Meant to run daily, e.g. from cron, shortly after midnight.
+    Re-running it is harmless.
+    """
+    help = 'Marks lapsed Pro subscriptions as expired.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=parse_date, help='Treat this date (YYYY-MM-DD) as today.')
+
+    def handle(self, *args, **options):
+        expired = entitlements.expire_lapsed(today=options['date'])
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} subscription(s)."))
@@ -0,0 +1,50 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from invoices import exports
+
+
+def _date(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Command(BaseCommand):
+    """
+    Writes a user's invoices or quotes to a CSV/XLSX file, the same export the Export page streams
+    (see invoices/exports.py). Rows are written as they are read, so large exports use flat memory.
+    """
+    help = 'Exports invoices or quotes, per document or per line item, as CSV or XLSX.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS), help='What to export.')
+        parser.add_argument('--user', required=True, help='Username whose documents to export.')
+        parser.add_argument('--lines', action='store_true', help='One row per line item instead of per document.')
+        parser.add_argument('--start', type=_date, help='Only documents dated on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--end', type=_date, help='Only documents dated on or before this date (YYYY-MM-DD).')
+        parser.add_argument('--format', choices=sorted(exports.CONTENT_TYPES), help='File format. Defaults to the output file extension, or csv.')
+        parser.add_argument('--output', help='File to write. Defaults to standard output.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named '{options['user']}'.")
+
+        output = options['output']
+        file_format = options['format'] or ('xlsx' if output and output.lower().endswith('.xlsx') else 'csv')
+        chunks = exports.stream(options['kind'], user, file_format, options['start'], options['end'], options['lines'])
+        if output is None:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        with open(output, 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Wrote {output}."))
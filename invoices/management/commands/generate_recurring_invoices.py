@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from invoices import recurring
+
+
+class Command(BaseCommand):
+    """
+    Creates the invoices that recurring schedules are due to produce. Meant to run once a day
+    (e.g. from cron); a missed day is caught up on the next run. Safe to run concurrently.
+    """
+    help = 'Generates the invoices that are due from recurring invoice schedules.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=parse_date, help='Generate what is due up to this date (YYYY-MM-DD) instead of today.')
+        parser.add_argument('--chunk-size', type=int, default=recurring.CHUNK_SIZE, help='Schedules per transaction.')
+        parser.add_argument('--prerender', action='store_true', help='Queue the new invoices\' PDFs for the PDF worker even if PDF_PRERENDER_ON_SAVE is off.')
+
+    def handle(self, *args, **options):
+        result = recurring.generate_due(
+            today=options['date'], chunk_size=options['chunk_size'], prerender=options['prerender'] or None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Generated {result.invoices} invoice(s) from {result.schedules} schedule(s)."))
+        if result.over_limit:
+            self.stdout.write(self.style.WARNING(f"{result.over_limit} schedule(s) skipped: their owner is at the Free Plan invoice limit."))
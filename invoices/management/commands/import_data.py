@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices import imports, spreadsheets
+
+
+class Command(BaseCommand):
+    """
+    Imports customers, inventory items or invoices for a user from a CSV/XLSX file, the same way
+    the Import page does (see invoices/imports.py). Useful for migrating a customer's data in bulk.
+    """
+    help = 'Imports customers, inventory items or invoices from a CSV or XLSX file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(imports.IMPORTERS), help='What the file contains.')
+        parser.add_argument('path', help='Path to the .csv or .xlsx file.')
+        parser.add_argument('--user', required=True, help='Username to import the data for.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.select_related('profile', 'subscription').get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named '{options['user']}'.")
+
+        try:
+            with open(options['path'], 'rb') as file:
+                result = imports.run_import(options['kind'], user, file, options['path'])
+        except OSError as error:
+            raise CommandError(f"Can't open {options['path']}: {error}")
+        except spreadsheets.SpreadsheetError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {result.created} {options['kind']}."))
+        if result.over_limit:
+            self.stdout.write(self.style.WARNING(f"{result.over_limit} valid row(s) skipped: the user's plan limit was reached."))
+        for row_number, messages in result.errors:
+            self.stdout.write(self.style.WARNING(f"Row {row_number}: {'; '.join(messages)}"))
+        if result.error_count > len(result.errors):
+            self.stdout.write(self.style.WARNING(f"... and {result.error_count - len(result.errors)} more row(s) with errors."))
+        if result.stopped_by:
+            raise CommandError(f"The import stopped early: {result.stopped_by}")
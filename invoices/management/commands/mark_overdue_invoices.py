@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from invoices import overdue
+
+
+class Command(BaseCommand):
+    """
+    Marks unpaid invoices past their due date as overdue and notifies their owners (see
+    invoices/overdue.py). Meant to run periodically, e.g. hourly from cron. Re-running it is
+    harmless, and a run that was interrupted or capped with --max-batches picks up where it stopped.
+    """
+    help = 'Marks unpaid invoices past their due date as overdue, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=parse_date, help='Treat this date (YYYY-MM-DD) as today.')
+        parser.add_argument('--batch-size', type=int, default=overdue.BATCH_SIZE, help='Invoices per transaction.')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches; the next run continues.')
+
+    def handle(self, *args, **options):
+        result = overdue.mark_overdue(today=options['date'], batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Marked {result.invoices} invoice(s) overdue in {result.batches} batch(es); sent {result.notifications} notification(s)."
+        ))
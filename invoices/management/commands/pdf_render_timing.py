@@ -0,0 +1,53 @@
+import argparse
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices import rendering
+
+
+def _run_count(value):
+    runs = int(value)
+    if runs < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return runs
+
+
+class Command(BaseCommand):
+    """
+    Renders one invoice or quote repeatedly, first rebuilding the shared stylesheet
+    and font configuration each time (cold) and then reusing them (warm), and prints both timings.
+    """
+    help = 'Reports cold versus warm PDF render times for an invoice or quote.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=sorted(rendering.DOCUMENT_MODELS), default='invoice', help='Document type to render.')
+        parser.add_argument('--id', type=int, help='Document id (defaults to the most recent one).')
+        parser.add_argument('--runs', type=_run_count, default=5, help='Renders per mode.')
+
+    def handle(self, *args, **options):
+        model = rendering.DOCUMENT_MODELS[options['type']]
+        queryset = model.objects.filter(pk=options['id']) if options['id'] else model.objects.order_by('-pk')
+        document_id = queryset.values_list('pk', flat=True).first()
+        if document_id is None:
+            raise CommandError(f"No {options['type']} found to render.")
+        document = rendering.load_document(options['type'], document_id)
+
+        cold = []
+        for _ in range(options['runs']):
+            rendering.shared_resources.cache_clear()
+            cold.append(self._time_render(document))
+
+        rendering.warm_up()
+        warm = [self._time_render(document) for _ in range(options['runs'])]
+
+        self.stdout.write(self.style.NOTICE(f"--- Rendering {document} ({options['runs']} runs each) ---"))
+        self.stdout.write(f"Cold: mean {statistics.mean(cold):.1f} ms, min {min(cold):.1f} ms")
+        self.stdout.write(f"Warm: mean {statistics.mean(warm):.1f} ms, min {min(warm):.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Warm renders are {statistics.mean(cold) / statistics.mean(warm):.1f}x faster."))
+
+    def _time_render(self, document):
+        start = time.perf_counter()
+        rendering.render_document_pdf(document)
+        return (time.perf_counter() - start) * 1000
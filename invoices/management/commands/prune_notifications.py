@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from invoices import notifications
+
+
+class Command(BaseCommand):
+    """
+    Keeps the notification table small (see invoices/notifications.py): caps every user's unread
+    notifications, then deletes (or archives) read ones older than the retention period in batches.
+    Meant to run daily, e.g. from cron. A run capped with --max-batches continues on the next one.
+    """
+    help = 'Caps unread notifications and prunes old read ones, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS, help='Prune read notifications older than this many days.')
+        parser.add_argument('--archive', action='store_true', help='Copy pruned notifications to the archive table instead of only deleting them.')
+        parser.add_argument('--batch-size', type=int, default=notifications.PRUNE_BATCH_SIZE, help='Notifications per transaction.')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches; the next run continues.')
+
+    def handle(self, *args, **options):
+        capped = notifications.cap_all()
+        pruned, batches = notifications.prune(
+            before=timezone.now() - timedelta(days=options['days']),
+            archive=options['archive'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Marked {capped} unread notification(s) over the limit as read; "
+            f"{'archived' if options['archive'] else 'deleted'} {pruned} read notification(s) in {batches} batch(es)."
+        ))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from invoices.models import Invoice, Quote
+from invoices.totals import CENTS, TOTAL_FIELDS
+
+DOCUMENTS = {'invoice': Invoice, 'quote': Quote}
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the stored subtotal/tax/total of every invoice and quote from its line items
+    and fixes any that drifted, e.g. after items were changed with bulk queries that skip signals.
+    Works in batches of documents, with the line item sums computed in SQL (one query per batch).
+    """
+    help = 'Backfills or verifies the stored totals on invoices and quotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', nargs='+', choices=sorted(DOCUMENTS), default=sorted(DOCUMENTS), help='Document types to check.')
+        parser.add_argument('--verify', action='store_true', help='Only report mismatches, and exit with an error if there are any.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Documents per batch.')
+
+    def handle(self, *args, **options):
+        total_mismatched = 0
+        for document_type in options['types']:
+            checked, mismatched = self._process(document_type, options['verify'], options['batch_size'])
+            total_mismatched += mismatched
+            action = "have stale totals" if options['verify'] else "were corrected"
+            style = self.style.WARNING if mismatched else self.style.SUCCESS
+            self.stdout.write(style(f"{document_type}: checked {checked}, {mismatched} {action}."))
+
+        if options['verify'] and total_mismatched:
+            raise CommandError(f"{total_mismatched} document(s) have stale totals. Run without --verify to fix them.")
+
+    def _process(self, document_type, verify, batch_size):
+        model = DOCUMENTS[document_type]
+        queryset = model.objects.order_by('pk').only('pk', 'tax_rate', *TOTAL_FIELDS).with_totals()
+        checked = mismatched = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            stale = []
+            for document in batch:
+                totals = tuple(getattr(document, f'items_{field}').quantize(CENTS) for field in TOTAL_FIELDS)
+                if totals != tuple(getattr(document, field) for field in TOTAL_FIELDS):
+                    self.stdout.write(f"  {document_type} #{document.pk}: stored {document.total}, expected {totals[2]}")
+                    document.subtotal, document.tax_amount, document.total = totals
+                    document.updated_at = timezone.now()
+                    stale.append(document)
+            if stale and not verify:
+                model.objects.bulk_update(stale, [*TOTAL_FIELDS, 'updated_at'])
+            checked += len(batch)
+            mismatched += len(stale)
+        return checked, mismatched
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from invoices.models import UsageCounter
+from invoices.usage import COUNTER_FIELDS
+
+
+def _count(model):
+    rows = model.objects.filter(user=OuterRef('user_id')).order_by().values('user').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+
+class Command(BaseCommand):
+    """
+    Recounts every user's customers, invoices, quotes and inventory items and fixes any
+    usage counter that drifted (e.g. after bulk operations that skip signals), creating
+    missing counters on the way. Each batch of counters is checked with one query.
+    """
+    help = 'Repairs the free-plan usage counters from the actual object counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report counters that are wrong.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Counters per batch.')
+
+    def handle(self, *args, **options):
+        missing = User.objects.filter(usage__isnull=True).values_list('pk', flat=True)
+        if options['dry_run']:
+            created = missing.count()
+        else:
+            created = len(UsageCounter.objects.bulk_create(UsageCounter(user_id=pk) for pk in missing.iterator()))
+
+        fields = list(COUNTER_FIELDS.values())
+        queryset = UsageCounter.objects.order_by('pk').annotate(
+            **{f'actual_{field}': _count(model) for model, field in COUNTER_FIELDS.items()}
+        )
+        fixed = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            stale = []
+            for counter in batch:
+                actual = {field: getattr(counter, f'actual_{field}') for field in fields}
+                if any(getattr(counter, field) != value for field, value in actual.items()):
+                    self.stdout.write(f"  user #{counter.user_id}: {', '.join(f'{field} {getattr(counter, field)} -> {value}' for field, value in actual.items() if getattr(counter, field) != value)}")
+                    for field, value in actual.items():
+                        setattr(counter, field, value)
+                    stale.append(counter)
+            if stale and not options['dry_run']:
+                UsageCounter.objects.bulk_update(stale, fields)
+            fixed += len(stale)
+
+        verb = "need fixing" if options['dry_run'] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"{created} counter(s) missing, {fixed} counter(s) {verb}."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from invoices import pdf_jobs
+
+
+class Command(BaseCommand):
+    """
+    Runs the background PDF worker: claims queued PDFRenderJob rows and renders
+    them in a pool of worker processes. Safe to run several copies side by side.
+    """
+    help = 'Renders queued invoice and quote PDFs in a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None, help='Number of render processes (defaults to PDF_WORKER_PROCESSES or the CPU count).')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait between checks for new jobs.')
+        parser.add_argument('--once', action='store_true', help='Exit as soon as the queue is empty.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE("Starting PDF worker..."))
+        try:
+            pdf_jobs.run_worker(processes=options['processes'], poll_interval=options['poll_interval'], once=options['once'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("PDF worker stopped."))
+            return
+        self.stdout.write(self.style.SUCCESS("PDF queue is empty. Exiting."))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_invoice_public_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PDFCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='SHA-256 of everything that goes into the rendered PDF.', max_length=64, unique=True)),
+                ('document_type', models.CharField(choices=[('invoice', 'Invoice'), ('quote', 'Quote')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('file', models.FileField(upload_to='pdf_cache/')),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdf_cache_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'PDF Cache Entry',
+                'verbose_name_plural': 'PDF Cache Entries',
+                'indexes': [models.Index(fields=['document_type', 'object_id'], name='invoices_pd_documen_65615c_idx'), models.Index(fields=['last_accessed_at'], name='invoices_pd_last_ac_259116_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:17
+
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+from invoices.totals import TOTAL_FIELDS, calculate_totals
+
+
+def backfill_totals(apps, schema_editor):
+    """Fill the new total columns of existing invoices and quotes from their line items."""
+    for model_name, item_model_name, fk in (('Invoice', 'InvoiceItem', 'invoice'), ('Quote', 'QuoteItem', 'quote')):
+        Model = apps.get_model('invoices', model_name)
+        ItemModel = apps.get_model('invoices', item_model_name)
+        lines = defaultdict(list)
+        for document_id, quantity, unit_price in ItemModel.objects.values_list(f'{fk}_id', 'quantity', 'unit_price').iterator():
+            lines[document_id].append((quantity, unit_price))
+        documents = list(Model.objects.only('pk', 'tax_rate'))
+        for document in documents:
+            document.subtotal, document.tax_amount, document.total = calculate_totals(lines[document.pk], document.tax_rate)
+        Model.objects.bulk_update(documents, TOTAL_FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0007_updated_at_timestamps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='tax_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='quote',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='quote',
+            name='tax_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='quote',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, reverse_code=migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'total'], name='invoices_in_user_id_ae6b37_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quote',
+            index=models.Index(fields=['user', 'total'], name='invoices_qu_user_id_3e96a8_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_counters(apps, schema_editor):
+    """Create a usage counter for every existing user from their current object counts."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UsageCounter = apps.get_model('invoices', 'UsageCounter')
+    counted = {
+        'customer_count': apps.get_model('invoices', 'Customer'),
+        'invoice_count': apps.get_model('invoices', 'Invoice'),
+        'quote_count': apps.get_model('invoices', 'Quote'),
+        'inventory_count': apps.get_model('invoices', 'InventoryItem'),
+    }
+    counts = {}
+    for field, model in counted.items():
+        for row in model.objects.values('user_id').annotate(n=models.Count('pk')):
+            counts.setdefault(row['user_id'], {})[field] = row['n']
+    UsageCounter.objects.bulk_create(
+        (UsageCounter(user_id=user_id, **counts.get(user_id, {})) for user_id in User.objects.values_list('pk', flat=True)),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0009_access_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_count', models.PositiveIntegerField(default=0)),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('quote_count', models.PositiveIntegerField(default=0)),
+                ('inventory_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_counters, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_next_numbers(apps, schema_editor):
+    """Move each profile's next invoice and quote numbers into sequence rows."""
+    Profile = apps.get_model('invoices', 'Profile')
+    DocumentSequence = apps.get_model('invoices', 'DocumentSequence')
+    rows = Profile.objects.values_list('user_id', 'invoice_next_number', 'quote_next_number')
+    DocumentSequence.objects.bulk_create(
+        (
+            DocumentSequence(user_id=user_id, document_type=document_type, next_number=next_number)
+            for user_id, invoice_number, quote_number in rows.iterator()
+            for document_type, next_number in (('invoice', invoice_number), ('quote', quote_number))
+        ),
+        batch_size=500,
+    )
+
+
+def restore_next_numbers(apps, schema_editor):
+    Profile = apps.get_model('invoices', 'Profile')
+    DocumentSequence = apps.get_model('invoices', 'DocumentSequence')
+    for sequence in DocumentSequence.objects.iterator():
+        Profile.objects.filter(user_id=sequence.user_id).update(**{f'{sequence.document_type}_next_number': sequence.next_number})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0010_usagecounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_type', models.CharField(choices=[('invoice', 'Invoice'), ('quote', 'Quote')], max_length=20)),
+                ('next_number', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_sequences', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'document_type'), name='unique_document_sequence')],
+            },
+        ),
+        migrations.RunPython(copy_next_numbers, reverse_code=restore_next_numbers),
+        migrations.RemoveField(
+            model_name='profile',
+            name='invoice_next_number',
+        ),
+        migrations.RemoveField(
+            model_name='profile',
+            name='quote_next_number',
+        ),
+    ]
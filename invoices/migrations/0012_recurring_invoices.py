@@ -0,0 +1,53 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0011_document_sequences'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringInvoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly')], default='monthly', max_length=20)),
+                ('start_date', models.DateField(help_text='The date of the first invoice. Later invoices are a whole number of periods after it.')),
+                ('next_run_date', models.DateField(help_text='The date of the next invoice to generate.')),
+                ('end_date', models.DateField(blank=True, help_text='No invoices are generated after this date.', null=True)),
+                ('due_days', models.PositiveIntegerField(default=30, help_text='How many days after its date each invoice is due.')),
+                ('tax_rate', models.DecimalField(decimal_places=2, default=0.0, max_digits=5)),
+                ('is_active', models.BooleanField(default=True)),
+                ('run_count', models.PositiveIntegerField(default=0, editable=False, help_text='How many invoices have been generated so far.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_invoices', to='invoices.customer')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_invoices', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecurringInvoiceItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(max_length=255)),
+                ('long_description', models.TextField(blank=True, null=True)),
+                ('quantity', models.DecimalField(decimal_places=2, default=1, max_digits=10)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('recurring_invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='invoices.recurringinvoice')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recurringinvoice',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['next_run_date'], name='recurring_invoice_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringinvoice',
+            index=models.Index(fields=['user', 'next_run_date'], name='invoices_re_user_id_871dbc_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0012_recurring_invoices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='status',
+            field=models.CharField(choices=[('proforma', 'Proforma'), ('unpaid', 'Unpaid'), ('overdue', 'Overdue'), ('paid', 'Paid')], default='unpaid', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'due_date', 'id'], name='invoices_in_status_6b7a19_idx'),
+        ),
+    ]
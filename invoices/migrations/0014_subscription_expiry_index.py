@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0013_invoice_overdue_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('plan', 'pro'), ('status__in', ['active', 'cancelled'])), fields=['subscription_end_date'], name='subscription_expiry_idx'),
+        ),
+    ]
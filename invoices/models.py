@@ -1,12 +1,18 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.urls import reverse
-from django.db import transaction
+from django.db import IntegrityError, connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Round
+import threading
 import uuid
+from contextlib import contextmanager
 from django.utils import timezone
 from decimal import Decimal
+from dateutil.relativedelta import relativedelta
+from .totals import TOTAL_FIELDS, calculate_totals, tax_and_total
 
 
 class Customer(models.Model):
@@ -17,9 +23,11 @@ class Customer(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['user', 'name', 'id'])]
 
     def __str__(self):
         return self.name
@@ -40,9 +48,8 @@ class Profile(models.Model):
     bank_branch_code = models.CharField(max_length=20, blank=True, null=True)
     bank_account_type = models.CharField(max_length=50, blank=True, null=True)
     invoice_prefix = models.CharField(max_length=10, default='INV-', help_text="The prefix for your invoice numbers (e.g., INV-).")
-    invoice_next_number = models.IntegerField(default=1, help_text="The next number to be used for a new invoice.")
     quote_prefix = models.CharField(max_length=10, default='QTE-', help_text="The prefix for your quote numbers (e.g., QTE-).")
-    quote_next_number = models.IntegerField(default=1, help_text="The next number to be used for a new quote.")
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.user.username} Profile'
@@ -51,17 +58,30 @@ class Profile(models.Model):
 class Subscription(models.Model):
     PLAN_CHOICES = (('free', 'Free'), ('pro', 'Pro'))
     STATUS_CHOICES = (('active', 'Active'), ('cancelled', 'Cancelled'), ('expired', 'Expired'))
+    # A cancelled subscription keeps Pro until its paid period ends; see entitlements.py.
+    PRO_STATUSES = ('active', 'cancelled')
 
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='subscription')
     plan = models.CharField(max_length=20, choices=PLAN_CHOICES, default='free')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
-    payfast_token = models.CharField(max_length=255, blank=True, null=True)
+    payfast_token = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     subscription_start_date = models.DateField(default=timezone.now)
     subscription_end_date = models.DateField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # The expiry job's scan: only live Pro subscriptions are indexed.
+            models.Index(
+                fields=['subscription_end_date'],
+                condition=models.Q(plan='pro', status__in=['active', 'cancelled']),
+                name='subscription_expiry_idx',
+            ),
+        ]
+
     @property
     def is_currently_active(self):
-        if self.plan == 'pro' and self.status == 'active' and self.subscription_end_date and self.subscription_end_date >= timezone.now().date():
+        """Pro is paid up to subscription_end_date, cancelled or not. Pro without an end date isn't active."""
+        if self.plan == 'pro' and self.status in self.PRO_STATUSES and self.subscription_end_date and self.subscription_end_date >= timezone.now().date():
             return True
         return False
 
@@ -69,6 +89,104 @@ class Subscription(models.Model):
         return f"{self.user.username}'s {self.get_plan_display()} Subscription"
 
 
+class DocumentSequenceManager(models.Manager):
+
+    def allocate(self, user_id, document_type, count=1):
+        """
+        Reserves `count` consecutive numbers for a user's invoices or quotes and returns the
+        first. The increment is a single UPDATE on the user's sequence row, whose lock is held
+        until the surrounding transaction ends, so call this inside the transaction that saves
+        the documents: a rollback then hands the numbers back and the sequence stays gap-free.
+        """
+        with transaction.atomic():
+            number = self._increment(user_id, document_type, count)
+            if number is None:
+                # No sequence row yet (an account older than the sequences); create it and retry.
+                try:
+                    with transaction.atomic():
+                        self.create(user_id=user_id, document_type=document_type)
+                except IntegrityError:
+                    pass  # Created concurrently.
+                number = self._increment(user_id, document_type, count)
+        return number
+
+    def _increment(self, user_id, document_type, count):
+        if connection.vendor == 'postgresql' or (connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)):
+            table = connection.ops.quote_name(self.model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET next_number = next_number + %s, updated_at = %s "
+                    f"WHERE user_id = %s AND document_type = %s RETURNING next_number",
+                    [count, timezone.now(), user_id, document_type],
+                )
+                row = cursor.fetchone()
+            return row[0] - count if row else None
+        # No UPDATE ... RETURNING: the UPDATE still takes the row lock, so the read that follows is ours.
+        sequence = self.filter(user_id=user_id, document_type=document_type)
+        if not sequence.update(next_number=F('next_number') + count, updated_at=timezone.now()):
+            return None
+        return sequence.values_list('next_number', flat=True).get() - count
+
+    def advance_past(self, user_id, document_type, number):
+        """Makes sure the user's next number is above `number`, e.g. after importing documents that were already numbered."""
+        sequence = self.filter(user_id=user_id, document_type=document_type)
+        if sequence.update(next_number=Greatest(F('next_number'), number + 1), updated_at=timezone.now()):
+            return
+        try:
+            with transaction.atomic():
+                self.create(user_id=user_id, document_type=document_type, next_number=number + 1)
+        except IntegrityError:
+            # Created concurrently.
+            sequence.update(next_number=Greatest(F('next_number'), number + 1), updated_at=timezone.now())
+
+    def set_next_number(self, user_id, document_type, next_number):
+        """Sets the number the user's next invoice or quote will get."""
+        self.update_or_create(user_id=user_id, document_type=document_type, defaults={'next_number': next_number})
+
+    def next_numbers(self, user_id):
+        """Returns {document_type: next number} for a user, without reserving anything."""
+        numbers = dict.fromkeys(dict(self.model.DOCUMENT_TYPES), 1)
+        numbers.update(self.filter(user_id=user_id).values_list('document_type', 'next_number'))
+        return numbers
+
+
+class DocumentSequence(models.Model):
+    """
+    The next invoice or quote number for a user. One row per (user, document type), so
+    numbering never locks the profile and invoices never wait on quotes.
+    """
+    DOCUMENT_TYPES = (('invoice', 'Invoice'), ('quote', 'Quote'))
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_sequences')
+    document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPES)
+    next_number = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = DocumentSequenceManager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'document_type'], name='unique_document_sequence')]
+
+    def __str__(self):
+        return f"{self.user.username}'s next {self.document_type} number: {self.next_number}"
+
+
+class UsageCounter(models.Model):
+    """
+    Running per-user counts of the objects the free plan limits, kept up to date with
+    F() updates on create and delete (see usage.py) so limit checks read a single row.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='usage')
+    customer_count = models.PositiveIntegerField(default=0)
+    invoice_count = models.PositiveIntegerField(default=0)
+    quote_count = models.PositiveIntegerField(default=0)
+    inventory_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username}'s usage"
+
+
 class InventoryItem(models.Model):
     """Represents a pre-defined product or service that can be quickly added to a quote or invoice."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inventory_items')
@@ -83,9 +201,77 @@ class InventoryItem(models.Model):
         verbose_name = "Inventory Item"
         verbose_name_plural = "Inventory Items"
         ordering = ['name']
+        indexes = [models.Index(fields=['user', 'name', 'id'])]
+
+
+class DocumentQuerySet(models.QuerySet):
+    """Queryset shared by quotes and invoices."""
+
+    def with_totals(self):
+        """
+        Annotates items_subtotal, items_tax_amount and items_total, computed in SQL from the line
+        items in the same query. Lists and reports read the stored columns; these are for checking
+        them. Each value is rounded to the cent like `calculate_totals` (tax on the rounded subtotal),
+        so they compare equal to the stored columns even where SQLite does the arithmetic in floats.
+        SQLite returns them without a fixed exponent, so quantize with `totals.CENTS` for display.
+        Don't combine with other joins across multi-valued relations, which would double count.
+        """
+        money = DecimalField(max_digits=24, decimal_places=6)
+        cents = DecimalField(max_digits=12, decimal_places=2)
+        line_total = ExpressionWrapper(F('items__quantity') * F('items__unit_price'), output_field=money)
+        return self.annotate(
+            items_subtotal=Round(Coalesce(Sum(line_total), Value(Decimal('0')), output_field=money), 2, output_field=cents),
+        ).annotate(
+            items_tax_amount=Round(F('items_subtotal') * F('tax_rate') / Value(Decimal('100')), 2, output_field=cents),
+        ).annotate(
+            items_total=ExpressionWrapper(F('items_subtotal') + F('items_tax_amount'), output_field=cents),
+        )
+
+
+class DocumentTotals(models.Model):
+    """
+    Stored subtotal, tax and total for a quote or invoice. Item saves and deletes keep them
+    up to date (see `touch_invoice`/`touch_quote`), and save() re-applies the tax rate.
+    """
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+    tax_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+
+    objects = DocumentQuerySet.as_manager()
 
-
-class Quote(models.Model):
+    class Meta:
+        abstract = True
+
+    def apply_tax_rate(self, update_fields=None):
+        """Recomputes tax and total from the stored subtotal, e.g. after the tax rate changed."""
+        self.tax_amount, self.total = tax_and_total(self.subtotal, self.tax_rate)
+        if update_fields is not None and 'tax_rate' in update_fields:
+            update_fields = {*update_fields, 'tax_amount', 'total'}
+        return update_fields
+
+    def number_prefix(self, document_type):
+        """The user's invoice or quote number prefix, taken from the loaded profile when there is one."""
+        field = f'{document_type}_prefix'
+        if type(self).user.is_cached(self) and User.profile.is_cached(self.user):
+            return getattr(self.user.profile, field)
+        return Profile.objects.filter(user_id=self.user_id).values_list(field, flat=True).get()
+
+    def recalculate_totals(self, touch=False):
+        """
+        Recomputes the totals from the line items in one query and stores them if they changed.
+        `touch` also bumps updated_at, for when the items themselves changed. Returns True if the totals changed.
+        """
+        totals = dict(zip(TOTAL_FIELDS, calculate_totals(self.items.values_list('quantity', 'unit_price'), self.tax_rate)))
+        changed = any(getattr(self, field) != value for field, value in totals.items())
+        for field, value in totals.items():
+            setattr(self, field, value)
+        if changed or touch:
+            self.updated_at = totals['updated_at'] = timezone.now()
+            type(self).objects.filter(pk=self.pk).update(**totals)
+        return changed
+
+
+class Quote(DocumentTotals):
     STATUS_CHOICES = (('draft', 'Draft'), ('sent', 'Sent'), ('accepted', 'Accepted'), ('rejected', 'Rejected'))
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quotes')
@@ -97,18 +283,15 @@ class Quote(models.Model):
     tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
     public_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     invoice = models.OneToOneField('Invoice', on_delete=models.SET_NULL, blank=True, null=True, related_name='converted_from_quote')
+    updated_at = models.DateTimeField(auto_now=True, help_text="Bumped whenever the quote or one of its items changes.")
 
-    @property
-    def total(self):
-        return self.subtotal + self.tax_amount
-
-    @property
-    def subtotal(self):
-        return sum(item.total for item in self.items.all())
-
-    @property
-    def tax_amount(self):
-        return self.subtotal * (self.tax_rate / Decimal(100))
+    class Meta:
+        # Match the list view: (user, date, id) is its keyset ordering, (user, status) its status filter.
+        indexes = [
+            models.Index(fields=['user', 'quote_date', 'id']),
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['user', 'total']),
+        ]
 
     def get_absolute_url(self):
         """Returns the URL to access a particular quote instance."""
@@ -122,14 +305,15 @@ class Quote(models.Model):
         return f"Quote {self.quote_number or self.id} for {self.customer.name}"
 
     def save(self, *args, **kwargs):
-        if not self.pk:  # Object is being created for the first time
-            with transaction.atomic():
-                # Lock the user's profile row to prevent race conditions
-                profile = Profile.objects.select_for_update().get(user=self.user)
-                self.quote_number = f"{profile.quote_prefix}{profile.quote_next_number}"
-                profile.quote_next_number += 1
-                profile.save()
-        super().save(*args, **kwargs)
+        kwargs['update_fields'] = self.apply_tax_rate(kwargs.get('update_fields'))
+        if self.pk or self.quote_number:
+            super().save(*args, **kwargs)
+            return
+        # Number and insert in one transaction, so a failed insert gives the number back.
+        with transaction.atomic():
+            number = DocumentSequence.objects.allocate(self.user_id, 'quote')
+            self.quote_number = f"{self.number_prefix('quote')}{number}"
+            super().save(*args, **kwargs)
 
 
 class QuoteItem(models.Model):
@@ -147,8 +331,10 @@ class QuoteItem(models.Model):
         return self.description
 
 
-class Invoice(models.Model):
-    STATUS_CHOICES = (('proforma', 'Proforma'), ('unpaid', 'Unpaid'), ('paid', 'Paid'))
+class Invoice(DocumentTotals):
+    STATUS_CHOICES = (('proforma', 'Proforma'), ('unpaid', 'Unpaid'), ('overdue', 'Overdue'), ('paid', 'Paid'))
+    # Invoices still waiting for payment. The overdue sweeper (see overdue.py) moves unpaid ones past their due date to overdue.
+    OUTSTANDING_STATUSES = ('unpaid', 'overdue')
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='invoices')
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='invoices')
@@ -158,18 +344,17 @@ class Invoice(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='unpaid')
     tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
     public_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Bumped whenever the invoice or one of its items changes.")
 
-    @property
-    def total(self):
-        return self.subtotal + self.tax_amount
-
-    @property
-    def subtotal(self):
-        return sum(item.total for item in self.items.all())
-
-    @property
-    def tax_amount(self):
-        return self.subtotal * (self.tax_rate / Decimal(100))
+    class Meta:
+        # Match the list view: (user, date, id) is its keyset ordering, (user, status) its status filter.
+        indexes = [
+            models.Index(fields=['user', 'invoice_date', 'id']),
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['user', 'total']),
+            # The overdue sweeper's range scan: status = 'unpaid' AND due_date < today, oldest first.
+            models.Index(fields=['status', 'due_date', 'id']),
+        ]
 
     def get_absolute_url(self):
         """Returns the URL to access a particular invoice instance."""
@@ -183,14 +368,15 @@ class Invoice(models.Model):
         return f"Invoice {self.invoice_number or self.id} for {self.customer.name}"
 
     def save(self, *args, **kwargs):
-        if not self.pk:  # Object is being created for the first time
-            with transaction.atomic():
-                # Lock the user's profile row to prevent race conditions
-                profile = Profile.objects.select_for_update().get(user=self.user)
-                self.invoice_number = f"{profile.invoice_prefix}{profile.invoice_next_number}"
-                profile.invoice_next_number += 1
-                profile.save()
-        super().save(*args, **kwargs)
+        kwargs['update_fields'] = self.apply_tax_rate(kwargs.get('update_fields'))
+        if self.pk or self.invoice_number:
+            super().save(*args, **kwargs)
+            return
+        # Number and insert in one transaction, so a failed insert gives the number back.
+        with transaction.atomic():
+            number = DocumentSequence.objects.allocate(self.user_id, 'invoice')
+            self.invoice_number = f"{self.number_prefix('invoice')}{number}"
+            super().save(*args, **kwargs)
 
 
 class InvoiceItem(models.Model):
@@ -208,12 +394,137 @@ class InvoiceItem(models.Model):
         return self.description
 
 
+class RecurringInvoice(models.Model):
+    """
+    A schedule that the `generate_recurring_invoices` command turns into a new unpaid invoice
+    every period, with the schedule's customer, tax rate and line items (see recurring.py).
+    """
+    FREQUENCY_CHOICES = (('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly'))
+    FREQUENCY_STEPS = {
+        'weekly': relativedelta(weeks=1),
+        'monthly': relativedelta(months=1),
+        'quarterly': relativedelta(months=3),
+        'yearly': relativedelta(years=1),
+    }
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_invoices')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='recurring_invoices')
+    frequency = models.CharField(max_length=20, choices=FREQUENCY_CHOICES, default='monthly')
+    start_date = models.DateField(help_text="The date of the first invoice. Later invoices are a whole number of periods after it.")
+    next_run_date = models.DateField(help_text="The date of the next invoice to generate.")
+    end_date = models.DateField(blank=True, null=True, help_text="No invoices are generated after this date.")
+    due_days = models.PositiveIntegerField(default=30, help_text="How many days after its date each invoice is due.")
+    tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
+    is_active = models.BooleanField(default=True)
+    run_count = models.PositiveIntegerField(default=0, editable=False, help_text="How many invoices have been generated so far.")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The scheduler's due query only looks at active schedules, so only they are indexed.
+            models.Index(fields=['next_run_date'], condition=models.Q(is_active=True), name='recurring_invoice_due_idx'),
+            models.Index(fields=['user', 'next_run_date']),
+        ]
+
+    def get_absolute_url(self):
+        return reverse('recurring_invoice_update', args=[str(self.id)])
+
+    def __str__(self):
+        return f"{self.get_frequency_display()} invoice for {self.customer.name}"
+
+    def occurrence(self, number):
+        """Returns the date of the schedule's `number`th invoice, counting from 0."""
+        # Stepping from the start date keeps a schedule on the 31st from drifting to the 28th after February.
+        return self.start_date + self.FREQUENCY_STEPS[self.frequency] * number
+
+    def restart(self, next_run_date):
+        """Makes `next_run_date` the start of the schedule, e.g. after its frequency or dates were edited."""
+        self.start_date = self.next_run_date = next_run_date
+        self.run_count = 0
+
+
+class RecurringInvoiceItem(models.Model):
+    recurring_invoice = models.ForeignKey(RecurringInvoice, related_name='items', on_delete=models.CASCADE)
+    description = models.CharField(max_length=255)
+    long_description = models.TextField(blank=True, null=True)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    @property
+    def total(self):
+        return self.quantity * self.unit_price
+
+    def __str__(self):
+        return self.description
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_totals():
+    """
+    Postpones the totals update that every line item save or delete triggers until the
+    block exits, then recalculates each affected document once. Wrap formset saves and
+    item copies in this so saving N items costs one recalculation instead of N.
+    """
+    if getattr(_deferred, 'pending', None) is not None:
+        yield  # Nested: the outermost block does the work.
+        return
+    _deferred.pending = pending = {}
+    try:
+        yield
+    finally:
+        _deferred.pending = None
+    for (model, pk), document in pending.items():
+        _refresh_totals(model, pk, document)
+
+
+def _refresh_totals(model, pk, document=None):
+    if document is None:
+        document = model.objects.filter(pk=pk).first()
+        if document is None:
+            return
+    document.recalculate_totals(touch=True)
+
+
+def _line_items_changed(model, item, field_name, origin=None):
+    if origin is not None and origin is not item and getattr(origin, 'model', None) is not type(item):
+        return  # A cascade from deleting the document (or its customer or user), so nothing to update.
+    pk = getattr(item, f'{field_name}_id')
+    # Formsets and admin inlines attach the parent instance; updating it keeps a later save() from writing stale totals.
+    document = getattr(item, field_name) if getattr(type(item), field_name).is_cached(item) else None
+    pending = getattr(_deferred, 'pending', None)
+    if pending is None:
+        _refresh_totals(model, pk, document)
+    elif pending.get((model, pk)) is None:
+        pending[(model, pk)] = document
+
+
+@receiver(post_save, sender=InvoiceItem)
+@receiver(post_delete, sender=InvoiceItem)
+def touch_invoice(sender, instance, origin=None, **kwargs):
+    """Line item changes update the invoice's stored totals and count as changes to it for caching and ETags."""
+    _line_items_changed(Invoice, instance, 'invoice', origin)
+
+
+@receiver(post_save, sender=QuoteItem)
+@receiver(post_delete, sender=QuoteItem)
+def touch_quote(sender, instance, origin=None, **kwargs):
+    """Line item changes update the quote's stored totals and count as changes to it for caching and ETags."""
+    _line_items_changed(Quote, instance, 'quote', origin)
+
+
 @receiver(post_save, sender=User)
 def create_user_related_models(sender, instance, created, **kwargs):
     """Create Profile and Subscription for a new user."""
     if created:
         Profile.objects.create(user=instance)
         Subscription.objects.create(user=instance)
+        DocumentSequence.objects.bulk_create(
+            DocumentSequence(user=instance, document_type=document_type) for document_type, _ in DocumentSequence.DOCUMENT_TYPES
+        )
 
 
 class Notification(models.Model):
@@ -223,9 +534,85 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     link = models.URLField(blank=True, null=True, help_text="A link to the relevant object (e.g., a quote).")
+    dedupe_key = models.CharField(max_length=100, blank=True, null=True, help_text="Repeated events with the same key share one unread notification.")
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The unread badge and menu; read rows, however many, stay out of it.
+            models.Index(fields=['user', 'created_at', 'id'], condition=models.Q(is_read=False), name='notification_unread_idx'),
+            # prune_notifications: the oldest read rows first.
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_read=True), name='notification_read_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'dedupe_key'], condition=models.Q(is_read=False), name='notification_unread_dedupe_key'),
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.user.username}: {self.message[:30]}"
+
+class ArchivedNotification(models.Model):
+    """A read notification moved out of the Notification table by `prune_notifications --archive`."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    message = models.TextField()
+    link = models.URLField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"Notification for {self.user.username}: {self.message[:30]}"
\ No newline at end of file
+        return f"Archived notification for {self.user.username}: {self.message[:30]}"
+
+class PDFCacheEntry(models.Model):
+    """A rendered invoice or quote PDF, stored in the default storage and addressed by a hash of its inputs."""
+    DOCUMENT_TYPE_CHOICES = (('invoice', 'Invoice'), ('quote', 'Quote'))
+
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of everything that goes into the rendered PDF.")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pdf_cache_entries')
+    document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPE_CHOICES)
+    object_id = models.BigIntegerField()
+    file = models.FileField(upload_to='pdf_cache/')
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "PDF Cache Entry"
+        verbose_name_plural = "PDF Cache Entries"
+        indexes = [
+            models.Index(fields=['document_type', 'object_id']),
+            models.Index(fields=['last_accessed_at']),
+        ]
+
+    def __str__(self):
+        return f"Cached {self.document_type} PDF #{self.object_id} ({self.key[:12]})"
+
+
+class PDFRenderJob(models.Model):
+    """A queued request to render an invoice or quote PDF in the background PDF worker."""
+    STATUS_CHOICES = (('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'))
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pdf_render_jobs')
+    document_type = models.CharField(max_length=20, choices=PDFCacheEntry.DOCUMENT_TYPE_CHOICES)
+    object_id = models.BigIntegerField()
+    base_url = models.CharField(max_length=500, blank=True, help_text="Base URL used to resolve relative links while rendering.")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    file = models.FileField(upload_to='pdf_jobs/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "PDF Render Job"
+        verbose_name_plural = "PDF Render Jobs"
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['document_type', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_status_display()} render of {self.document_type} #{self.object_id}"
@@ -0,0 +1,156 @@
+"""
+The unread-notification badge and menu shown on every page, and keeping the
+notification table small.
+
+The unread count and the latest few unread notifications are cached per
+user, so ordinary page views don't query the notification table. Creating
+or deleting a Notification drops the cached entry (via signals), and
+`mark_all_read` clears it after its bulk update.
+
+Retention:
+
+- `notify` collapses repeated events: a notification with a dedupe_key
+  replaces the user's unread one with the same key instead of adding
+  another. It also caps the user's unread notifications at
+  NOTIFICATION_UNREAD_LIMIT by marking the oldest beyond it as read.
+- `prune` (the prune_notifications command) deletes, or archives to
+  ArchivedNotification, read notifications older than
+  NOTIFICATION_RETENTION_DAYS, PRUNE_BATCH_SIZE per transaction. `cap_all`
+  applies the unread cap to everyone, for notifications created in bulk.
+
+Unread rows have their own partial index, so the badge query stays cheap
+however much read history an account has.
+"""
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+
+MENU_SIZE = 10
+PRUNE_BATCH_SIZE = 1000
+ARCHIVED_FIELDS = ('user_id', 'message', 'link', 'created_at')
+
+
+def _cache_key(user_id):
+    return f'notifications:{user_id}'
+
+
+def get_unread_summary(user_id):
+    """Returns {'count': unread count, 'latest': up to MENU_SIZE unread notifications as dicts}."""
+    key = _cache_key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        unread = Notification.objects.filter(user_id=user_id, is_read=False)
+        latest = list(unread.order_by('-created_at', '-id').values('id', 'message', 'link', 'created_at')[:MENU_SIZE])
+        # The menu already tells us the count when it isn't full.
+        count = len(latest) if len(latest) < MENU_SIZE else unread.count()
+        summary = {'count': count, 'latest': latest}
+        cache.set(key, summary, settings.NOTIFICATION_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate(user_id):
+    transaction.on_commit(partial(cache.delete, _cache_key(user_id)))
+
+
+def mark_all_read(user):
+    """Marks all of a user's unread notifications as read."""
+    user.notifications.filter(is_read=False).update(is_read=True)
+    invalidate(user.pk)
+
+
+def notify(user_id, message, link=None, dedupe_key=None):
+    """
+    Notifies a user. With a `dedupe_key`, an unread notification with the same key is updated
+    and moved to the top instead of adding another one.
+    """
+    with transaction.atomic():
+        if not (dedupe_key and _refresh(user_id, dedupe_key, message, link)):
+            try:
+                with transaction.atomic():
+                    Notification.objects.create(user_id=user_id, message=message, link=link, dedupe_key=dedupe_key)
+            except IntegrityError:
+                # A concurrent request created the unread one for this key meanwhile.
+                _refresh(user_id, dedupe_key, message, link)
+        cap_unread(user_id)
+        invalidate(user_id)
+
+
+def _refresh(user_id, dedupe_key, message, link):
+    return Notification.objects.filter(user_id=user_id, dedupe_key=dedupe_key, is_read=False).update(
+        message=message, link=link, created_at=timezone.now(),
+    )
+
+
+def cap_unread(user_id, limit=None):
+    """Marks a user's unread notifications beyond the newest `limit` (NOTIFICATION_UNREAD_LIMIT) as read. Returns how many."""
+    limit = settings.NOTIFICATION_UNREAD_LIMIT if limit is None else limit
+    unread = Notification.objects.filter(user_id=user_id, is_read=False)
+    capped = 0
+    while True:
+        # Fetched first (with a LIMIT) rather than as a sliced subquery, which MySQL doesn't support.
+        overflow = list(unread.order_by('-created_at', '-id').values_list('pk', flat=True)[limit:limit + PRUNE_BATCH_SIZE])
+        if overflow:
+            capped += unread.filter(pk__in=overflow).update(is_read=True)
+        if len(overflow) < PRUNE_BATCH_SIZE:
+            break
+    if capped:
+        invalidate(user_id)
+    return capped
+
+
+def cap_all(limit=None):
+    """Applies `cap_unread` to every user over the limit. Returns how many notifications it marked read."""
+    limit = settings.NOTIFICATION_UNREAD_LIMIT if limit is None else limit
+    over_limit = (
+        Notification.objects.filter(is_read=False).order_by().values('user_id')
+        .annotate(unread=Count('pk')).filter(unread__gt=limit).values_list('user_id', flat=True)
+    )
+    return sum(cap_unread(user_id, limit) for user_id in list(over_limit))
+
+
+def prune(before=None, archive=False, batch_size=PRUNE_BATCH_SIZE, max_batches=None):
+    """
+    Deletes read notifications created before `before` (by default NOTIFICATION_RETENTION_DAYS
+    ago), oldest first, `batch_size` per transaction. With `archive` they are copied to
+    ArchivedNotification first. Returns (notifications removed, batches).
+    """
+    before = before or timezone.now() - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    pruned = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rows = list(
+                Notification.objects.filter(is_read=True, created_at__lt=before)
+                .order_by('created_at', 'id').values('pk', *ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            if archive:
+                ArchivedNotification.objects.bulk_create(
+                    ArchivedNotification(**{field: row[field] for field in ARCHIVED_FIELDS}) for row in rows
+                )
+            # Only read notifications go, so the cached unread summaries stay right.
+            Notification.objects.filter(pk__in=[row['pk'] for row in rows]).delete()
+        pruned += len(rows)
+        batches += 1
+    return pruned, batches
+
+
+@receiver(post_save, sender=Notification)
+def invalidate_for_notification(sender, instance, **kwargs):
+    invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def invalidate_for_deleted_notification(sender, instance, **kwargs):
+    # Read notifications (all that `prune` deletes) aren't part of the cached summary.
+    if not instance.is_read:
+        invalidate(instance.user_id)
@@ -0,0 +1,94 @@
+"""
+Moving unpaid invoices past their due date to 'overdue' and telling their owners.
+
+The mark_overdue_invoices command runs this periodically. Each batch is one
+short transaction:
+
+- pick the oldest BATCH_SIZE unpaid invoices due before today, a range scan
+  on the (status, due_date, id) index
+- switch them to overdue in a single UPDATE
+- add one Notification per affected user with bulk_create
+
+Marked invoices leave the 'unpaid' range, so the next batch simply takes
+the next oldest ones. A run that is stopped part-way (or capped with
+max_batches) resumes where it left off, and running it again when nothing
+is newly overdue does nothing. bulk_create and update() send no signals,
+so the notification and dashboard caches are dropped here.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from . import notifications, pdf_jobs, stats
+from .models import Invoice, Notification
+
+BATCH_SIZE = 1000
+
+
+class SweepResult:
+    """What a run did."""
+
+    def __init__(self):
+        self.invoices = 0
+        self.notifications = 0
+        self.batches = 0
+
+
+def newly_overdue(today):
+    return Invoice.objects.filter(status='unpaid', due_date__lt=today)
+
+
+def mark_overdue(today=None, batch_size=BATCH_SIZE, max_batches=None):
+    """Marks every unpaid invoice due before `today` as overdue, `batch_size` at a time. Returns a SweepResult."""
+    today = today or timezone.now().date()
+    result = SweepResult()
+    while max_batches is None or result.batches < max_batches:
+        marked, notified = _mark_batch(today, batch_size)
+        if not marked:
+            break
+        result.invoices += marked
+        result.notifications += notified
+        result.batches += 1
+    return result
+
+
+def _notification(user_id, invoices):
+    pk, number, customer_name = invoices[0]
+    if len(invoices) == 1:
+        return Notification(
+            user_id=user_id,
+            message=f"Invoice {number or pk} for {customer_name} is now overdue.",
+            link=reverse('invoice_detail', args=[pk]),
+        )
+    return Notification(
+        user_id=user_id,
+        message=f"{len(invoices)} invoices are now overdue, including {number or pk} for {customer_name}.",
+        link=f"{reverse('invoice_list')}?status=overdue",
+    )
+
+
+def _mark_batch(today, batch_size):
+    with transaction.atomic():
+        # skip_locked lets two sweepers share the work instead of queueing behind each other.
+        rows = list(
+            newly_overdue(today).select_for_update(skip_locked=True, of=('self',))
+            .order_by('due_date', 'id').values_list('pk', 'user_id', 'invoice_number', 'customer__name')[:batch_size]
+        )
+        if not rows:
+            return 0, 0
+        Invoice.objects.filter(pk__in=[row[0] for row in rows], status='unpaid').update(status='overdue', updated_at=timezone.now())
+
+        by_user = defaultdict(list)
+        for pk, user_id, number, customer_name in rows:
+            by_user[user_id].append((pk, number, customer_name))
+        Notification.objects.bulk_create([_notification(user_id, invoices) for user_id, invoices in by_user.items()])
+        for user_id in by_user:
+            notifications.invalidate(user_id)
+            stats.invalidate(user_id)
+        if settings.PDF_PRERENDER_ON_SAVE:
+            # The status is printed on the PDF, so the cached copies are stale now.
+            pdf_jobs.enqueue_many('invoice', [Invoice(pk=pk, user_id=user_id) for pk, user_id, _, _ in rows])
+    return len(rows), len(by_user)
@@ -0,0 +1,86 @@
+"""
+Keyset ("seek") pagination for the list pages.
+
+Instead of an OFFSET, each page continues after the last row of the previous
+one, using an opaque cursor that holds that row's ordering values. With an
+index on the ordering columns every page costs the same, however far the
+user scrolls and however large the account is.
+
+Orderings must end in a unique column (normally the primary key) and must
+not contain nullable columns.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class Page:
+    """One page of results plus the cursor for the next one (None on the last page)."""
+
+    def __init__(self, items, next_cursor, cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return not self.cursor
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Returns the ordering values stored in a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            return None
+        return [model._meta.get_field(name.lstrip('-')).to_python(value) for name, value in zip(ordering, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _after(ordering, values):
+    """Builds the WHERE clause for rows that sort after `values`, e.g. (date < d) OR (date = d AND id < i)."""
+    condition = Q()
+    for position, name in enumerate(ordering):
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        equal = {ordering[i].lstrip('-'): values[i] for i in range(position)}
+        condition |= Q(**equal, **{f"{name.lstrip('-')}__{lookup}": values[position]})
+    return condition
+
+
+def paginate(queryset, ordering, cursor=None, page_size=None):
+    """Returns the page of `queryset`, ordered by `ordering`, that starts after `cursor`."""
+    page_size = page_size or settings.LIST_PAGE_SIZE
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(cursor, queryset.model, ordering) if cursor else None
+    if values is not None:
+        queryset = queryset.filter(_after(ordering, values))
+    # Fetch one extra row to learn whether there is a next page without a COUNT.
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor([getattr(items[-1], name.lstrip('-')) for name in ordering])
+    return Page(items, next_cursor, cursor=cursor if values is not None else None)
+
+
+def next_page_query(request, page):
+    """Returns the query string for the next page, keeping the current filters."""
+    params = request.GET.copy()
+    params.pop('fragment', None)
+    params['cursor'] = page.next_cursor
+    return params.urlencode()
@@ -0,0 +1,177 @@
+"""
+A WeasyPrint `url_fetcher` that never goes to the network while rendering.
+
+Company logos and other media are read straight from the default storage
+backend and kept in an in-process cache plus an on-disk cache shared by all
+workers on the machine, both keyed by file name and modification time.
+Static files are read from disk. Anything else (external URLs) is refused,
+so a slow or unreachable Spaces bucket can delay a render by at most the
+fetch timeout and never makes it fail: a stale cached copy, or no image, is
+used instead.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import posixpath
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.storage import default_storage
+from django.utils._os import safe_join
+from weasyprint import default_url_fetcher
+
+logger = logging.getLogger(__name__)
+
+_MEMORY_CACHE_SIZE = 64
+
+_memory_cache = OrderedDict()  # (name, mtime) -> bytes
+_modified_times = {}  # name -> (mtime, checked_at)
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='pdf-assets')
+
+
+def _cache_dir():
+    path = Path(settings.PDF_ASSET_CACHE_DIR or os.path.join(tempfile.gettempdir(), 'lekkerbill-pdf-assets'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _name_hash(name):
+    return hashlib.sha256(name.encode('utf-8')).hexdigest()[:32]
+
+
+def _disk_path(name, mtime):
+    return _cache_dir() / f"{_name_hash(name)}-{int(mtime.timestamp())}"
+
+
+def _with_timeout(func, *args):
+    """Runs a storage call in a helper thread so a slow bucket cannot stall the render."""
+    return _executor.submit(func, *args).result(timeout=settings.PDF_ASSET_FETCH_TIMEOUT)
+
+
+def _modified_time(name):
+    """Returns the storage modification time of a file, cached for PDF_ASSET_MTIME_TTL seconds."""
+    cached = _modified_times.get(name)
+    if cached and time.monotonic() - cached[1] < settings.PDF_ASSET_MTIME_TTL:
+        return cached[0]
+    try:
+        mtime = _with_timeout(default_storage.get_modified_time, name)
+    except Exception as e:
+        logger.warning("Could not check %s in storage, using the cached copy: %s", name, e)
+        return cached[0] if cached else None
+    _modified_times[name] = (mtime, time.monotonic())
+    return mtime
+
+
+def _remember(key, data):
+    _memory_cache[key] = data
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > _MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def _write_to_disk(path, data):
+    # Write to a temporary name first so other workers never read a half-written file.
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _newest_disk_copy(name):
+    copies = sorted(_cache_dir().glob(f"{_name_hash(name)}-*[0-9]"), key=lambda p: p.stat().st_mtime)
+    return copies[-1].read_bytes() if copies else None
+
+
+def _read_from_storage(name):
+    with default_storage.open(name, 'rb') as f:
+        return f.read()
+
+
+def get_media(name):
+    """Returns the bytes of a media file, from memory, then disk, then storage."""
+    mtime = _modified_time(name)
+    if mtime is None:
+        data = _newest_disk_copy(name)
+        if data is not None:
+            return data
+        return _with_timeout(_read_from_storage, name)
+
+    key = (name, mtime)
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        return _memory_cache[key]
+
+    path = _disk_path(name, mtime)
+    if path.exists():
+        data = path.read_bytes()
+    else:
+        try:
+            data = _with_timeout(_read_from_storage, name)
+        except Exception as e:
+            data = _newest_disk_copy(name)
+            if data is None:
+                raise
+            logger.warning("Could not download %s from storage, using an older copy: %s", name, e)
+            # Not remembered under the new modification time, so the next render tries storage again.
+            return data
+        _write_to_disk(path, data)
+    _remember(key, data)
+    return data
+
+
+def prime(file_field):
+    """
+    Copies a freshly uploaded file (e.g. a new company logo) into the caches so the
+    next render does not have to fetch it.
+    """
+    if not file_field:
+        return
+    name = file_field.name
+    _modified_times.pop(name, None)
+    try:
+        get_media(name)
+    except Exception as e:
+        logger.warning("Could not prime the PDF asset cache with %s: %s", name, e)
+
+
+def _relative_name(url, base_url):
+    """Returns the part of `url` under `base_url` (a MEDIA_URL or STATIC_URL), or None, also if it climbs out with '..'."""
+    if not base_url:
+        return None
+    if urlparse(base_url).scheme:
+        prefix_matches = url.startswith(base_url)
+        remainder = url[len(base_url):]
+    else:
+        path = urlparse(url).path
+        prefix_matches = path.startswith(base_url)
+        remainder = path[len(base_url):]
+    if not prefix_matches:
+        return None
+    name = posixpath.normpath(unquote(remainder.split('?', 1)[0]))
+    if name in ('.', '..') or name.startswith(('../', '/')):
+        return None
+    return name
+
+
+def url_fetcher(url, timeout=10, ssl_context=None, **kwargs):
+    """WeasyPrint url_fetcher that serves media and static files locally and refuses external URLs."""
+    if url.startswith('data:'):
+        return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
+
+    media_name = _relative_name(url, settings.MEDIA_URL)
+    if media_name:
+        return {'string': get_media(media_name), 'mime_type': mimetypes.guess_type(media_name)[0], 'redirected_url': url}
+
+    static_name = _relative_name(url, settings.STATIC_URL)
+    if static_name:
+        path = finders.find(static_name) or safe_join(settings.STATIC_ROOT, static_name)
+        with open(path, 'rb') as f:
+            return {'string': f.read(), 'mime_type': mimetypes.guess_type(static_name)[0], 'redirected_url': url}
+
+    raise ValueError(f"Refusing to fetch {url} while rendering a PDF.")
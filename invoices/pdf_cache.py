@@ -0,0 +1,188 @@
+"""
+Content-addressed cache for rendered invoice and quote PDFs.
+
+A PDF is keyed by a SHA-256 of everything that ends up on the page: the
+document row, its line items, the customer, the owner's profile (including
+the logo file name) and the source of the PDF templates. Any edit therefore
+produces a new key, so a stale PDF can never be served. The rendered files
+live in the default storage backend (local disk or DigitalOcean Spaces) and
+are evicted least-recently-used once the cache grows past its size limits.
+"""
+import hashlib
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.db import IntegrityError
+from django.db.models import Count, Sum
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Invoice, PDFCacheEntry
+
+logger = logging.getLogger(__name__)
+
+PDF_BASE_TEMPLATE = 'invoices/pdf_base.html'
+PDF_STYLESHEET = 'invoices/css/pdf.css'
+
+
+def document_type(document):
+    """Returns 'invoice' or 'quote' for the given document instance."""
+    return 'invoice' if isinstance(document, Invoice) else 'quote'
+
+
+@lru_cache(maxsize=None)
+def template_version(template_name):
+    """Hashes the source of a PDF template, its base and the PDF stylesheet so edits bust the cache."""
+    digest = hashlib.sha256(settings.PDF_CACHE_VERSION.encode('utf-8'))
+    for name in (PDF_BASE_TEMPLATE, template_name):
+        digest.update(get_template(name).template.source.encode('utf-8'))
+    with open(finders.find(PDF_STYLESHEET), 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _row_values(instance):
+    """Returns the concrete field values of a model instance in a stable order."""
+    return [(field.attname, field.value_to_string(instance)) for field in instance._meta.concrete_fields]
+
+
+def document_fingerprint(document):
+    """Builds the cache key for a document from every input that affects its PDF."""
+    kind = document_type(document)
+    user = document.user
+    digest = hashlib.sha256()
+    digest.update(template_version(f'invoices/{kind}_pdf.html').encode('utf-8'))
+    parts = [
+        kind,
+        _row_values(document),
+        [_row_values(item) for item in document.items.order_by('pk')],
+        _row_values(document.customer),
+        _row_values(user.profile),
+        [user.first_name, user.last_name],
+    ]
+    digest.update(repr(parts).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def get_cached(document):
+    """Returns the cached PDF bytes for a document, or None if it has not been rendered yet."""
+    if not settings.PDF_CACHE_ENABLED:
+        return None
+    return _read_entry(document_fingerprint(document))
+
+
+def has_entry(document):
+    """Whether the document's current PDF is in the cache."""
+    return settings.PDF_CACHE_ENABLED and PDFCacheEntry.objects.filter(key=document_fingerprint(document)).exists()
+
+
+def get_entry(document):
+    """
+    Returns the up-to-date PDFCacheEntry for a document without reading its file, or None.
+    Used to hand the stored file straight to the client instead of streaming it through Django.
+    """
+    if not settings.PDF_CACHE_ENABLED:
+        return None
+    entry = PDFCacheEntry.objects.filter(key=document_fingerprint(document)).first()
+    if entry is not None:
+        PDFCacheEntry.objects.filter(pk=entry.pk).update(last_accessed_at=timezone.now())
+    return entry
+
+
+def get_or_render(document, render):
+    """
+    Returns the PDF bytes for a document, calling `render()` only on a cache miss.
+    The freshly rendered PDF is stored and any older entries for the same document are dropped.
+    """
+    if not settings.PDF_CACHE_ENABLED:
+        return render()
+
+    key = document_fingerprint(document)
+    pdf = _read_entry(key)
+    if pdf is not None:
+        return pdf
+
+    pdf = render()
+    _store(document, key, pdf)
+    return pdf
+
+
+def _read_entry(key):
+    entry = PDFCacheEntry.objects.filter(key=key).first()
+    if entry is None:
+        return None
+    try:
+        with entry.file.open('rb') as f:
+            pdf = f.read()
+    except (OSError, ValueError) as e:
+        # The file went missing from storage; forget the entry and render again.
+        logger.warning("Cached PDF %s could not be read, discarding it: %s", key, e)
+        entry.delete()
+        return None
+    PDFCacheEntry.objects.filter(pk=entry.pk).update(last_accessed_at=timezone.now())
+    return pdf
+
+
+def _store(document, key, pdf):
+    kind = document_type(document)
+    entry = PDFCacheEntry(key=key, user_id=document.user_id, document_type=kind, object_id=document.pk, size=len(pdf))
+    try:
+        entry.file.save(f'{key}.pdf', ContentFile(pdf), save=False)
+        entry.save()
+    except IntegrityError:
+        # Another request rendered the same document at the same time; keep theirs.
+        entry.file.delete(save=False)
+        return
+    except OSError as e:
+        logger.error("Could not store cached PDF for %s %s: %s", kind, document.pk, e)
+        return
+
+    _delete_entries(PDFCacheEntry.objects.filter(document_type=kind, object_id=document.pk).exclude(pk=entry.pk))
+    evict()
+
+
+def _delete_entries(queryset):
+    """Deletes cache entries together with their files in storage."""
+    deleted = 0
+    for entry in list(queryset):
+        try:
+            entry.file.delete(save=False)
+        except OSError as e:
+            logger.warning("Could not delete cached PDF file %s: %s", entry.file.name, e)
+        entry.delete()
+        deleted += 1
+    return deleted
+
+
+def invalidate_document(document):
+    """Drops every cached PDF for a single invoice or quote."""
+    return _delete_entries(PDFCacheEntry.objects.filter(document_type=document_type(document), object_id=document.pk))
+
+
+def invalidate_user(user):
+    """Drops every cached PDF owned by a user, e.g. after their company details or logo change."""
+    return _delete_entries(PDFCacheEntry.objects.filter(user=user))
+
+
+def evict():
+    """Removes least-recently-used entries until the cache is within its size and count limits."""
+    stats = PDFCacheEntry.objects.aggregate(total_size=Sum('size'), total_count=Count('pk'))
+    total_size = stats['total_size'] or 0
+    total_count = stats['total_count']
+    if total_size <= settings.PDF_CACHE_MAX_BYTES and total_count <= settings.PDF_CACHE_MAX_ENTRIES:
+        return 0
+
+    stale_ids = []
+    for pk, size in PDFCacheEntry.objects.order_by('last_accessed_at').values_list('pk', 'size').iterator():
+        if total_size <= settings.PDF_CACHE_MAX_BYTES and total_count <= settings.PDF_CACHE_MAX_ENTRIES:
+            break
+        stale_ids.append(pk)
+        total_size -= size
+        total_count -= 1
+    evicted = _delete_entries(PDFCacheEntry.objects.filter(pk__in=stale_ids))
+    if evicted:
+        logger.info("Evicted %s cached PDF(s).", evicted)
+    return evicted
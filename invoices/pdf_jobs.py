@@ -0,0 +1,160 @@
+"""
+Background PDF rendering backed by the PDFRenderJob table.
+
+Web requests enqueue a job and return immediately; the `run_pdf_worker`
+management command claims queued jobs and renders them in a pool of worker
+processes, so rendering scales with the machine's cores independently of
+the gunicorn web workers and no external broker is needed.
+"""
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import pdf_cache, process_pool, rendering
+from .models import PDFRenderJob
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(document, base_url=''):
+    """Queues a render of the document, reusing a job that is already waiting for it."""
+    return enqueue_by_id(pdf_cache.document_type(document), document.pk, document.user_id, base_url=base_url)
+
+
+def enqueue_by_id(document_type, object_id, user_id, base_url=''):
+    """Like `enqueue`, for callers that only have the document's ids."""
+    job = PDFRenderJob.objects.filter(document_type=document_type, object_id=object_id, status='queued').first()
+    if job is None:
+        job = PDFRenderJob.objects.create(user_id=user_id, document_type=document_type, object_id=object_id, base_url=base_url)
+    return job
+
+
+def enqueue_many(document_type, documents):
+    """Queues renders of newly created documents, which can't have jobs waiting yet, in one INSERT."""
+    return PDFRenderJob.objects.bulk_create(
+        [PDFRenderJob(user_id=document.user_id, document_type=document_type, object_id=document.pk) for document in documents],
+        batch_size=500,
+    )
+
+
+def claim_jobs(limit):
+    """
+    Marks up to `limit` queued jobs as running and returns their ids.
+    The conditional UPDATE means two workers can never claim the same job.
+    """
+    claimed = []
+    queued_ids = PDFRenderJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)[:limit]
+    for job_id in list(queued_ids):
+        if PDFRenderJob.objects.filter(pk=job_id, status='queued').update(status='running', started_at=timezone.now()):
+            claimed.append(job_id)
+    return claimed
+
+
+def run_job(job_id):
+    """
+    Renders a single claimed job. Runs inside a worker process. The PDF is kept on the job
+    only when the PDF cache didn't store it, so the download doesn't hold a second copy.
+    """
+    close_old_connections()
+    job = PDFRenderJob.objects.get(pk=job_id)
+    try:
+        document = rendering.load_document(job.document_type, job.object_id)
+        pdf = rendering.get_document_pdf(document, base_url=job.base_url or None)
+        if not pdf_cache.has_entry(document):
+            job.file.save(f"{job.pk}/{rendering.pdf_filename(document)}", ContentFile(pdf), save=False)
+        job.status = 'done'
+    except Exception as e:
+        logger.exception("PDF render job %s failed.", job_id)
+        job.status = 'failed'
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save()
+    return job.status
+
+
+def requeue_stale_jobs():
+    """Puts jobs back in the queue if their worker died while rendering them."""
+    cutoff = timezone.now() - timedelta(seconds=settings.PDF_JOB_TIMEOUT)
+    return PDFRenderJob.objects.filter(status='running', started_at__lt=cutoff).update(status='queued', started_at=None)
+
+
+def delete_expired_jobs():
+    """Deletes finished jobs, and their files, once they are older than the retention period."""
+    cutoff = timezone.now() - timedelta(seconds=settings.PDF_JOB_RETENTION)
+    deleted = 0
+    for job in list(PDFRenderJob.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff)[:500]):
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        deleted += 1
+    return deleted
+
+
+def _restart_pool(pool, processes, in_flight, error):
+    """
+    Replaces a pool that broke because one of its processes died (e.g. killed for running out
+    of memory). Every job it still had is marked failed, as there's no telling which one killed it.
+    """
+    logger.error("A PDF render process died, restarting the pool: %s", error)
+    PDFRenderJob.objects.filter(pk__in=list(in_flight.values())).update(status='failed', error=str(error), finished_at=timezone.now())
+    in_flight.clear()
+    pool.shutdown(wait=False, cancel_futures=True)
+    return process_pool.create_pool(processes)
+
+
+def run_worker(processes=None, poll_interval=1.0, once=False):
+    """
+    Claims and renders jobs until interrupted. With `once=True` it returns as soon
+    as the queue is empty, which is handy for cron-style runs and tests.
+    """
+    processes = process_pool.pool_size(processes)
+    pool = process_pool.create_pool(processes)
+    in_flight = {}
+    last_maintenance = 0
+    try:
+        while True:
+            if time.monotonic() - last_maintenance > 60:
+                requeue_stale_jobs()
+                delete_expired_jobs()
+                last_maintenance = time.monotonic()
+
+            free_slots = processes - len(in_flight)
+            claimed = claim_jobs(free_slots) if free_slots else []
+            while claimed:
+                try:
+                    future = pool.submit(run_job, claimed[0])
+                except BrokenProcessPool as e:
+                    # The pool broke since the last check. This job never started, so it goes to the new pool.
+                    pool = _restart_pool(pool, processes, in_flight, e)
+                    continue
+                in_flight[future] = claimed.pop(0)
+
+            if not in_flight:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            broken = None
+            for future in done:
+                job_id = in_flight.pop(future)
+                try:
+                    logger.info("PDF render job %s finished: %s", job_id, future.result())
+                except Exception as e:
+                    # The worker process itself crashed; record it so the client stops polling.
+                    logger.error("PDF render job %s crashed its worker: %s", job_id, e)
+                    PDFRenderJob.objects.filter(pk=job_id).update(status='failed', error=str(e), finished_at=timezone.now())
+                    if isinstance(e, BrokenProcessPool):
+                        broken = e
+            if broken:
+                pool = _restart_pool(pool, processes, in_flight, broken)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,86 @@
+"""
+Opt-in pre-rendering of PDFs as soon as a document is likely to be downloaded.
+
+When PDF_PRERENDER_ON_SAVE is on, saving an invoice that is unpaid, overdue or paid,
+or a quote that has been sent, queues a background render once the
+surrounding transaction commits. The worker stores the PDF in the PDF cache,
+so the customer's download becomes plain file serving. Line item changes
+re-queue the parent document, and a stale copy is never served because the
+cache is keyed by the document's content.
+
+A document is queued at most once per transaction, however many of its line
+items are saved, and an item save doesn't load the document again once it is.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import pdf_jobs, rendering
+from .models import Invoice, InvoiceItem, Quote, QuoteItem
+
+PRERENDER_STATUSES = {
+    'invoice': ('unpaid', 'overdue', 'paid'),
+    'quote': ('sent',),
+}
+
+
+def schedule(document):
+    """Queues a render of the document after the current transaction commits, if it qualifies."""
+    if not settings.PDF_PRERENDER_ON_SAVE:
+        return
+    document_type = 'invoice' if isinstance(document, Invoice) else 'quote'
+    if document.status not in PRERENDER_STATUSES[document_type]:
+        return
+    if not _is_scheduled(document_type, document.pk):
+        transaction.on_commit(partial(_enqueue, document_type, document.pk, document.user_id))
+
+
+def _is_scheduled(document_type, object_id):
+    # Callbacks of rolled-back savepoints are dropped from this list, so only ones that will still run are found.
+    return any(
+        isinstance(callback, partial) and callback.func is _enqueue and callback.args[:2] == (document_type, object_id)
+        for _, callback, *_ in transaction.get_connection().run_on_commit
+    )
+
+
+def _enqueue(document_type, object_id, user_id):
+    # The document may have been deleted in the same transaction (e.g. cascading item deletes).
+    if rendering.DOCUMENT_MODELS[document_type].objects.filter(pk=object_id).exists():
+        pdf_jobs.enqueue_by_id(document_type, object_id, user_id)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Quote)
+def prerender_document(sender, instance, **kwargs):
+    schedule(instance)
+
+
+def _item_changed(document_type, item, origin=None):
+    if not settings.PDF_PRERENDER_ON_SAVE:
+        return
+    if origin is not None and origin is not item and getattr(origin, 'model', None) is not type(item):
+        return  # A cascade from deleting the document, so there's nothing to render.
+    object_id = getattr(item, f'{document_type}_id')
+    if _is_scheduled(document_type, object_id):
+        return
+    if getattr(type(item), document_type).is_cached(item):
+        document = getattr(item, document_type)
+    else:
+        document = rendering.DOCUMENT_MODELS[document_type].objects.filter(pk=object_id).only('user_id', 'status').first()
+    if document is not None:
+        schedule(document)
+
+
+@receiver(post_save, sender=InvoiceItem)
+@receiver(post_delete, sender=InvoiceItem)
+def prerender_invoice_for_item(sender, instance, origin=None, **kwargs):
+    _item_changed('invoice', instance, origin)
+
+
+@receiver(post_save, sender=QuoteItem)
+@receiver(post_delete, sender=QuoteItem)
+def prerender_quote_for_item(sender, instance, origin=None, **kwargs):
+    _item_changed('quote', instance, origin)
@@ -0,0 +1,37 @@
+"""
+Process pools for CPU-heavy work such as PDF rendering.
+
+This module deliberately imports no models: spawned workers import it to run
+the initializer before Django is set up.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+    from . import rendering
+    rendering.warm_up()
+
+
+def pool_size(processes=None):
+    """Returns the number of worker processes to use, defaulting to one per CPU core."""
+    return processes or settings.PDF_WORKER_PROCESSES or os.cpu_count() or 1
+
+
+def create_pool(processes=None):
+    """
+    Creates a process pool whose workers each have Django set up.
+    Workers are spawned rather than forked so they never share the parent's database connections.
+    """
+    return ProcessPoolExecutor(
+        max_workers=pool_size(processes),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'lekkerbill.settings'),),
+    )
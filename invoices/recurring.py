@@ -0,0 +1,165 @@
+"""
+Generating invoices from recurring schedules (RecurringInvoice).
+
+The generate_recurring_invoices command calls `generate_due` once a day.
+The due schedules are found with one query on the partial next_run_date
+index, then processed CHUNK_SIZE at a time, one short transaction each.
+Each chunk takes a fixed handful of queries, however many invoices it
+produces:
+
+- lock the chunk's schedules
+- read their line items
+- reserve one block of invoice numbers per user
+- bulk-create the invoices and their items
+- move the schedules on, with one UPDATE per group of schedules that share
+  their new next run date
+
+Profiles are only read, never locked, so a long run doesn't block settings
+changes or numbering. The only rows held between chunks are the chunk's own
+schedules and sequence rows, until its transaction commits.
+
+A schedule that missed runs (e.g. the command didn't run for a few days)
+catches up with one invoice per missed date. Bulk writes send no signals,
+so the usage counters, dashboard stats and PDF pre-rendering are updated
+here, as in conversion.py.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import pdf_jobs, stats, usage
+from .models import DocumentSequence, Invoice, InvoiceItem, Profile, RecurringInvoice, RecurringInvoiceItem
+from .totals import TOTAL_FIELDS, calculate_totals
+
+CHUNK_SIZE = 500
+BATCH_SIZE = 500
+ITEM_FIELDS = ('description', 'long_description', 'quantity', 'unit_price')
+
+
+class GenerationResult:
+    """What a run did."""
+
+    def __init__(self):
+        self.schedules = 0  # Schedules that produced at least one invoice
+        self.invoices = 0
+        self.over_limit = 0  # Schedules held back because their owner is at the Free Plan limit
+
+
+def due_schedules(today):
+    return RecurringInvoice.objects.filter(is_active=True, next_run_date__lte=today)
+
+
+def schedule_from_invoice(invoice):
+    """
+    Returns an unsaved monthly schedule for the invoice's customer and tax rate, with the same
+    payment terms. Save it and then call `copy_items` to give it the invoice's line items.
+    """
+    schedule = RecurringInvoice(
+        user_id=invoice.user_id,
+        customer_id=invoice.customer_id,
+        due_days=max((invoice.due_date - invoice.invoice_date).days, 0),
+        tax_rate=invoice.tax_rate,
+    )
+    schedule.restart(max(invoice.invoice_date + RecurringInvoice.FREQUENCY_STEPS['monthly'], timezone.now().date()))
+    return schedule
+
+
+def copy_items(invoice, schedule):
+    RecurringInvoiceItem.objects.bulk_create(
+        RecurringInvoiceItem(recurring_invoice=schedule, **item)
+        for item in invoice.items.order_by('id').values(*ITEM_FIELDS)
+    )
+
+
+def generate_due(today=None, chunk_size=CHUNK_SIZE, prerender=None):
+    """
+    Generates every invoice that is due up to `today` and returns a GenerationResult. With
+    `prerender` (by default PDF_PRERENDER_ON_SAVE) the new invoices' PDFs are queued for the
+    background PDF worker.
+    """
+    today = today or timezone.now().date()
+    if prerender is None:
+        prerender = settings.PDF_PRERENDER_ON_SAVE
+    result = GenerationResult()
+    schedule_ids = list(due_schedules(today).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(schedule_ids), chunk_size):
+        _generate_chunk(schedule_ids[start:start + chunk_size], today, prerender, result)
+    return result
+
+
+def _generate_chunk(schedule_ids, today, prerender, result):
+    with transaction.atomic():
+        # Re-checked under the lock: a concurrent run may have handled some of these already.
+        schedules = list(due_schedules(today).select_for_update(skip_locked=True).filter(pk__in=schedule_ids).order_by('pk'))
+        if not schedules:
+            return
+        items = defaultdict(list)
+        for row in RecurringInvoiceItem.objects.filter(recurring_invoice__in=schedules).order_by('id').values('recurring_invoice_id', *ITEM_FIELDS):
+            items[row.pop('recurring_invoice_id')].append(row)
+        user_ids = {schedule.user_id for schedule in schedules}
+        allowances = usage.remaining_by_user(user_ids, Invoice)
+        prefixes = dict(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'invoice_prefix'))
+
+        new_invoices = defaultdict(list)  # user id -> [(invoice, schedule id)]
+        schedule_updates = defaultdict(list)  # (next run date, invoices generated, still active) -> [schedule ids]
+        for schedule in schedules:
+            invoice_date, generated = schedule.next_run_date, 0
+            while invoice_date <= today and (schedule.end_date is None or invoice_date <= schedule.end_date):
+                if schedule.user_id in allowances and allowances[schedule.user_id] <= 0:
+                    result.over_limit += 1
+                    break
+                if schedule.user_id in allowances:
+                    allowances[schedule.user_id] -= 1
+                lines = items[schedule.pk]
+                totals = calculate_totals([(line['quantity'], line['unit_price']) for line in lines], schedule.tax_rate)
+                new_invoices[schedule.user_id].append((Invoice(
+                    user_id=schedule.user_id,
+                    customer_id=schedule.customer_id,
+                    invoice_date=invoice_date,
+                    due_date=invoice_date + timedelta(days=schedule.due_days),
+                    tax_rate=schedule.tax_rate,
+                    status='unpaid',
+                    **dict(zip(TOTAL_FIELDS, totals)),
+                ), schedule.pk))
+                generated += 1
+                invoice_date = schedule.occurrence(schedule.run_count + generated)
+            is_active = schedule.end_date is None or invoice_date <= schedule.end_date
+            if generated or not is_active:
+                schedule_updates[(invoice_date, generated, is_active)].append(schedule.pk)
+                result.schedules += bool(generated)
+
+        invoices = []
+        for user_id, user_invoices in new_invoices.items():
+            first_number = DocumentSequence.objects.allocate(user_id, 'invoice', count=len(user_invoices))
+            for offset, (invoice, _) in enumerate(user_invoices):
+                invoice.invoice_number = f"{prefixes.get(user_id, 'INV-')}{first_number + offset}"
+                invoices.append(invoice)
+        Invoice.objects.bulk_create(invoices, batch_size=BATCH_SIZE)
+        InvoiceItem.objects.bulk_create(
+            (
+                InvoiceItem(invoice=invoice, **line)
+                for user_invoices in new_invoices.values()
+                for invoice, schedule_id in user_invoices
+                for line in items[schedule_id]
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        # Schedules on the same cycle end up with the same next date, so one UPDATE per group
+        # is far cheaper than bulk_update's per-row CASE expressions.
+        now = timezone.now()
+        for (next_run_date, generated, is_active), ids in schedule_updates.items():
+            RecurringInvoice.objects.filter(pk__in=ids).update(
+                next_run_date=next_run_date, run_count=F('run_count') + generated, is_active=is_active, updated_at=now,
+            )
+
+        for user_id, user_invoices in new_invoices.items():
+            usage.add(user_id, Invoice, len(user_invoices))
+            stats.invalidate(user_id)
+        if prerender and invoices:
+            pdf_jobs.enqueue_many('invoice', invoices)
+    result.invoices += len(invoices)
@@ -0,0 +1,84 @@
+"""
+Renders invoice and quote PDFs outside of any particular request.
+
+The views, the background PDF worker and any other caller go through
+`get_document_pdf`, which serves from the PDF cache and only falls back to
+a WeasyPrint render on a miss.
+
+Parsing the shared PDF stylesheet and discovering fonts is a large fixed
+cost, so both are done once per process (see `shared_resources`) and reused
+for every document rendered afterwards. Logos and other assets are loaded
+through `pdf_assets.url_fetcher`, so rendering never waits on the network.
+"""
+from functools import lru_cache
+
+from django.contrib.staticfiles import finders
+from django.template.loader import render_to_string
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+from . import pdf_assets, pdf_cache
+from .models import Invoice, Quote
+
+DOCUMENT_MODELS = {'invoice': Invoice, 'quote': Quote}
+
+# Relative media and static URLs only need some base so pdf_assets can recognise them;
+# nothing is ever fetched from it, which lets jobs without a request render identical PDFs.
+DEFAULT_BASE_URL = 'http://localhost/'
+
+
+def pdf_template_name(document):
+    return f'invoices/{pdf_cache.document_type(document)}_pdf.html'
+
+
+def pdf_filename(document):
+    """Returns the download file name, e.g. 'invoice-INV-12.pdf'."""
+    if isinstance(document, Invoice):
+        return f"invoice-{document.invoice_number or document.id}.pdf"
+    return f"quote-{document.quote_number or document.id}.pdf"
+
+
+def load_document(document_type, object_id):
+    """Fetches an invoice or quote with everything the PDF template needs."""
+    model = DOCUMENT_MODELS[document_type]
+    return model.objects.select_related('customer', 'user__profile').get(pk=object_id)
+
+
+@lru_cache(maxsize=None)
+def shared_resources():
+    """
+    Returns the (font configuration, compiled stylesheet) pair shared by every render in this process.
+    The stylesheet must be compiled against the same FontConfiguration that is passed to write_pdf.
+    """
+    font_config = FontConfiguration()
+    stylesheet = CSS(filename=finders.find(pdf_cache.PDF_STYLESHEET), font_config=font_config, url_fetcher=pdf_assets.url_fetcher)
+    return font_config, stylesheet
+
+
+def warm_up():
+    """Loads the shared stylesheet and fonts ahead of the first render, e.g. when a worker starts."""
+    shared_resources()
+
+
+def render_document_pdf(document, base_url=None):
+    """Renders a document to PDF bytes with WeasyPrint, bypassing the cache."""
+    context = {
+        pdf_cache.document_type(document): document,
+        'profile': document.user.profile,
+        'user': document.user,
+    }
+    html_string = render_to_string(pdf_template_name(document), context)
+    font_config, stylesheet = shared_resources()
+    html = HTML(string=html_string, base_url=base_url or DEFAULT_BASE_URL, url_fetcher=pdf_assets.url_fetcher)
+    return html.write_pdf(stylesheets=[stylesheet], font_config=font_config)
+
+
+def get_document_pdf(document, base_url=None):
+    """Returns the PDF bytes for a document from the cache, rendering it on a miss."""
+    return pdf_cache.get_or_render(document, lambda: render_document_pdf(document, base_url))
+
+
+def render_document_by_id(document_type, object_id, base_url=None):
+    """Returns (filename, pdf) for a document. Picklable, so it can run in a worker process."""
+    document = load_document(document_type, object_id)
+    return pdf_filename(document), get_document_pdf(document, base_url)
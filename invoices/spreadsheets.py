@@ -0,0 +1,329 @@
+"""
+Streaming CSV and XLSX reading for the bulk imports, and writing for the exports.
+
+Rows are yielded one at a time as {column name: text} dicts, so a file is
+never loaded whole. XLSX files are read straight from the zip with an
+incremental XML parser. Only the shared-strings table is kept in memory.
+Nothing beyond the standard library is needed, and the sheet is read as
+plain values (the first worksheet, first row as headers, dates as ISO
+strings).
+
+Writing works the other way round: `write_csv` and `write_xlsx` turn an
+iterable of rows into an iterable of byte chunks, which can be handed to a
+StreamingHttpResponse or written to a file as the rows arrive. The XLSX
+worksheet is deflated into the zip as it is written and uses inline
+strings, so nothing is buffered beyond the current chunk. CSV text that a
+spreadsheet would run as a formula is written with a leading quote, which
+`read_rows` strips again.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+from .streaming import StreamBuffer
+
+SPREADSHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+# Built-in number formats that display dates (ECMA-376 18.8.30).
+BUILTIN_DATE_FORMATS = {14, 15, 16, 17, 18, 19, 20, 21, 22, 45, 46, 47}
+EXCEL_EPOCH = datetime(1899, 12, 30)
+EXCEL_EPOCH_DATE = EXCEL_EPOCH.date()
+ROWS_PER_CHUNK = 500
+# Cell style indexes in the exported workbook's styles.xml (see XLSX_PARTS).
+XLSX_DATE_STYLE, XLSX_DATETIME_STYLE, XLSX_HEADER_STYLE = 1, 2, 3
+# Characters XML 1.0 doesn't allow, even escaped.
+ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Text starting with one of these is run as a formula when a CSV is opened in a spreadsheet.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class SpreadsheetError(Exception):
+    """The uploaded file can't be read as a CSV or XLSX sheet."""
+
+
+def normalize_header(name):
+    """Maps "Unit Price" / "unit-price" / " UNIT_PRICE " to "unit_price"."""
+    return re.sub(r'[^a-z0-9]+', '_', str(name or '').strip().lower()).strip('_')
+
+
+def read_rows(file, filename):
+    """Yields (row number, {normalized header: value}) for each non-empty data row of a .csv or .xlsx file."""
+    if filename.lower().endswith('.xlsx'):
+        rows = _xlsx_rows(file)
+    elif filename.lower().endswith('.csv'):
+        rows = _csv_rows(file)
+    else:
+        raise SpreadsheetError("Upload a .csv or .xlsx file.")
+    try:
+        _, header_row = next(rows, (None, []))
+        headers = [normalize_header(name) for name in header_row]
+        if not any(headers):
+            raise SpreadsheetError("The file is empty.")
+        for number, values in rows:
+            if any(value not in (None, '') for value in values):
+                yield number, {header: value for header, value in zip(headers, values) if header}
+    except (UnicodeDecodeError, csv.Error) as error:
+        raise SpreadsheetError(f"The file could not be read as UTF-8 CSV: {error}")
+
+
+def _csv_rows(file):
+    for number, values in enumerate(csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline='')), start=1):
+        # Drop the quote `write_csv` puts in front of formula-like text, so exports import again unchanged.
+        yield number, [value[1:] if value[:1] == "'" and value[1:].startswith(FORMULA_PREFIXES) else value for value in values]
+
+
+def _column_index(reference):
+    """Turns the letters of a cell reference like "AB12" into a 0-based column index."""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _first_sheet_path(archive):
+    with archive.open('xl/workbook.xml') as workbook:
+        for _, element in iterparse(workbook):
+            if element.tag == f'{SPREADSHEET_NS}sheet':
+                relationship_id = element.get(f'{RELATIONSHIP_NS}id')
+                break
+        else:
+            raise SpreadsheetError("The workbook has no sheets.")
+    with archive.open('xl/_rels/workbook.xml.rels') as rels:
+        for _, element in iterparse(rels):
+            if element.get('Id') == relationship_id:
+                target = element.get('Target').lstrip('/')
+                return target if target.startswith('xl/') else f'xl/{target}'
+    raise SpreadsheetError("The workbook's first sheet is missing.")
+
+
+def _shared_strings(archive):
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as source:
+        for _, element in iterparse(source):
+            if element.tag == f'{SPREADSHEET_NS}si':
+                strings.append(''.join(text.text or '' for text in element.iter(f'{SPREADSHEET_NS}t')))
+                element.clear()
+    return strings
+
+
+def _date_styles(archive):
+    """Returns the indexes of the cell styles whose number format is a date."""
+    if 'xl/styles.xml' not in archive.namelist():
+        return set()
+    custom_date_formats, cell_formats, in_cell_formats = set(), [], False
+    with archive.open('xl/styles.xml') as source:
+        for event, element in iterparse(source, events=('start', 'end')):
+            if element.tag == f'{SPREADSHEET_NS}cellXfs':
+                in_cell_formats = event == 'start'
+            elif event == 'end' and element.tag == f'{SPREADSHEET_NS}numFmt':
+                code = re.sub(r'"[^"]*"|\[[^\]]*\]', '', element.get('formatCode', '')).lower()
+                if 'd' in code or 'y' in code:
+                    custom_date_formats.add(int(element.get('numFmtId')))
+            elif event == 'end' and in_cell_formats and element.tag == f'{SPREADSHEET_NS}xf':
+                cell_formats.append(int(element.get('numFmtId', 0)))
+    date_formats = BUILTIN_DATE_FORMATS | custom_date_formats
+    return {index for index, format_id in enumerate(cell_formats) if format_id in date_formats}
+
+
+def _cell_value(cell, shared_strings, date_styles):
+    kind = cell.get('t', 'n')
+    if kind == 'inlineStr':
+        return ''.join(text.text or '' for text in cell.iter(f'{SPREADSHEET_NS}t'))
+    value = cell.findtext(f'{SPREADSHEET_NS}v')
+    if value is None:
+        return ''
+    if kind == 's':
+        return shared_strings[int(value)]
+    if kind == 'b':
+        return 'TRUE' if value == '1' else 'FALSE'
+    if kind == 'n' and int(cell.get('s', 0)) in date_styles:
+        serial = float(value)
+        moment = EXCEL_EPOCH + timedelta(days=serial)
+        return (moment.date() if serial == int(serial) else moment).isoformat()
+    if kind == 'n' and value.endswith('.0'):
+        return value[:-2]
+    return value
+
+
+def _xlsx_rows(file):
+    try:
+        archive = zipfile.ZipFile(file)
+        sheet_path = _first_sheet_path(archive)
+        shared_strings = _shared_strings(archive)
+        date_styles = _date_styles(archive)
+        sheet = archive.open(sheet_path)
+    except (zipfile.BadZipFile, KeyError) as error:
+        raise SpreadsheetError(f"The file is not a valid .xlsx workbook: {error}")
+    with archive, sheet:
+        sheet_data, row_number = None, 0
+        for event, element in iterparse(sheet, events=('start', 'end')):
+            if event == 'start':
+                if element.tag == f'{SPREADSHEET_NS}sheetData':
+                    sheet_data = element
+                continue
+            if element.tag != f'{SPREADSHEET_NS}row':
+                continue
+            values = []
+            for position, cell in enumerate(element.iter(f'{SPREADSHEET_NS}c')):
+                # Empty cells are left out of the XML, so place each value by its reference.
+                index = _column_index(cell.get('r', '')) if cell.get('r') else position
+                values.extend([''] * (index - len(values)))
+                values.append(_cell_value(cell, shared_strings, date_styles))
+            row_number = int(element.get('r') or row_number + 1)
+            # Drop the rows parsed so far, so memory stays flat however long the sheet is.
+            sheet_data.clear()
+            yield row_number, values
+
+
+def write_csv(headers, rows):
+    """Yields a UTF-8 CSV file (with a BOM, so Excel reads accents correctly) in chunks of ROWS_PER_CHUNK rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    # The header goes out on its own first, so the download starts before the first row is read.
+    yield buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_cell(value) for value in row])
+        count += 1
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if count % ROWS_PER_CHUNK:
+        yield buffer.getvalue().encode()
+
+
+def _csv_cell(value):
+    # A leading quote makes spreadsheets show formula-like text as text (CSV injection).
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _column_letters(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xml_cell(reference, value):
+    # Ordered by how common each type is in an export; this runs once per cell.
+    # Text is always an inline string, never a <f> formula, so it needs no escaping like the CSV.
+    if isinstance(value, str):
+        if not value:
+            return ''
+        text = escape(ILLEGAL_XML_CHARS.sub('', value))
+        return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (Decimal, int, float)):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        serial = (value.replace(tzinfo=None) - EXCEL_EPOCH) / timedelta(days=1)
+        return f'<c r="{reference}" s="{XLSX_DATETIME_STYLE}"><v>{serial}</v></c>'
+    if isinstance(value, date):
+        return f'<c r="{reference}" s="{XLSX_DATE_STYLE}"><v>{(value - EXCEL_EPOCH_DATE).days}</v></c>'
+    return _xml_cell(reference, str(value))
+
+
+def _xml_row(number, columns, values):
+    cells = ''.join(_xml_cell(f'{column}{number}', value) for column, value in zip(columns, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm"/></numFmts>'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="4">'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+        '</cellXfs>'
+        '</styleSheet>'
+    ),
+}
+
+
+def write_xlsx(headers, rows, sheet_name='Sheet1'):
+    """Yields an XLSX workbook with one sheet: a bold header row followed by `rows`."""
+    buffer = StreamBuffer()
+    columns = [_column_letters(index) for index in range(len(headers))]
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<workbook xmlns="{SPREADSHEET_NS[1:-1]}" xmlns:r="{RELATIONSHIP_NS[1:-1]}">'
+            f'<sheets><sheet name="{escape(sheet_name[:31], {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        # The worksheet can't be sized in advance, so allow it to pass 4 GB uncompressed.
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            header_cells = ''.join(
+                f'<c r="{column}1" t="inlineStr" s="{XLSX_HEADER_STYLE}"><is><t>{escape(str(header))}</t></is></c>'
+                for column, header in zip(columns, headers)
+            )
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<worksheet xmlns="{SPREADSHEET_NS[1:-1]}"><sheetViews><sheetView workbookViewId="0">'
+                '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>'
+                f'<sheetData><row r="1">{header_cells}</row>'
+            ).encode())
+            yield buffer.drain()
+            lines = []
+            for number, row in enumerate(rows, start=2):
+                lines.append(_xml_row(number, columns, row))
+                if len(lines) >= ROWS_PER_CHUNK:
+                    sheet.write(''.join(lines).encode())
+                    lines = []
+                    yield buffer.drain()
+            sheet.write((''.join(lines) + '</sheetData></worksheet>').encode())
+    yield buffer.drain()
@@ -0,0 +1,117 @@
+"""
+Per-user dashboard statistics, computed in one aggregate query and cached.
+
+The object counts (from the usage counter) and the outstanding/paid invoice
+totals come from a single query against the user row. The result (plus the handful of
+recent documents the dashboard lists) is kept in Django's cache and deleted
+whenever one of the user's customers, invoices, quotes, line items or
+inventory items is saved or deleted, so the dashboard is normally served
+without touching those tables. Bulk `.update()` calls skip the signals; the
+cache timeout bounds how stale the figures can get in that case.
+"""
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import usage
+from .models import Customer, InventoryItem, Invoice, InvoiceItem, Quote
+
+RECENT_DOCUMENTS = 5
+
+
+def _cache_key(user_id):
+    return f'dashboard-stats:{user_id}'
+
+
+def _count(model, **filters):
+    rows = model.objects.filter(user=OuterRef('pk'), **filters).order_by().values('user').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+
+def _sum(model, field, **filters):
+    money = DecimalField(max_digits=14, decimal_places=2)
+    rows = model.objects.filter(user=OuterRef('pk'), **filters).order_by().values('user').annotate(s=Sum(field)).values('s')
+    return Coalesce(Subquery(rows, output_field=money), Value(Decimal('0.00')), output_field=money)
+
+
+def compute_stats(user_id):
+    """Fetches the dashboard figures for a user straight from the database."""
+    # The object counts come from the user's usage counter row, joined in.
+    stats = User.objects.filter(pk=user_id).annotate(
+        customer_count=F('usage__customer_count'),
+        invoice_count=F('usage__invoice_count'),
+        quote_count=F('usage__quote_count'),
+        inventory_count=F('usage__inventory_count'),
+        unpaid_invoice_count=_count(Invoice, status__in=Invoice.OUTSTANDING_STATUSES),
+        unpaid_total=_sum(Invoice, 'total', status__in=Invoice.OUTSTANDING_STATUSES),
+        overdue_invoice_count=_count(Invoice, status='overdue'),
+        paid_total=_sum(Invoice, 'total', status='paid'),
+    ).values(
+        'customer_count', 'invoice_count', 'quote_count', 'inventory_count',
+        'unpaid_invoice_count', 'unpaid_total', 'overdue_invoice_count', 'paid_total',
+    ).get()
+    if stats['customer_count'] is None:
+        # No counter row yet (an account older than the counters); create it from the real counts.
+        counter = usage.get_counter(User(pk=user_id))
+        stats.update({field: getattr(counter, field) for field in usage.COUNTER_FIELDS.values()})
+
+    quote_statuses = dict(Quote.STATUS_CHOICES)
+    stats['recent_invoices'] = list(
+        Invoice.objects.filter(user_id=user_id).order_by('-invoice_date', '-id')
+        .values('id', 'invoice_number', 'invoice_date', 'customer__name')[:RECENT_DOCUMENTS]
+    )
+    stats['recent_quotes'] = [
+        {**quote, 'status_display': quote_statuses.get(quote['status'], quote['status'])}
+        for quote in Quote.objects.filter(user_id=user_id).order_by('-quote_date', '-id')
+        .values('id', 'quote_number', 'status', 'customer__name')[:RECENT_DOCUMENTS]
+    ]
+    return stats
+
+
+def get_stats(user):
+    """Returns the cached dashboard figures for a user, computing them on a miss."""
+    key = _cache_key(user.pk)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(user.pk)
+        cache.set(key, stats, settings.DASHBOARD_STATS_TIMEOUT)
+    return stats
+
+
+def invalidate(user_id):
+    """Drops a user's cached figures once the current transaction commits, so a concurrent miss can't re-cache old data."""
+    transaction.on_commit(partial(cache.delete, _cache_key(user_id)))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=Quote)
+@receiver(post_delete, sender=Quote)
+@receiver(post_save, sender=InventoryItem)
+@receiver(post_delete, sender=InventoryItem)
+def invalidate_for_owner(sender, instance, **kwargs):
+    invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=InvoiceItem)
+@receiver(post_delete, sender=InvoiceItem)
+def invalidate_for_invoice_item(sender, instance, origin=None, **kwargs):
+    # Items change the stored invoice totals behind the outstanding/paid sums.
+    if origin is not None and origin is not instance and getattr(origin, 'model', None) is not InvoiceItem:
+        return  # Cascading from an invoice (or customer/user) delete, which invalidates on its own.
+    if InvoiceItem.invoice.is_cached(instance):
+        invalidate(instance.invoice.user_id)
+    else:
+        user_id = Invoice.objects.filter(pk=instance.invoice_id).values_list('user_id', flat=True).first()
+        if user_id is not None:
+            invalidate(user_id)
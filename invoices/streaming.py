@@ -0,0 +1,25 @@
+"""
+A file object for building archives that are streamed to the client.
+
+Kept free of Django and rendering imports so both the PDF ZIP export and the
+spreadsheet writers can use it without pulling in each other's dependencies.
+"""
+
+
+class StreamBuffer:
+    """A write-only file object that hands back whatever has been written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
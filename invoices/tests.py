@@ -1,3 +1,1082 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from payfast.models import PayFastITN
+
+from . import accounts, bulk_export, conversion, entitlements, exports, imports, line_items, notifications, overdue, pagination, pdf_assets, pdf_cache, pdf_jobs, prerender, process_pool, recurring, rendering, spreadsheets, stats, totals, usage
+from .forms import DocumentFilterForm
+from .models import ArchivedNotification, Customer, DocumentSequence, InventoryItem, Invoice, InvoiceItem, Notification, PDFCacheEntry, PDFRenderJob, Quote, RecurringInvoice, Subscription, deferred_totals
+
+
+class QueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN on the hot per-user queries over a seeded dataset and fails if one of them
+    falls back to scanning a whole table (or, on SQLite, sorting in a temporary B-tree
+    instead of reading rows in index order). Works on SQLite and PostgreSQL.
+    """
+    USERS = 40
+    ROWS_PER_USER = 150
+
+    @classmethod
+    def setUpTestData(cls):
+        # bulk_create skips the signals and numbering in save(), which keeps seeding fast.
+        users = User.objects.bulk_create(User(username=f'plan-{n}') for n in range(cls.USERS))
+        Subscription.objects.bulk_create(Subscription(user=user, payfast_token=f'token-{user.pk}') for user in users)
+        customers = Customer.objects.bulk_create(
+            Customer(user=user, name=f'Customer {n:04d}') for user in users for n in range(cls.ROWS_PER_USER // 10)
+        )
+        customers_by_user = {}
+        for customer in customers:
+            customers_by_user.setdefault(customer.user_id, []).append(customer)
+
+        start = date(2025, 1, 1)
+        invoices, quotes, inventory = [], [], []
+        for user in users:
+            user_customers = customers_by_user[user.pk]
+            for n in range(cls.ROWS_PER_USER):
+                customer = user_customers[n % len(user_customers)]
+                day = start + timedelta(days=n)
+                invoices.append(Invoice(user=user, customer=customer, invoice_date=day, due_date=day, status=('unpaid', 'paid')[n % 2]))
+                quotes.append(Quote(user=user, customer=customer, quote_date=day, status=('draft', 'sent', 'accepted')[n % 3]))
+                inventory.append(InventoryItem(user=user, name=f'Item {n:04d}', unit_price=Decimal('10.00')))
+        Invoice.objects.bulk_create(invoices, batch_size=1000)
+        Quote.objects.bulk_create(quotes, batch_size=1000)
+        InventoryItem.objects.bulk_create(inventory, batch_size=1000)
+        PayFastITN.objects.bulk_create(
+            (PayFastITN(raw_post_data='', m_payment_id=str(n), token=f'token-{n}') for n in range(cls.USERS * 50)), batch_size=1000
+        )
+        Notification.objects.bulk_create(
+            (Notification(user=user, message='Quote accepted.', is_read=n % 5 > 0) for user in users for n in range(cls.ROWS_PER_USER)), batch_size=1000
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = users[len(users) // 2]
+
+    def hot_queries(self):
+        """Returns {name: (queryset, must_read_in_index_order)}."""
+        user = self.user
+        customer = Customer.objects.filter(user=user).first()
+        public_id = Invoice.objects.filter(user=user).values_list('public_id', flat=True)[0]
+        return {
+            'invoice list': (Invoice.objects.filter(user=user).select_related('customer').order_by('-invoice_date', '-id')[:51], True),
+            'invoice list by status': (Invoice.objects.filter(user=user, status='unpaid').order_by('-invoice_date', '-id')[:51], False),
+            'invoice list by customer': (Invoice.objects.filter(user=user, customer=customer).order_by('-invoice_date', '-id')[:51], False),
+            'quote list': (Quote.objects.filter(user=user).select_related('customer').order_by('-quote_date', '-id')[:51], True),
+            'quote list by status': (Quote.objects.filter(user=user, status='sent').order_by('-quote_date', '-id')[:51], False),
+            'customer list': (Customer.objects.filter(user=user).order_by('name', 'id')[:51], True),
+            'inventory list': (InventoryItem.objects.filter(user=user).order_by('name', 'id')[:51], True),
+            'invoices by amount': (Invoice.objects.filter(user=user).order_by('-total')[:51], True),
+            'public invoice': (Invoice.objects.filter(public_id=public_id), False),
+            'subscription by token': (Subscription.objects.filter(payfast_token=f'token-{user.pk}'), False),
+            'ITN by payment id': (PayFastITN.objects.filter(m_payment_id='7'), False),
+            'ITN by token': (PayFastITN.objects.filter(token='token-7'), False),
+            'unread notifications': (Notification.objects.filter(user=user, is_read=False).order_by('-created_at', '-id')[:10], True),
+            'notifications to prune': (Notification.objects.filter(is_read=True, created_at__lt=timezone.now()).order_by('created_at', 'id')[:1000], True),
+        }
+
+    def problems(self, plan, check_sort):
+        if connection.vendor == 'postgresql':
+            return re.findall(r'Seq Scan on (\w+)', plan)
+        if connection.vendor == 'sqlite':
+            # "SEARCH t USING INDEX ..." is fine; "SCAN t" reads the whole table and a temp B-tree means a sort.
+            problems = re.findall(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)', plan)
+            if check_sort and 'USE TEMP B-TREE' in plan:
+                problems.append('sort')
+            return problems
+        self.skipTest(f"No plan checks for {connection.vendor}.")
+
+    def test_hot_queries_use_indexes(self):
+        for name, (queryset, check_sort) in self.hot_queries().items():
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                self.assertEqual(self.problems(plan, check_sort), [], f"{name} no longer uses an index:\n{plan}")
+
+
+class ThreadedTestCase(TransactionTestCase):
+    """
+    Runs work from many threads at once, each with its own database connection. Needs a test
+    database that several connections can share, i.e. not SQLite's in-memory one.
+    """
+    THREADS = 8
+    PER_THREAD = 10
+
+    def hammer(self, work):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Threads can't share an in-memory SQLite test database.")
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def run():
+            try:
+                barrier.wait()
+                for _ in range(self.PER_THREAD):
+                    work()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class TemporaryMediaMixin:
+    """
+    Stores files in a throwaway folder on local disk for the test, so rendered PDFs never
+    land in the real MEDIA_ROOT or in Spaces. Use it for every test that renders or stores a PDF.
+    """
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        storage = override_settings(
+            MEDIA_ROOT=media_root,
+            STORAGES={**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'}},
+        )
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+
+class DocumentNumberingTests(ThreadedTestCase):
+    """Documents created from many threads at once get unique, gap-free numbers."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('numbering')
+        self.customer = Customer.objects.create(user=self.user, name='Customer')
+
+    def numbers(self, model, field, prefix):
+        return sorted(int(number.removeprefix(prefix)) for number in model.objects.values_list(field, flat=True))
+
+    def test_concurrent_creates_get_unique_gap_free_numbers(self):
+        self.hammer(lambda: Invoice.objects.create(user_id=self.user.pk, customer_id=self.customer.pk, due_date=date.today()))
+
+        created = self.THREADS * self.PER_THREAD
+        self.assertEqual(self.numbers(Invoice, 'invoice_number', 'INV-'), list(range(1, created + 1)))
+        self.assertEqual(DocumentSequence.objects.next_numbers(self.user.pk), {'invoice': created + 1, 'quote': 1})
+
+    def test_block_reservations_do_not_overlap_single_creates(self):
+        reserved = []
+        lock = threading.Lock()
+
+        def work():
+            Quote.objects.create(user_id=self.user.pk, customer_id=self.customer.pk)
+            first = DocumentSequence.objects.allocate(self.user.pk, 'quote', count=5)
+            with lock:
+                reserved.extend(range(first, first + 5))
+
+        self.hammer(work)
+
+        issued = sorted(self.numbers(Quote, 'quote_number', 'QTE-') + reserved)
+        self.assertEqual(issued, list(range(1, self.THREADS * self.PER_THREAD * 6 + 1)))
+
+    def test_rolled_back_create_returns_its_number(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Invoice.objects.create(user=self.user, customer=self.customer, due_date=date.today())
+            raise RuntimeError
+        invoice = Invoice.objects.create(user=self.user, customer=self.customer, due_date=date.today())
+        self.assertEqual(invoice.invoice_number, 'INV-1')
+
+
+class ImportExportTests(TestCase):
+    """CSV imports validate each row, skip bad ones and keep invoice numbering consistent; exports import again."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('importer')
+        Subscription.objects.filter(user=cls.user).update(
+            plan='pro', status='active', subscription_end_date=date.today() + timedelta(days=30)
+        )
+
+    def run_import(self, kind, text):
+        user = User.objects.select_related('profile', 'subscription').get(pk=self.user.pk)
+        return imports.run_import(kind, user, io.BytesIO(text.encode()), f'{kind}.csv')
+
+    def test_customers_report_bad_rows_and_import_the_rest(self):
+        result = self.run_import('customers', "Name,Email\nAcme,acme@example.com\n,nameless@example.com\nBeta,not-an-email\n")
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([row for row, _ in result.errors], [3, 4])
+        self.assertEqual(list(Customer.objects.filter(user=self.user).values_list('name', flat=True)), ['Acme'])
+
+    def test_invoice_rows_are_grouped_and_numbering_continues_after_them(self):
+        Customer.objects.create(user=self.user, name='Acme')
+        result = self.run_import('invoices', (
+            "invoice_number,customer,invoice_date,description,quantity,unit_price,tax_rate\n"
+            "INV-40,acme,2024-02-01,Design,2,100,15\n"
+            "INV-40,,,Hosting,1,50,\n"
+            ",Acme,01/03/2024,Support,1,10,0\n"
+        ))
+
+        self.assertEqual((result.created, result.error_count), (2, 0))
+        imported = Invoice.objects.get(invoice_number='INV-40')
+        self.assertEqual((imported.items.count(), imported.subtotal, imported.total), (2, Decimal('250.00'), Decimal('287.50')))
+        self.assertTrue(Invoice.objects.filter(invoice_number='INV-41', invoice_date=date(2024, 3, 1)).exists())
+        customer = Customer.objects.get(user=self.user)
+        self.assertEqual(Invoice.objects.create(user=self.user, customer=customer, due_date=date.today()).invoice_number, 'INV-42')
+
+    def test_imported_numbers_are_never_handed_out_again(self):
+        customer = Customer.objects.create(user=self.user, name='Acme')
+        Invoice.objects.create(user=self.user, customer=customer, due_date=date.today())
+        result = self.run_import('invoices', (
+            "invoice_number,customer,invoice_date,description,quantity,unit_price\n"
+            "INV-2,Acme,2024-02-01,Design,1,100\n"
+            ",Acme,2024-02-02,Hosting,1,50\n"
+            "INV-1,Acme,2024-02-03,Support,1,10\n"
+            "INV-2,Acme,2024-02-04,Domain,1,20\n"
+            ",Acme,2024-02-05,Backup,1,5\n"
+        ))
+
+        self.assertEqual((result.created, sorted(row for row, _ in result.errors)), (3, [4, 5]))
+        numbers = Invoice.objects.filter(user=self.user).values_list('invoice_number', flat=True)
+        self.assertEqual(sorted(numbers), ['INV-1', 'INV-2', 'INV-3', 'INV-4'])
+        self.assertEqual(Invoice.objects.create(user=self.user, customer=customer, due_date=date.today()).invoice_number, 'INV-5')
+
+    def test_saved_chunks_advance_numbering_when_the_file_breaks_part_way(self):
+        customer = Customer.objects.create(user=self.user, name='Acme')
+        rows = ''.join(f"INV-{n},Acme,2024-02-01,Design,1,100\n" for n in range(1, 301))
+        # The invalid byte sits past the first block the CSV reader decodes, so earlier rows are imported first.
+        text = "invoice_number,customer,invoice_date,description,quantity,unit_price\n" + rows
+        with mock.patch.object(imports, 'CHUNK_SIZE', 50):
+            user = User.objects.select_related('profile', 'subscription').get(pk=self.user.pk)
+            result = imports.run_import('invoices', user, io.BytesIO(text.encode() + b'\xff\n'), 'invoices.csv')
+
+        self.assertTrue(result.stopped_by)
+        self.assertEqual(result.created % 50, 0)
+        self.assertGreater(result.created, 0)
+        invoice = Invoice.objects.create(user=self.user, customer=customer, due_date=date.today())
+        self.assertEqual(invoice.invoice_number, f'INV-{result.created + 1}')
+
+    def test_csv_header_is_sent_before_any_row_is_read(self):
+        def rows():
+            raise AssertionError("Rows were read before the header was sent.")
+            yield
+
+        self.assertEqual(next(spreadsheets.write_csv(['name', 'email'], rows())), '\ufeffname,email\r\n'.encode())
+
+    def test_invoice_lines_export_imports_again(self):
+        customer = Customer.objects.create(user=self.user, name='Acme')
+        invoice = Invoice.objects.create(user=self.user, customer=customer, invoice_date=date(2024, 5, 1), due_date=date(2024, 5, 31), tax_rate=15)
+        invoice.items.create(description='Design, "final"', quantity=Decimal('1.5'), unit_price=Decimal('3.33'))
+        invoice.items.create(description='Hosting', quantity=1, unit_price=50)
+        invoice.recalculate_totals()
+
+        exported = b''.join(exports.stream('invoices', self.user, 'csv', lines=True)).decode('utf-8-sig')
+        self.assertIn(',1.50,3.33,5.00\r\n', exported)
+        invoice.delete()
+        result = self.run_import('invoices', exported)
+
+        self.assertEqual((result.created, result.error_count), (1, 0))
+        imported = Invoice.objects.get(user=self.user)
+        self.assertEqual((imported.invoice_number, imported.total), (invoice.invoice_number, invoice.total))
+
+    def test_formula_like_text_is_exported_as_text(self):
+        customer = Customer.objects.create(user=self.user, name='=HYPERLINK("http://evil.example","Acme")')
+        invoice = Invoice.objects.create(user=self.user, customer=customer, invoice_date=date(2024, 5, 1), due_date=date(2024, 5, 31))
+        invoice.items.create(description='-10% discount', quantity=1, unit_price=-5)
+        invoice.items.create(description='@SUM(A1)', quantity=1, unit_price=50)
+
+        exported = b''.join(exports.stream('invoices', self.user, 'csv', lines=True)).decode('utf-8-sig')
+        self.assertIn('"\'=HYPERLINK(""http://evil.example"",""Acme"")"', exported)
+        self.assertIn(",'-10% discount,,1.00,-5.00,-5.00\r\n", exported)
+        self.assertIn(",'@SUM(A1),", exported)
+
+        workbook = zipfile.ZipFile(io.BytesIO(b''.join(exports.stream('invoices', self.user, 'xlsx', lines=True))))
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertNotIn('<f>', sheet)
+        self.assertIn('t="inlineStr"><is><t xml:space="preserve">-10% discount</t>', sheet)
+
+        invoice.delete()
+        result = self.run_import('invoices', exported)
+        self.assertEqual((result.created, result.error_count), (1, 0))
+        self.assertEqual(Customer.objects.get(user=self.user).name, customer.name)
+        self.assertEqual(
+            sorted(InvoiceItem.objects.filter(invoice__user=self.user).values_list('description', flat=True)),
+            ['-10% discount', '@SUM(A1)'],
+        )
+
+
+class RecurringInvoiceTests(TestCase):
+    """Schedules catch up on missed dates, stay on their day of the month and stop after their end date."""
+
+    def test_generate_due_catches_up_and_stops_at_end_date(self):
+        user = User.objects.create_user('recurring')
+        customer = Customer.objects.create(user=user, name='Acme')
+        schedule = RecurringInvoice.objects.create(
+            user=user, customer=customer, frequency='monthly', start_date=date(2026, 1, 31), next_run_date=date(2026, 1, 31),
+            end_date=date(2026, 4, 30), due_days=10, tax_rate=15,
+        )
+        schedule.items.create(description='Retainer', quantity=2, unit_price=50)
+
+        result = recurring.generate_due(today=date(2026, 3, 31))
+        self.assertEqual(result.invoices, 3)
+        self.assertEqual(recurring.generate_due(today=date(2026, 3, 31)).invoices, 0)
+        recurring.generate_due(today=date(2026, 6, 1))
+
+        invoices = list(Invoice.objects.order_by('invoice_date').values_list('invoice_number', 'invoice_date', 'due_date', 'total'))
+        self.assertEqual(invoices, [
+            ('INV-1', date(2026, 1, 31), date(2026, 2, 10), Decimal('115.00')),
+            ('INV-2', date(2026, 2, 28), date(2026, 3, 10), Decimal('115.00')),
+            ('INV-3', date(2026, 3, 31), date(2026, 4, 10), Decimal('115.00')),
+            ('INV-4', date(2026, 4, 30), date(2026, 5, 10), Decimal('115.00')),
+        ])
+        schedule.refresh_from_db()
+        self.assertEqual((schedule.run_count, schedule.is_active), (4, False))
+
+
+class OverdueSweepTests(TestCase):
+    """The sweeper marks only unpaid invoices past their due date, once, and notifies each owner once per batch."""
+
+    def test_mark_overdue_is_batched_and_idempotent(self):
+        user = User.objects.create_user('sweeper')
+        customer = Customer.objects.create(user=user, name='Acme')
+        today = date(2026, 5, 1)
+        for days, status in ((-10, 'unpaid'), (-5, 'unpaid'), (-1, 'unpaid'), (-10, 'paid'), (-10, 'proforma'), (0, 'unpaid')):
+            Invoice.objects.create(user=user, customer=customer, due_date=today + timedelta(days=days), status=status)
+
+        result = overdue.mark_overdue(today=today, batch_size=2)
+        self.assertEqual((result.invoices, result.batches, result.notifications), (3, 2, 2))
+        self.assertEqual(overdue.mark_overdue(today=today).invoices, 0)
+
+        self.assertEqual(
+            sorted(Invoice.objects.values_list('status', flat=True)),
+            ['overdue', 'overdue', 'overdue', 'paid', 'proforma', 'unpaid'],
+        )
+        self.assertEqual(Notification.objects.filter(user=user, is_read=False).count(), 2)
+
+
+class SubscriptionExpiryTests(TestCase):
+    """Lapsed Pro subscriptions expire in one run, and the cached entitlement follows."""
+
+    def test_expire_lapsed_ends_pro_entitlement(self):
+        today = date.today()
+        users = {}
+        for name, status, end_date in (('lapsed', 'active', -1), ('cancelled', 'cancelled', -1), ('paid-up', 'active', 0)):
+            users[name] = User.objects.create_user(name)
+            Subscription.objects.filter(user=users[name]).update(plan='pro', status=status, subscription_end_date=today + timedelta(days=end_date))
+        self.assertTrue(entitlements.get(users['paid-up'].pk).is_pro)
+        Subscription.objects.filter(user=users['lapsed']).update(subscription_end_date=today)
+        self.assertTrue(entitlements.get(users['lapsed'].pk).is_pro)
+        Subscription.objects.filter(user=users['lapsed']).update(subscription_end_date=today - timedelta(days=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(entitlements.expire_lapsed(today), 2)
+        self.assertEqual(entitlements.expire_lapsed(today), 0)
+
+        self.assertEqual(
+            dict(Subscription.objects.filter(user__in=users.values()).values_list('user__username', 'status')),
+            {'lapsed': 'expired', 'cancelled': 'expired', 'paid-up': 'active'},
+        )
+        self.assertFalse(entitlements.get(users['lapsed'].pk).is_pro)
+        self.assertIsNone(usage.remaining(users['paid-up'], Invoice))
+        self.assertEqual(usage.remaining(users['lapsed'], Invoice), entitlements.Entitlement(False).item_limit)
+
+
+    def test_cancelled_pro_lasts_until_end_date_and_pro_needs_an_end_date(self):
+        today = date.today()
+        users = {}
+        for name, status, end_date in (('cancelled', 'cancelled', today + timedelta(days=10)), ('open-ended', 'active', None)):
+            users[name] = User.objects.create_user(name)
+            Subscription.objects.filter(user=users[name]).update(plan='pro', status=status, subscription_end_date=end_date)
+
+        cancelled, open_ended = (Subscription.objects.get(user=users[name]) for name in ('cancelled', 'open-ended'))
+        self.assertTrue(cancelled.is_currently_active)
+        self.assertFalse(open_ended.is_currently_active)
+        self.assertEqual(entitlements.get(users['cancelled'].pk).valid_until, today + timedelta(days=10))
+        self.assertIsNone(usage.remaining(users['cancelled'], Invoice))
+        self.assertFalse(entitlements.get(users['open-ended'].pk).is_pro)
+        self.assertEqual(usage.remaining(users['open-ended'], Invoice), entitlements.Entitlement(False).item_limit)
+        self.assertEqual(
+            usage.remaining_by_user([user.pk for user in users.values()], Invoice),
+            {users['open-ended'].pk: entitlements.Entitlement(False).item_limit},
+        )
+
+        # Neither has lapsed, so the expiry job leaves both alone.
+        self.assertEqual(entitlements.expire_lapsed(today), 0)
+        self.assertEqual(Subscription.objects.filter(user__in=users.values(), status='expired').count(), 0)
+
+
+class NotificationRetentionTests(TestCase):
+    """Repeated events share one unread notification, unread ones are capped and old read ones pruned."""
+
+    def test_notify_dedupes_caps_and_prune_archives(self):
+        user = User.objects.create_user('notified')
+        with self.settings(NOTIFICATION_UNREAD_LIMIT=3):
+            notifications.notify(user.pk, "Quote #1 has been accepted.", dedupe_key='quote:1')
+            notifications.notify(user.pk, "Quote #1 has been rejected.", dedupe_key='quote:1')
+            for n in range(2, 5):
+                notifications.notify(user.pk, f"Quote #{n} has been accepted.", dedupe_key=f'quote:{n}')
+
+        unread = Notification.objects.filter(user=user, is_read=False).order_by('-created_at', '-id')
+        self.assertEqual(list(unread.values_list('message', flat=True)), [f"Quote #{n} has been accepted." for n in (4, 3, 2)])
+        self.assertEqual(Notification.objects.get(dedupe_key='quote:1').message, "Quote #1 has been rejected.")
+
+        notifications.notify(user.pk, "Quote #1 has been accepted.", dedupe_key='quote:1')
+        self.assertEqual(Notification.objects.filter(dedupe_key='quote:1').count(), 2)
+
+        pruned = notifications.prune(before=timezone.now() + timedelta(seconds=1), archive=True, batch_size=1)
+        self.assertEqual(pruned, (1, 1))
+        self.assertEqual(list(ArchivedNotification.objects.values_list('message', flat=True)), ["Quote #1 has been rejected."])
+        self.assertEqual(Notification.objects.filter(user=user).count(), 4)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class NotificationCacheTests(TestCase):
+    """The unread badge comes from the cache until a notification is added or read."""
+
+    def test_summary_is_cached_until_notifications_change(self):
+        user = User.objects.create_user('badge')
+        Notification.objects.create(user=user, message="Quote #1 has been accepted.")
+
+        self.assertEqual(notifications.get_unread_summary(user.pk)['count'], 1)
+        with self.assertNumQueries(0):
+            notifications.get_unread_summary(user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.notify(user.pk, "Quote #2 has been accepted.")
+        summary = notifications.get_unread_summary(user.pk)
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['latest'][0]['message'], "Quote #2 has been accepted.")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.mark_all_read(user)
+        self.assertEqual(notifications.get_unread_summary(user.pk), {'count': 0, 'latest': []})
+
+
+class AccountTests(TestCase):
+    """Signing up logs the new user in, and later requests load the user, profile and subscription together."""
+
+    def test_signup_logs_in_and_shows_dashboard(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'newbie', 'email': 'newbie@example.com', 'password1': 'a-Long-passw0rd', 'password2': 'a-Long-passw0rd',
+        }, follow=True)
+
+        self.assertRedirects(response, reverse('dashboard'))
+        self.assertEqual(response.context['user'].username, 'newbie')
+        self.assertEqual(self.client.session['_auth_user_backend'], 'invoices.accounts.AccountBackend')
+
+    def test_user_is_loaded_with_profile_and_subscription_in_one_query(self):
+        user_id = User.objects.create_user('loaded').pk
+
+        with self.assertNumQueries(1):
+            user = accounts.AccountBackend().get_user(user_id)
+            self.assertEqual((user.profile.user_id, user.subscription.plan), (user_id, 'free'))
+
+
+class ListPageTests(TestCase):
+    """Keyset cursors walk a list without gaps or repeats, and the customer filter only accepts the user's own customers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lister')
+        cls.acme = Customer.objects.create(user=cls.user, name='Acme')
+        cls.beta = Customer.objects.create(user=cls.user, name='Beta')
+        for day, customer in ((1, cls.acme), (2, cls.beta), (2, cls.acme), (2, cls.beta), (3, cls.acme)):
+            Invoice.objects.create(user=cls.user, customer=customer, invoice_date=date(2026, 1, day), due_date=date(2026, 2, 1))
+        cls.other_customer = Customer.objects.create(user=User.objects.create_user('other'), name='Other Co')
+
+    def test_cursor_pages_cover_every_row_once(self):
+        ordering = ('-invoice_date', '-id')
+        expected = list(Invoice.objects.filter(user=self.user).order_by(*ordering).values_list('pk', flat=True))
+        seen, cursor = [], None
+        while True:
+            page = pagination.paginate(Invoice.objects.filter(user=self.user), ordering, cursor, page_size=2)
+            seen += [invoice.pk for invoice in page.items]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_customer_filter_renders_only_the_picked_customer(self):
+        invoices = Invoice.objects.filter(user=self.user)
+        with self.assertNumQueries(1):
+            form = DocumentFilterForm({'customer': str(self.beta.pk)}, user=self.user, status_choices=Invoice.STATUS_CHOICES)
+        self.assertEqual(form.filter_queryset(invoices, 'invoice_date').count(), 2)
+        self.assertEqual([label for _, label in form.fields['customer'].widget.choices], ['All customers', 'Beta'])
+
+        foreign = DocumentFilterForm({'customer': str(self.other_customer.pk)}, user=self.user, status_choices=Invoice.STATUS_CHOICES)
+        self.assertIn('customer', foreign.errors)
+        self.assertEqual(foreign.filter_queryset(invoices, 'invoice_date').count(), 5)
+
+    def test_customer_search_returns_matching_names(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('customer_list'), {'format': 'json', 'q': 'ac'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Acme'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardStatsTests(TestCase):
+    """Dashboard figures come from the cache until one of the user's objects changes."""
+
+    def test_cached_stats_are_dropped_when_an_invoice_changes(self):
+        user = User.objects.create_user('stats')
+        customer = Customer.objects.create(user=user, name='Acme')
+        invoice = Invoice.objects.create(user=user, customer=customer, due_date=date.today())
+        invoice.items.create(description='Design', quantity=1, unit_price=100)
+
+        self.assertEqual(stats.get_stats(user)['unpaid_total'], Decimal('100.00'))
+        with self.assertNumQueries(0):
+            stats.get_stats(user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.items.create(description='Hosting', quantity=1, unit_price=50)
+        self.assertEqual(stats.get_stats(user)['unpaid_total'], Decimal('150.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Invoice.objects.filter(pk=invoice.pk).get().delete()
+        self.assertEqual((stats.get_stats(user)['invoice_count'], stats.get_stats(user)['unpaid_total']), (0, Decimal('0.00')))
+
+
+class LineItemDiffTests(TestCase):
+    """save_items only writes the rows that changed and keeps the stored totals right."""
+
+    def test_changes_are_applied_as_one_diff(self):
+        user = User.objects.create_user('editor')
+        invoice = Invoice.objects.create(user=user, customer=Customer.objects.create(user=user, name='Acme'), due_date=date.today(), tax_rate=10)
+        design, hosting, support = (invoice.items.create(description=name, quantity=1, unit_price=100) for name in ('Design', 'Hosting', 'Support'))
+
+        counts = line_items.save_items(invoice, [
+            {'id': design.pk, 'description': 'Design', 'quantity': Decimal('2'), 'unit_price': Decimal('100')},
+            {'id': hosting.pk, 'delete': True},
+            {'id': None, 'description': 'Domain', 'quantity': Decimal('1'), 'unit_price': Decimal('20')},
+        ])
+
+        self.assertEqual(counts, (1, 1, 1))
+        self.assertEqual(sorted(invoice.items.values_list('description', 'quantity')), [('Design', 2), ('Domain', 1), ('Support', 1)])
+        self.assertEqual(invoice.total, Decimal('352.00'))
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).total, Decimal('352.00'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(line_items.save_items(invoice, [{'id': support.pk, 'description': 'Support', 'quantity': 1, 'unit_price': 100}]), (0, 0, 0))
+        self.assertEqual(line_items.save_items(invoice, [], replace=True), (0, 0, 3))
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).total, Decimal('0.00'))
+
+
+@override_settings(PDF_CACHE_ENABLED=True)
+class PDFCacheTests(TemporaryMediaMixin, TestCase):
+    """Rendered PDFs are reused until something on the page changes, and then replaced."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renderer')
+        self.invoice = Invoice.objects.create(user=self.user, customer=Customer.objects.create(user=self.user, name='Acme'), due_date=date.today())
+        self.item = self.invoice.items.create(description='Design', quantity=1, unit_price=100)
+        self.renders = []
+
+    def render(self):
+        self.renders.append(1)
+        return f'%PDF render {len(self.renders)}'.encode()
+
+    def get_pdf(self):
+        return pdf_cache.get_or_render(Invoice.objects.get(pk=self.invoice.pk), self.render)
+
+    def test_pdf_is_rendered_once_until_the_document_changes(self):
+        self.assertEqual(self.get_pdf(), b'%PDF render 1')
+        self.assertEqual(self.get_pdf(), b'%PDF render 1')
+
+        key = pdf_cache.document_fingerprint(Invoice.objects.get(pk=self.invoice.pk))
+        self.item.quantity = 2
+        self.item.save()
+        self.assertNotEqual(pdf_cache.document_fingerprint(Invoice.objects.get(pk=self.invoice.pk)), key)
+        self.assertEqual(self.get_pdf(), b'%PDF render 2')
+        # The stale copy is dropped once its replacement is stored.
+        self.assertEqual(PDFCacheEntry.objects.filter(object_id=self.invoice.pk).count(), 1)
+
+    def test_invalidation_removes_entries_and_files(self):
+        self.get_pdf()
+        entry = PDFCacheEntry.objects.get()
+        storage, name = entry.file.storage, entry.file.name
+        self.assertTrue(storage.exists(name))
+
+        self.assertEqual(pdf_cache.invalidate_document(self.invoice), 1)
+        self.assertFalse(PDFCacheEntry.objects.exists())
+        self.assertFalse(storage.exists(name))
+        self.get_pdf()
+        self.assertEqual(pdf_cache.invalidate_user(self.user), 1)
+
+    @override_settings(PDF_REDIRECT_TO_STORAGE=True)
+    def test_only_public_downloads_redirect_to_storage(self):
+        self.get_pdf()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('invoice_pdf', args=[self.invoice.pk]))
+        self.assertEqual((response.status_code, response.content), (200, b'%PDF render 1'))
+
+        self.client.logout()
+        response = self.client.get(reverse('invoice_public_pdf', args=[self.invoice.public_id]))
+        self.assertRedirects(response, PDFCacheEntry.objects.get().file.url, fetch_redirect_response=False)
+
+
+class PDFJobQueueTests(TestCase):
+    """A document has at most one waiting job, each job is claimed once, and lost jobs go back in the queue."""
+
+    def test_enqueue_reuses_waiting_job_and_claims_are_exclusive(self):
+        user = User.objects.create_user('queued')
+        invoice = Invoice.objects.create(user=user, customer=Customer.objects.create(user=user, name='Acme'), due_date=date.today())
+
+        job = pdf_jobs.enqueue(invoice)
+        self.assertEqual(pdf_jobs.enqueue(invoice).pk, job.pk)
+        self.assertEqual(pdf_jobs.claim_jobs(5), [job.pk])
+        self.assertEqual(pdf_jobs.claim_jobs(5), [])
+        # Once the job is running, a new request queues a fresh render.
+        self.assertNotEqual(pdf_jobs.enqueue(invoice).pk, job.pk)
+
+        PDFRenderJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        with self.settings(PDF_JOB_TIMEOUT=60):
+            self.assertEqual(pdf_jobs.requeue_stale_jobs(), 1)
+        self.assertEqual(PDFRenderJob.objects.get(pk=job.pk).status, 'queued')
+
+    def test_worker_replaces_a_pool_whose_process_died(self):
+        user = User.objects.create_user('crashing')
+        customer = Customer.objects.create(user=user, name='Acme')
+        first, second = (pdf_jobs.enqueue(Invoice.objects.create(user=user, customer=customer, due_date=date.today())) for _ in range(2))
+        pools = [
+            FakeProcessPool(broken='mid-render'),
+            FakeProcessPool(broken='before-submit'),
+            FakeProcessPool(work=lambda job_id: PDFRenderJob.objects.filter(pk=job_id).update(status='done') and 'done'),
+        ]
+
+        with mock.patch.object(process_pool, 'create_pool', side_effect=pools), self.assertLogs('invoices.pdf_jobs', 'ERROR'):
+            pdf_jobs.run_worker(processes=1, poll_interval=0, once=True)
+
+        self.assertEqual([pool.submitted for pool in pools], [[(first.pk,)], [], [(second.pk,)]])
+        self.assertEqual([len(pool.shutdowns) for pool in pools], [1, 1, 1])
+        first.refresh_from_db()
+        self.assertEqual((first.status, PDFRenderJob.objects.get(pk=second.pk).status), ('failed', 'done'))
+        self.assertIn('terminated', first.error)
+
+
+class PDFJobAccessTests(TemporaryMediaMixin, TestCase):
+    """Only a job's owner, or someone holding the document's public link, can follow or download a background render."""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user('owner')
+        self.invoice = Invoice.objects.create(user=self.owner, customer=Customer.objects.create(user=self.owner, name='Acme'), due_date=date.today())
+        self.job = pdf_jobs.enqueue(self.invoice)
+        self.job.file.save('invoice-INV-1.pdf', ContentFile(b'%PDF job'), save=False)
+        self.job.status = 'done'
+        self.job.save()
+        self.urls = [reverse('pdf_job_status', args=[self.job.pk]), reverse('pdf_job_download', args=[self.job.pk])]
+
+    def test_only_the_owner_can_see_the_job(self):
+        self.client.force_login(User.objects.create_user('someone-else'))
+        for url in self.urls:
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.logout()
+        for url in self.urls:
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(self.urls[0]).json()['download_url'], self.urls[1])
+        self.assertEqual(b''.join(self.client.get(self.urls[1]).streaming_content), b'%PDF job')
+
+    def test_public_link_holders_can_follow_their_document(self):
+        self.assertEqual(self.client.get(self.urls[1], {'public_id': str(uuid.uuid4())}).status_code, 404)
+        self.assertEqual(self.client.get(self.urls[1], {'public_id': 'not-a-uuid'}).status_code, 404)
+
+        response = self.client.get(self.urls[0], {'public_id': str(self.invoice.public_id)})
+        self.assertEqual(response.json()['download_url'], f"{self.urls[1]}?public_id={self.invoice.public_id}")
+        self.assertEqual(self.client.get(response.json()['download_url']).status_code, 200)
+
+    @override_settings(PDF_CACHE_ENABLED=True)
+    def test_job_rendered_into_the_pdf_cache_keeps_no_copy_of_its_own(self):
+        job = pdf_jobs.enqueue_by_id('invoice', self.invoice.pk, self.owner.pk)
+        pdf_jobs.claim_jobs(5)
+        # close_old_connections would drop the test's transaction; the worker process has its own connection.
+        with mock.patch.object(pdf_jobs, 'close_old_connections'), mock.patch.object(rendering, 'render_document_pdf', return_value=b'%PDF cached'):
+            self.assertEqual(pdf_jobs.run_job(job.pk), 'done')
+
+        job.refresh_from_db()
+        self.assertFalse(job.file)
+        self.assertEqual(PDFCacheEntry.objects.count(), 1)
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('pdf_job_download', args=[job.pk]))
+        self.assertEqual((response.content, response['Content-Disposition']), (b'%PDF cached', 'attachment; filename="invoice-INV-1.pdf"'))
+
+    def test_public_async_download_hands_out_public_job_urls(self):
+        PDFRenderJob.objects.all().delete()
+        response = self.client.get(reverse('invoice_public_pdf', args=[self.invoice.public_id]), {'async': '1'}, headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(response.json()['status_url']).json()['status'], 'queued')
+
+
+class FakeProcessPool:
+    """
+    Stands in for a render process pool, answering each submit with `work(*args)` straight away.
+    `broken` makes it act as if a process died: 'mid-render' fails what it was given, 'before-submit' refuses it.
+    """
+
+    def __init__(self, work=None, broken=None):
+        self.work = work
+        self.broken = broken
+        self.submitted = []
+        self.shutdowns = []  # cancel_futures of each shutdown call
+
+    def submit(self, fn, *args):
+        if self.broken == 'before-submit':
+            raise BrokenProcessPool("A child process terminated abruptly, the process pool is not usable anymore")
+        self.submitted.append(args)
+        future = Future()
+        if self.broken == 'mid-render':
+            future.set_exception(BrokenProcessPool("A process in the process pool was terminated abruptly"))
+        else:
+            future.set_result(self.work(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdowns.append(cancel_futures)
+
+
+@override_settings(PDF_CACHE_ENABLED=True, PDF_WORKER_PROCESSES=1)
+class BulkExportTests(TemporaryMediaMixin, TestCase):
+    """Bulk PDF downloads stream one stored ZIP entry per document, in order, rendering only a few ahead."""
+
+    def test_zip_entries_are_stored_streamed_and_uniquely_named(self):
+        read = []
+
+        def files():
+            for n, name in enumerate(['invoice-INV-1.pdf', 'invoice-INV-1.pdf', 'quote-1.pdf', 'invoice-INV-1.pdf'], start=1):
+                read.append(name)
+                yield name, f'%PDF {n}'.encode()
+
+        chunks = bulk_export.stream_zip(files())
+        first = next(chunks)
+        self.assertEqual(len(read), 1)
+
+        archive = zipfile.ZipFile(io.BytesIO(first + b''.join(chunks)))
+        self.assertEqual(archive.namelist(), ['invoice-INV-1.pdf', 'invoice-INV-1-2.pdf', 'quote-1.pdf', 'invoice-INV-1-3.pdf'])
+        self.assertEqual({info.compress_type for info in archive.infolist()}, {zipfile.ZIP_STORED})
+        self.assertEqual(archive.read('invoice-INV-1-3.pdf'), b'%PDF 4')
+
+    def test_renders_stay_bounded_and_stop_when_the_download_does(self):
+        pool = FakeProcessPool(work=lambda document_type, object_id, base_url: (f'{document_type}-{object_id}.pdf', b'%PDF'))
+        with mock.patch.object(process_pool, 'create_pool', return_value=pool):
+            pdfs = bulk_export.iter_rendered_pdfs('invoice', range(1, 11), processes=2)
+            self.assertEqual([next(pdfs)[0] for _ in range(3)], ['invoice-1.pdf', 'invoice-2.pdf', 'invoice-3.pdf'])
+            # Two per process ahead, topped up by one for each PDF handed on.
+            self.assertEqual(len(pool.submitted), 6)
+            pdfs.close()
+        self.assertEqual(pool.shutdowns, [True])
+
+    def test_admin_action_streams_a_zip_in_date_order(self):
+        admin = User.objects.create_superuser('admin', password='a-Long-passw0rd')
+        customer = Customer.objects.create(user=admin, name='Acme')
+        later = Invoice.objects.create(user=admin, customer=customer, invoice_date=date(2026, 2, 1), due_date=date(2026, 3, 1))
+        earlier = Invoice.objects.create(user=admin, customer=customer, invoice_date=date(2026, 1, 1), due_date=date(2026, 2, 1))
+        for invoice in (later, earlier):
+            pdf_cache.get_or_render(Invoice.objects.get(pk=invoice.pk), lambda: b'%PDF cached')
+
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:invoices_invoice_changelist'), {
+            'action': 'download_pdfs_zip', '_selected_action': [later.pk, earlier.pk],
+        })
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="invoices.zip"')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['invoice-INV-2.pdf', 'invoice-INV-1.pdf'])
+
+
+class PDFAssetFetcherTests(TemporaryMediaMixin, TestCase):
+    """PDF renders read media and static files locally, from cache where they can, and never fetch anything else."""
+
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        assets = override_settings(PDF_ASSET_CACHE_DIR=cache_dir, PDF_ASSET_MTIME_TTL=0, PDF_ASSET_FETCH_TIMEOUT=0.2)
+        assets.enable()
+        self.addCleanup(assets.disable)
+        for cache in (pdf_assets._memory_cache, pdf_assets._modified_times):
+            patcher = mock.patch.dict(cache, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.name = default_storage.save('logos/logo.png', ContentFile(b'logo v1'))
+        self.url = f'http://localhost{settings.MEDIA_URL}{self.name}'
+
+    def test_only_media_and_static_files_are_fetched(self):
+        self.assertEqual(pdf_assets.url_fetcher(self.url)['string'], b'logo v1')
+        stylesheet = pdf_assets.url_fetcher(f'http://localhost{settings.STATIC_URL}invoices/css/pdf.css')
+        self.assertEqual(stylesheet['mime_type'], 'text/css')
+        for url in (
+            'https://example.com/logo.png',
+            'http://localhost/admin/',
+            f'http://localhost{settings.MEDIA_URL}../lekkerbill/settings.py',
+            f'http://localhost{settings.MEDIA_URL}%2e%2e/lekkerbill/settings.py',
+            f'http://localhost{settings.STATIC_URL}..%2f..%2fmanage.py',
+        ):
+            with self.subTest(url=url), self.assertRaises(ValueError):
+                pdf_assets.url_fetcher(url)
+
+    def test_second_fetch_comes_from_memory_then_disk(self):
+        pdf_assets.url_fetcher(self.url)
+        with mock.patch.object(pdf_assets, '_read_from_storage', side_effect=AssertionError("Read from storage again.")):
+            self.assertEqual(pdf_assets.url_fetcher(self.url)['string'], b'logo v1')
+            pdf_assets._memory_cache.clear()
+            self.assertEqual(pdf_assets.url_fetcher(self.url)['string'], b'logo v1')
+        self.assertEqual(len(pdf_assets._memory_cache), 1)
+
+    def test_slow_storage_falls_back_to_the_cached_copy(self):
+        pdf_assets.url_fetcher(self.url)
+        path = default_storage.path(self.name)
+        with open(path, 'wb') as f:
+            f.write(b'logo v2')
+        os.utime(path, (time.time() + 60, time.time() + 60))
+
+        def slow_read(name):
+            time.sleep(1)
+            return b'logo v2'
+
+        with mock.patch.object(pdf_assets, '_read_from_storage', side_effect=slow_read), self.assertLogs('invoices.pdf_assets', 'WARNING'):
+            self.assertEqual(pdf_assets.url_fetcher(self.url)['string'], b'logo v1')
+        self.assertEqual(pdf_assets.url_fetcher(self.url)['string'], b'logo v2')
+
+
+@override_settings(PDF_PRERENDER_ON_SAVE=True)
+class PrerenderTests(TestCase):
+    """With PDF_PRERENDER_ON_SAVE on, a qualifying document gets one background render per transaction, however many items change."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('prerendered')
+        self.customer = Customer.objects.create(user=self.user, name='Acme')
+
+    def queued_renders(self, callbacks):
+        return [callback.args[:2] for callback in callbacks if getattr(callback, 'func', None) is prerender._enqueue]
+
+    def test_nothing_is_queued_with_the_flag_off(self):
+        with self.settings(PDF_PRERENDER_ON_SAVE=False), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            invoice = Invoice.objects.create(user=self.user, customer=self.customer, due_date=date.today())
+            invoice.items.create(description='Design', quantity=1, unit_price=100)
+        self.assertEqual(self.queued_renders(callbacks), [])
+        self.assertFalse(PDFRenderJob.objects.exists())
+
+    def test_one_render_is_queued_per_document_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            invoice = Invoice.objects.create(user=self.user, customer=self.customer, due_date=date.today())
+            items = [invoice.items.create(description=f'Item {n}', quantity=1, unit_price=100) for n in range(3)]
+            draft = Quote.objects.create(user=self.user, customer=self.customer)
+            draft.items.create(description='Design', quantity=1, unit_price=100)
+
+            # Once the invoice is queued, saving one of its items costs no more queries than with the flag off.
+            item, unflagged_item = InvoiceItem.objects.get(pk=items[0].pk), InvoiceItem.objects.get(pk=items[1].pk)
+            with CaptureQueriesContext(connection) as flagged:
+                item.save()
+            with self.settings(PDF_PRERENDER_ON_SAVE=False), CaptureQueriesContext(connection) as unflagged:
+                unflagged_item.save()
+            self.assertEqual(len(flagged), len(unflagged))
+
+        self.assertEqual(self.queued_renders(callbacks), [('invoice', invoice.pk)])
+        self.assertEqual(list(PDFRenderJob.objects.values_list('document_type', 'object_id')), [('invoice', invoice.pk)])
+
+
+class PDFRenderingTests(TestCase):
+    """Every render in a process reuses one font configuration and one compiled pdf.css."""
+
+    def setUp(self):
+        rendering.shared_resources.cache_clear()
+        self.addCleanup(rendering.shared_resources.cache_clear)
+        self.user = User.objects.create_user('rendering')
+        self.customer = Customer.objects.create(user=self.user, name='Acme')
+
+    def test_renders_share_the_compiled_stylesheet(self):
+        invoice = Invoice.objects.create(user=self.user, customer=self.customer, due_date=date.today())
+        quote = Quote.objects.create(user=self.user, customer=self.customer)
+        with mock.patch.object(rendering, 'CSS') as css, mock.patch.object(rendering, 'HTML') as html:
+            rendering.render_document_pdf(invoice)
+            rendering.render_document_pdf(quote)
+
+        css.assert_called_once()
+        self.assertEqual(css.call_args.kwargs['filename'], finders.find(pdf_cache.PDF_STYLESHEET))
+        first, second = (call.kwargs for call in html.return_value.write_pdf.call_args_list)
+        self.assertEqual((first['stylesheets'], second['stylesheets']), ([css.return_value], [css.return_value]))
+        self.assertIs(first['font_config'], second['font_config'])
+        self.assertIs(css.call_args.kwargs['font_config'], first['font_config'])
+
+    def test_timing_command_needs_at_least_one_run(self):
+        Invoice.objects.create(user=self.user, customer=self.customer, due_date=date.today())
+        with self.assertRaisesMessage(CommandError, 'must be at least 1'):
+            call_command('pdf_render_timing', '--runs', '0')
+        out = io.StringIO()
+        call_command('pdf_render_timing', '--runs', '1', stdout=out)
+        self.assertIn('Warm renders are', out.getvalue())
+
+
+class BenchmarkCommandTests(TemporaryMediaMixin, TestCase):
+    """benchmark_pdfs reports one JSON result per scenario and leaves no synthetic data behind."""
+
+    def test_report_shape_and_cleanup(self):
+        with self.assertRaisesMessage(CommandError, 'must be at least 1'):
+            call_command('benchmark_pdfs', '--runs', '0')
+
+        out = io.StringIO()
+        call_command('benchmark_pdfs', '--items', '1', '2', '--runs', '1', '--label', 'abc123', stdout=out, stderr=io.StringIO())
+        report = json.loads(out.getvalue())
+
+        self.assertEqual((report['label'], report['runs']), ('abc123', 1))
+        self.assertEqual([(result['items'], result['logo']) for result in report['results']], [(1, False), (2, False), (1, True), (2, True)])
+        result = report['results'][0]
+        self.assertEqual(set(result['latency_ms']), {'min', 'p50', 'p90', 'p99', 'max', 'mean'})
+        self.assertGreater(result['peak_rss_kb'], 0)
+        self.assertGreater(result['output_bytes'], 0)
+        self.assertFalse(User.objects.filter(username__startswith='benchmark-').exists())
+        self.assertFalse(Invoice.objects.exists())
+        self.assertEqual(default_storage.listdir('logos'), ([], []))
+
+
+class ConditionalGetTests(TestCase):
+    """Public quote pages carry an ETag, answer a matching If-None-Match with 304 and change ETag when the quote does."""
+
+    def test_public_quote_is_revalidated_with_its_etag(self):
+        user = User.objects.create_user('quoting')
+        quote = Quote.objects.create(user=user, customer=Customer.objects.create(user=user, name='Acme'))
+        url = reverse('quote_public_view', args=[quote.public_id])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        quote.items.create(description='Design', quantity=1, unit_price=100)
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class StoredTotalsTests(TestCase):
+    """The stored subtotal, tax and total follow every line item save and delete, and tax rate changes."""
+
+    def stored(self, document):
+        return tuple(type(document).objects.filter(pk=document.pk).values_list('subtotal', 'tax_amount', 'total').get())
+
+    def test_item_saves_and_deletes_update_stored_totals(self):
+        user = User.objects.create_user('totals')
+        customer = Customer.objects.create(user=user, name='Acme')
+        invoice = Invoice.objects.create(user=user, customer=customer, due_date=date.today(), tax_rate=15)
+        design = invoice.items.create(description='Design', quantity=Decimal('1.5'), unit_price=Decimal('3.33'))
+        self.assertEqual(self.stored(invoice), (Decimal('5.00'), Decimal('0.75'), Decimal('5.75')))
+
+        with deferred_totals():
+            invoice.items.create(description='Hosting', quantity=1, unit_price=100)
+            design.quantity = 3
+            design.save()
+        self.assertEqual(self.stored(invoice), (Decimal('109.99'), Decimal('16.50'), Decimal('126.49')))
+
+        design.delete()
+        self.assertEqual(self.stored(invoice), (Decimal('100.00'), Decimal('15.00'), Decimal('115.00')))
+        invoice = Invoice.objects.get(pk=invoice.pk)
+        invoice.tax_rate = 0
+        invoice.save()
+        self.assertEqual(self.stored(invoice), (Decimal('100.00'), Decimal('0.00'), Decimal('100.00')))
+
+        quote = Quote.objects.create(user=user, customer=customer, tax_rate=15)
+        quote.items.create(description='Design', quantity=2, unit_price=50)
+        self.assertEqual(self.stored(quote), (Decimal('100.00'), Decimal('15.00'), Decimal('115.00')))
+
+    def test_with_totals_matches_calculate_totals_and_stored_columns(self):
+        user = User.objects.create_user('annotated')
+        customer = Customer.objects.create(user=user, name='Acme')
+        lines = [(Decimal('1.5'), Decimal('3.33')), (Decimal('0.25'), Decimal('0.10')), (Decimal('3'), Decimal('19.99'))]
+        invoice = Invoice.objects.create(user=user, customer=customer, due_date=date.today(), tax_rate=Decimal('12.5'))
+        for quantity, unit_price in lines:
+            invoice.items.create(description='Line', quantity=quantity, unit_price=unit_price)
+        Invoice.objects.create(user=user, customer=customer, due_date=date.today(), tax_rate=15)
+
+        expected = {invoice.pk: totals.calculate_totals(lines, Decimal('12.5'))}
+        for document in Invoice.objects.filter(user=user).with_totals():
+            annotated = (document.items_subtotal, document.items_tax_amount, document.items_total)
+            self.assertEqual(annotated, expected.get(document.pk, (Decimal('0.00'),) * 3))
+            self.assertEqual(annotated, (document.subtotal, document.tax_amount, document.total))
+
+        Invoice.objects.filter(pk=invoice.pk).update(total=Decimal('0.00'))
+        output = io.StringIO()
+        call_command('recalculate_totals', types=['invoice'], stdout=output)
+        self.assertIn(f'stored 0.00, expected {expected[invoice.pk][2]}', output.getvalue())
+        self.assertEqual(self.stored(invoice), expected[invoice.pk])
+
+
+@override_settings(FREE_PLAN_ITEM_LIMIT=5)
+class UsageLimitTests(ThreadedTestCase):
+    """The Free Plan limit is read from the usage counter and holds under concurrent creates."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('limited', password='a-Long-passw0rd')
+
+    def test_create_view_stops_at_the_limit_and_deletes_free_a_slot(self):
+        self.client.force_login(self.user)
+        for n in range(6):
+            response = self.client.post(reverse('customer_create'), {'name': f'Customer {n}'})
+        self.assertRedirects(response, reverse('subscription_detail'), fetch_redirect_response=False)
+        self.assertEqual(Customer.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(usage.get_counter(self.user).customer_count, 5)
+
+        Customer.objects.filter(user=self.user).first().delete()
+        self.assertEqual(usage.remaining(self.user, Customer), 1)
+        self.assertEqual(usage.counts_for(self.user.pk)['customer_count'], usage.get_counter(self.user).customer_count)
+
+    def test_concurrent_creates_stop_at_the_limit(self):
+        if connection.vendor == 'sqlite':
+            self.skipTest("SQLite has no row locks to serialize the limit check.")
+
+        def work():
+            with transaction.atomic():
+                if not usage.limit_reached(self.user, Customer, lock=True):
+                    Customer.objects.create(user_id=self.user.pk, name='Customer')
+
+        self.hammer(work)
+        self.assertEqual(Customer.objects.filter(user=self.user).count(), 5)
+
+
+class QuoteConversionTests(TestCase):
+    """convert_quotes turns each unconverted quote into one numbered invoice, oldest first."""
+
+    def test_quotes_become_invoices_once(self):
+        user = User.objects.create_user('converter')
+        customer = Customer.objects.create(user=user, name='Acme')
+        older = Quote.objects.create(user=user, customer=customer, tax_rate=15, quote_date=date(2024, 1, 1))
+        older.items.create(description='Design', quantity=2, unit_price=100)
+        older.items.create(description='Hosting', quantity=1, unit_price=50)
+        newer = Quote.objects.create(user=user, customer=customer, quote_date=date(2024, 2, 1))
+        newer.items.create(description='Support', quantity=1, unit_price=80)
+
+        invoices = conversion.convert_quotes([older.pk, newer.pk], limit=1)
+        self.assertEqual(list(invoices), [older.pk])
+        invoice = Invoice.objects.get(pk=invoices[older.pk].pk)
+        self.assertEqual((invoice.invoice_number, invoice.status, invoice.customer_id), ('INV-1', 'unpaid', customer.pk))
+        self.assertEqual((invoice.subtotal, invoice.tax_amount, invoice.total), (Decimal('250.00'), Decimal('37.50'), Decimal('287.50')))
+        self.assertEqual(list(invoice.items.order_by('id').values_list('description', 'quantity')), [('Design', 2), ('Hosting', 1)])
+        older.refresh_from_db()
+        self.assertEqual((older.status, older.invoice_id), ('accepted', invoice.pk))
+
+        invoices = conversion.convert_quotes([older.pk, newer.pk])
+        self.assertEqual(list(invoices), [newer.pk])
+        self.assertEqual(invoices[newer.pk].invoice_number, 'INV-2')
+        self.assertEqual(conversion.convert_quotes([older.pk, newer.pk]), {})
+        self.assertEqual(usage.get_counter(user).invoice_count, 2)
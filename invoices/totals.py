@@ -0,0 +1,23 @@
+"""
+Money arithmetic for the stored subtotal/tax/total columns on invoices and quotes.
+
+Kept free of model imports so migrations and management commands can share it.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+CENTS = Decimal('0.01')
+
+TOTAL_FIELDS = ('subtotal', 'tax_amount', 'total')
+
+
+def tax_and_total(subtotal, tax_rate):
+    """Returns (tax_amount, total) for a subtotal and a percentage tax rate, rounded to cents."""
+    tax_amount = (subtotal * Decimal(str(tax_rate)) / Decimal(100)).quantize(CENTS, rounding=ROUND_HALF_UP)
+    return tax_amount, subtotal + tax_amount
+
+
+def calculate_totals(line_items, tax_rate):
+    """Returns (subtotal, tax_amount, total) for an iterable of (quantity, unit_price) pairs."""
+    subtotal = sum((quantity * unit_price for quantity, unit_price in line_items), Decimal('0'))
+    subtotal = subtotal.quantize(CENTS, rounding=ROUND_HALF_UP)
+    return (subtotal, *tax_and_total(subtotal, tax_rate))
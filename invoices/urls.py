@@ -32,14 +32,23 @@ urlpatterns = [
     # Main application sections
     path('invoices/', views.invoice_list, name='invoice_list'),
     path('invoices/new/', views.invoice_create, name='invoice_create'), # Used in invoice_list.html
+    path('invoices/pdfs/', views.invoice_bulk_pdf, name='invoice_bulk_pdf'), # Used in invoice_list.html
     path('invoices/<int:pk>/', views.invoice_detail, name='invoice_detail'),
     path('invoices/<int:pk>/pdf/', views.invoice_pdf, name='invoice_pdf'),
     path('invoices/<int:pk>/update/', views.invoice_update, name='invoice_update'),
     path('invoices/<int:pk>/delete/', views.invoice_delete, name='invoice_delete'),
     path('invoices/public-pdf/<uuid:public_id>/', views.invoice_public_pdf, name='invoice_public_pdf'),
+    path('invoices/<int:pk>/repeat/', views.recurring_invoice_create, name='recurring_invoice_create'), # Used in invoice_detail.html
+    path('recurring/', views.recurring_invoice_list, name='recurring_invoice_list'),
+    path('recurring/<int:pk>/update/', views.recurring_invoice_update, name='recurring_invoice_update'),
+    path('recurring/<int:pk>/delete/', views.recurring_invoice_delete, name='recurring_invoice_delete'),
+    path('pdf-jobs/<uuid:job_id>/', views.pdf_job_status, name='pdf_job_status'),
+    path('pdf-jobs/<uuid:job_id>/download/', views.pdf_job_download, name='pdf_job_download'),
 
     path('quotes/', views.quote_list, name='quote_list'), # Used in base.html
     path('quotes/new/', views.quote_create, name='quote_create'), # Used in quote_list.html
+    path('quotes/pdfs/', views.quote_bulk_pdf, name='quote_bulk_pdf'), # Used in quote_list.html
+    path('quotes/convert/', views.quote_bulk_convert, name='quote_bulk_convert'), # Used in quote_list.html
     path('quotes/<int:pk>/', views.quote_detail, name='quote_detail'),
     path('quotes/<int:pk>/pdf/', views.quote_pdf, name='quote_pdf'),
     path('quotes/<int:pk>/update/', views.quote_update, name='quote_update'),
@@ -64,6 +73,8 @@ urlpatterns = [
 
     # Settings & Subscription URLs
     path('profile/', views.profile_view, name='profile'),
+    path('import/', views.import_data, name='import_data'), # Used in profile.html and the customer/inventory lists
+    path('export/', views.export_data, name='export_data'), # Used in profile.html and the invoice/quote lists
     path('settings/', views.settings_update, name='settings_update'), # Used in base.html
     path('subscription/', views.subscription_detail, name='subscription_detail'), # Used in base.html
     path('subscription/cancel/', views.cancel_subscription, name='cancel_subscription'), # Used in subscription_detail.html
@@ -0,0 +1,111 @@
+"""
+Free-plan usage counters.
+
+Each user has one UsageCounter row holding how many customers, invoices,
+quotes and inventory items they have. Creates and deletes adjust it with
+F() expressions, so concurrent requests never lose an update, and limit
+checks read that one row instead of counting the user's objects.
+
+To stop two concurrent creates from both squeezing under the limit, call
+`limit_reached(..., lock=True)` inside the transaction that saves the new
+object: the counter row stays locked until commit, so the second request
+waits and then sees the first one's increment. Code that creates objects
+with bulk_create (which sends no signals) must call `add()` itself, and
+`reconcile_usage` repairs any drift. Whether a user is on the Free Plan at
+all comes from their cached entitlement (see entitlements.py).
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import entitlements
+from .models import Customer, InventoryItem, Invoice, Quote, UsageCounter
+
+COUNTER_FIELDS = {
+    Customer: 'customer_count',
+    Invoice: 'invoice_count',
+    Quote: 'quote_count',
+    InventoryItem: 'inventory_count',
+}
+
+
+def counts_for(user_id):
+    """Returns the actual per-model counts for a user, straight from the data."""
+    return {field: model.objects.filter(user_id=user_id).count() for model, field in COUNTER_FIELDS.items()}
+
+
+def get_counter(user, lock=False):
+    """Returns the user's counter, creating it from the actual counts for accounts that predate it."""
+    queryset = UsageCounter.objects.filter(user=user)
+    if lock:
+        queryset = queryset.select_for_update()
+    counter = queryset.first()
+    if counter is None:
+        counter, _ = UsageCounter.objects.get_or_create(user=user, defaults=counts_for(user.pk))
+    return counter
+
+
+def add(user_id, model, amount):
+    """Adjusts a user's count for `model` by `amount` (negative to subtract) in one UPDATE."""
+    field = COUNTER_FIELDS[model]
+    UsageCounter.objects.filter(user_id=user_id).update(**{field: Greatest(F(field) + amount, 0)})
+
+
+def remaining(user, model, lock=False):
+    """
+    Returns how many more objects of `model` a free-plan user may create, or None for paid plans.
+    Pass lock=True inside the transaction that creates the objects to serialize concurrent creates.
+    """
+    item_limit = entitlements.get(user.pk).item_limit
+    if item_limit is None:
+        return None
+    counter = get_counter(user, lock=lock)
+    return max(item_limit - getattr(counter, COUNTER_FIELDS[model]), 0)
+
+
+def remaining_by_user(user_ids, model):
+    """Like `remaining` for many users at once: returns {user id: remaining} for the free-plan users among them."""
+    field = COUNTER_FIELDS[model]
+    pro_ids = entitlements.pro_subscriptions(timezone.now().date()).filter(user_id__in=user_ids).values_list('user_id', flat=True)
+    free_ids = set(user_ids) - set(pro_ids)
+    if not free_ids:
+        return {}
+    counts = dict(UsageCounter.objects.filter(user_id__in=free_ids).values_list('user_id', field))
+    for user_id in free_ids - counts.keys():
+        counts[user_id] = getattr(get_counter(User(pk=user_id)), field)
+    return {user_id: max(settings.FREE_PLAN_ITEM_LIMIT - count, 0) for user_id, count in counts.items()}
+
+
+def limit_reached(user, model, lock=False):
+    """
+    Returns True if a free-plan user already has FREE_PLAN_ITEM_LIMIT objects of `model`.
+    Pass lock=True inside the transaction that creates the object to serialize concurrent creates.
+    """
+    return remaining(user, model, lock=lock) == 0
+
+
+@receiver(post_save, sender=User)
+def create_usage_counter(sender, instance, created, **kwargs):
+    if created:
+        UsageCounter.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Quote)
+@receiver(post_save, sender=InventoryItem)
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add(instance.user_id, sender, 1)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Quote)
+@receiver(post_delete, sender=InventoryItem)
+def count_deleted(sender, instance, **kwargs):
+    add(instance.user_id, sender, -1)
@@ -2,23 +2,27 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
 from django.urls import reverse
-from django.template.loader import render_to_string
-from django.forms import inlineformset_factory
 from django.utils import timezone
 from django.conf import settings
+from django.db import transaction
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.dateparse import parse_date
+from django.core.exceptions import ValidationError
 from datetime import timedelta
+import json
 import logging
 import hashlib
+import uuid
 from urllib.parse import urlencode, quote_plus
 import requests
-from weasyprint import HTML # Removed unused signal import
 from payfast.forms import PayFastForm # This now correctly imports from your local app
-from .forms import SignUpForm, CustomerForm, InventoryItemForm, ProfileForm, InvoiceForm, QuoteForm, InvoiceItemForm, QuoteItemForm
-from .models import Customer, Quote, Invoice, Subscription, InventoryItem, Profile, InvoiceItem, QuoteItem, Notification
+from .forms import SignUpForm, CustomerForm, InventoryItemForm, ProfileForm, InvoiceForm, QuoteForm, InvoiceItemForm, QuoteItemForm, InvoiceItemFormSet, QuoteItemFormSet, DocumentFilterForm, ImportForm, ExportForm, RecurringInvoiceForm
+from .models import Customer, Quote, Invoice, Subscription, InventoryItem, Profile, InvoiceItem, QuoteItem, PDFRenderJob, RecurringInvoice
+from .totals import TOTAL_FIELDS
+from . import bulk_export, conversion, entitlements, exports, http_cache, imports, line_items, notifications, pagination, pdf_assets, pdf_cache, pdf_jobs, recurring, rendering, spreadsheets, stats, usage
 
 logger = logging.getLogger(__name__)
 
@@ -27,33 +31,49 @@ def signup(request):
         form = SignUpForm(request.POST)
         if form.is_valid():
             user = form.save()
-            login(request, user) # Log the user in
+            # Two backends are configured, so say which one to remember in the session.
+            login(request, user, backend='invoices.accounts.AccountBackend')
             return redirect('dashboard')
     else:
         form = SignUpForm()
     return render(request, 'registration/signup.html', {'form': form})
 
+def _paginated_list(request, queryset, ordering, template_name, rows_template, context_name, serialize, context=None):
+    """
+    Renders one keyset-paginated page of a list. `?format=json` returns the rows as JSON, and
+    `?fragment=1` (or an HTMX request) returns just the rows for infinite scroll / "Load more".
+    """
+    page = pagination.paginate(queryset, ordering, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'results': [serialize(obj) for obj in page.items], 'next_cursor': page.next_cursor})
+
+    context = {
+        **(context or {}),
+        context_name: page.items,
+        'page': page,
+        'next_page_query': pagination.next_page_query(request, page) if page.has_next else '',
+    }
+    if request.GET.get('fragment') or request.headers.get('HX-Request'):
+        return render(request, rows_template, context)
+    return render(request, template_name, context)
+
+def _subscription(user):
+    """Returns the user's subscription, creating one for accounts made before subscriptions existed."""
+    try:
+        return user.subscription
+    except Subscription.DoesNotExist:
+        return Subscription.objects.get_or_create(user=user)[0]
+
+def _free_plan_limit_redirect(request, item_name):
+    messages.warning(request, f"You have reached the {item_name} limit for the Free Plan. Please upgrade to Pro to create more.")
+    return redirect('subscription_detail')
+
 @login_required
 def dashboard(request):
-    # Ensure subscription exists, creating it if necessary.
-    # This is a robust way to handle users created before the subscription model was added.
-    subscription, created = Subscription.objects.get_or_create(user=request.user)
-
-    # ✅ This now uses real data from your database.
-    # We use `select_related` to efficiently fetch the customer's name
-    # along with the invoice/quote, avoiding extra database queries.
+    # Counts, totals and recent documents come from the per-user stats cache (see stats.py).
     context = {
-        'customer_count': Customer.objects.filter(user=request.user).count(),
-        'quote_count': Quote.objects.filter(user=request.user).count(),
-        'invoice_count': Invoice.objects.filter(user=request.user).count(),
-        'inventory_count': InventoryItem.objects.filter(user=request.user).count(),
-        'recent_invoices': Invoice.objects.filter(user=request.user)
-                                        .select_related('customer')
-                                        .order_by('-invoice_date')[:5],
-        'recent_quotes': Quote.objects.filter(user=request.user)
-                                      .select_related('customer')
-                                      .order_by('-quote_date')[:5],
-        'subscription': subscription
+        **stats.get_stats(request.user),
+        'entitlement': entitlements.get(request.user.pk),
     }
     return render(request, 'invoices/dashboard.html', context)
 
@@ -62,17 +82,20 @@ def dashboard(request):
 @login_required
 def customer_list(request):
     customers = Customer.objects.filter(user=request.user)
-    return render(request, 'invoices/customer_list.html', {'customers': customers})
+    search = request.GET.get('q', '').strip()
+    if search:
+        # Used by the customer filter on the invoice and quote lists to search as you type.
+        customers = customers.filter(name__istartswith=search)
+    return _paginated_list(
+        request, customers, ('name', 'id'), 'invoices/customer_list.html', 'invoices/customer_list_rows.html', 'customers',
+        lambda customer: {'id': customer.id, 'name': customer.name, 'email': customer.email, 'phone': customer.phone},
+    )
 
 @login_required
 def customer_create(request):
     # --- START: Free Plan Limit Check ---
-    subscription = request.user.subscription
-    if subscription.plan == 'free':
-        customer_count = Customer.objects.filter(user=request.user).count()
-        if customer_count >= settings.FREE_PLAN_ITEM_LIMIT:
-            messages.warning(request, "You have reached the customer limit for the Free Plan. Please upgrade to Pro to create more.")
-            return redirect('subscription_detail')
+    if usage.limit_reached(request.user, Customer):
+        return _free_plan_limit_redirect(request, "customer")
     # --- END: Free Plan Limit Check ---
 
     if request.method == 'POST':
@@ -80,7 +103,11 @@ def customer_create(request):
         if form.is_valid():
             customer = form.save(commit=False)
             customer.user = request.user
-            customer.save()
+            with transaction.atomic():
+                # Re-check under the counter row lock so concurrent POSTs can't both slip under the limit.
+                if usage.limit_reached(request.user, Customer, lock=True):
+                    return _free_plan_limit_redirect(request, "customer")
+                customer.save()
             messages.success(request, f"Customer '{customer.name}' created successfully.")
             return redirect('customer_list')
     else:
@@ -116,20 +143,19 @@ def customer_delete(request, pk):
 def inventory_list(request):
     inventory_items = InventoryItem.objects.filter(user=request.user)
     context = {
-        'inventory_items': inventory_items,
         'title': 'Inventory Items' # The template uses this title variable
     }
-    return render(request, 'invoices/inventory_list.html', context)
+    return _paginated_list(
+        request, inventory_items, ('name', 'id'), 'invoices/inventory_list.html', 'invoices/inventory_list_rows.html', 'inventory_items',
+        lambda item: {'id': item.id, 'name': item.name, 'description': item.description, 'unit_price': str(item.unit_price)},
+        context,
+    )
 
 @login_required
 def inventory_create(request):
     # --- START: Free Plan Limit Check ---
-    subscription = request.user.subscription
-    if subscription.plan == 'free':
-        inventory_count = InventoryItem.objects.filter(user=request.user).count()
-        if inventory_count >= settings.FREE_PLAN_ITEM_LIMIT:
-            messages.warning(request, "You have reached the inventory item limit for the Free Plan. Please upgrade to Pro to create more.")
-            return redirect('subscription_detail')
+    if usage.limit_reached(request.user, InventoryItem):
+        return _free_plan_limit_redirect(request, "inventory item")
     # --- END: Free Plan Limit Check ---
 
     if request.method == 'POST':
@@ -137,7 +163,11 @@ def inventory_create(request):
         if form.is_valid():
             item = form.save(commit=False)
             item.user = request.user
-            item.save()
+            with transaction.atomic():
+                # Re-check under the counter row lock so concurrent POSTs can't both slip under the limit.
+                if usage.limit_reached(request.user, InventoryItem, lock=True):
+                    return _free_plan_limit_redirect(request, "inventory item")
+                item.save()
             messages.success(request, f"Inventory item '{item.name}' created.")
             return redirect('inventory_list')
     else:
@@ -171,8 +201,22 @@ def inventory_delete(request, pk):
 
 @login_required
 def invoice_list(request):
-    invoices = Invoice.objects.filter(user=request.user)
-    return render(request, 'invoices/invoice_list.html', {'invoices': invoices})
+    filter_form = DocumentFilterForm(request.GET or None, user=request.user, status_choices=Invoice.STATUS_CHOICES)
+    invoices = filter_form.filter_queryset(Invoice.objects.filter(user=request.user).select_related('customer'), 'invoice_date')
+    return _paginated_list(
+        request, invoices, ('-invoice_date', '-id'), 'invoices/invoice_list.html', 'invoices/invoice_list_rows.html', 'invoices',
+        lambda invoice: {
+            'id': invoice.id,
+            'invoice_number': invoice.invoice_number,
+            'customer': invoice.customer.name,
+            'invoice_date': invoice.invoice_date,
+            'due_date': invoice.due_date,
+            'status': invoice.status,
+            'total': str(invoice.total),
+            'url': invoice.get_absolute_url(),
+        },
+        {'filter_form': filter_form},
+    )
 
 @login_required
 def invoice_detail(request, pk):
@@ -184,12 +228,8 @@ def invoice_detail(request, pk):
 @login_required
 def invoice_create(request):
     # --- START: Free Plan Limit Check ---
-    subscription = request.user.subscription
-    if subscription.plan == 'free':
-        invoice_count = Invoice.objects.filter(user=request.user).count()
-        if invoice_count >= settings.FREE_PLAN_ITEM_LIMIT:
-            messages.warning(request, "You have reached the invoice limit for the Free Plan. Please upgrade to Pro to create more.")
-            return redirect('subscription_detail')
+    if usage.limit_reached(request.user, Invoice):
+        return _free_plan_limit_redirect(request, "invoice")
     # --- END: Free Plan Limit Check ---
 
     first_customer = Customer.objects.filter(user=request.user).first()
@@ -203,21 +243,28 @@ def invoice_create(request):
     # Set the tax rate from the user's profile by default
     default_tax_rate = request.user.profile.vat_percentage
 
-    invoice = Invoice.objects.create(user=request.user, customer=first_customer, due_date=due_date, tax_rate=default_tax_rate)
+    with transaction.atomic():
+        if usage.limit_reached(request.user, Invoice, lock=True):
+            return _free_plan_limit_redirect(request, "invoice")
+        invoice = Invoice.objects.create(user=request.user, customer=first_customer, due_date=due_date, tax_rate=default_tax_rate)
     messages.info(request, "New invoice draft created. You can now add items and details.")
     return redirect('invoice_update', pk=invoice.pk)
 
 @login_required
 def invoice_update(request, pk):
     invoice = get_object_or_404(Invoice, pk=pk, user=request.user)
-    InvoiceItemFormSet = inlineformset_factory(Invoice, InvoiceItem, form=InvoiceItemForm, extra=1, can_delete=True)
 
+    if request.method == 'POST' and request.content_type == 'application/json':
+        return _save_items_json(request, invoice, InvoiceItemForm)
     if request.method == 'POST':
         form = InvoiceForm(request.POST, instance=invoice, user=request.user)
         formset = InvoiceItemFormSet(request.POST, instance=invoice, prefix='items')
         if form.is_valid() and formset.is_valid():
-            form.save()
-            formset.save()
+            # Save the document and its items together so a pre-render only starts once both are stored.
+            with transaction.atomic():
+                form.save()
+                line_items.save_items(invoice, line_items.rows_from_formset(formset))
+            pdf_cache.invalidate_document(invoice)
             messages.success(request, "Invoice saved successfully.")
             return redirect('invoice_detail', pk=invoice.pk)
     else:
@@ -233,21 +280,111 @@ def invoice_update(request, pk):
     }
     return render(request, 'invoices/invoice_form.html', context)
 
+def _save_items_json(request, document, item_form):
+    """
+    Applies a JSON line item payload, {"items": [{"id": ..., "description": ..., ...}, ...]}, to a
+    document and returns the saved items and new totals. The list replaces the document's items
+    unless "replace" is false, in which case only the listed rows (and "delete": true ones) change.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'errors': {'__all__': ["Invalid JSON."]}}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'errors': {'__all__': ["Expected an object with an \"items\" list."]}}, status=400)
+    rows, errors = line_items.rows_from_payload(payload.get('items'), item_form)
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+    try:
+        created, updated, deleted = line_items.save_items(document, rows, replace=payload.get('replace', True) is not False)
+    except ValidationError as error:
+        return JsonResponse({'errors': {'__all__': error.messages}}, status=400)
+    pdf_cache.invalidate_document(document)
+    return JsonResponse({
+        'created': created,
+        'updated': updated,
+        'deleted': deleted,
+        'items': list(document.items.order_by('id').values('id', *line_items.ITEM_FIELDS)),
+        **{field: getattr(document, field) for field in TOTAL_FIELDS},
+    })
+
 @login_required
 def invoice_delete(request, pk):
     invoice = get_object_or_404(Invoice, pk=pk, user=request.user)
     if request.method == 'POST':
+        pdf_cache.invalidate_document(invoice)
         invoice.delete()
         messages.success(request, "Invoice has been deleted.")
         return redirect('invoice_list')
     return render(request, 'invoices/invoice_confirm_delete.html', {'invoice': invoice})
 
+# --- Recurring Invoice Views ---
+
+@login_required
+def recurring_invoice_list(request):
+    schedules = (
+        RecurringInvoice.objects.filter(user=request.user)
+        .select_related('customer').prefetch_related('items').order_by('-is_active', 'next_run_date', 'id')
+    )
+    return render(request, 'invoices/recurring_invoice_list.html', {'schedules': schedules, 'title': 'Recurring Invoices'})
+
+@login_required
+def recurring_invoice_create(request, pk):
+    """Sets up a schedule that repeats an invoice: same customer, tax rate, payment terms and line items."""
+    invoice = get_object_or_404(Invoice, pk=pk, user=request.user)
+    if request.method == 'POST':
+        form = RecurringInvoiceForm(request.POST, instance=recurring.schedule_from_invoice(invoice))
+        if form.is_valid():
+            with transaction.atomic():
+                schedule = form.save()
+                recurring.copy_items(invoice, schedule)
+            messages.success(request, f"Invoice {invoice.invoice_number} will be repeated {schedule.get_frequency_display().lower()}, starting {schedule.next_run_date:%d %b %Y}.")
+            return redirect('recurring_invoice_list')
+    else:
+        form = RecurringInvoiceForm(instance=recurring.schedule_from_invoice(invoice))
+    return render(request, 'invoices/generic_form.html', {'form': form, 'title': f'Repeat Invoice {invoice.invoice_number}', 'form_type': 'Schedule'})
+
+@login_required
+def recurring_invoice_update(request, pk):
+    schedule = get_object_or_404(RecurringInvoice.objects.select_related('customer'), pk=pk, user=request.user)
+    if request.method == 'POST':
+        form = RecurringInvoiceForm(request.POST, instance=schedule)
+        if form.is_valid():
+            form.save()
+            messages.success(request, "The recurring invoice has been updated.")
+            return redirect('recurring_invoice_list')
+    else:
+        form = RecurringInvoiceForm(instance=schedule)
+    return render(request, 'invoices/generic_form.html', {'form': form, 'title': f'Edit {schedule}', 'form_type': 'Schedule'})
+
+@login_required
+def recurring_invoice_delete(request, pk):
+    schedule = get_object_or_404(RecurringInvoice.objects.select_related('customer'), pk=pk, user=request.user)
+    if request.method == 'POST':
+        schedule.delete()
+        messages.success(request, "The recurring invoice has been deleted. Invoices it already created are kept.")
+        return redirect('recurring_invoice_list')
+    return render(request, 'invoices/generic_confirm_delete.html', {'object': schedule, 'form_type': 'Recurring Invoice'})
+
 # --- Quote CRUD Views ---
 
 @login_required
 def quote_list(request):
-    quotes = Quote.objects.filter(user=request.user)
-    return render(request, 'invoices/quote_list.html', {'quotes': quotes})
+    filter_form = DocumentFilterForm(request.GET or None, user=request.user, status_choices=Quote.STATUS_CHOICES)
+    quotes = filter_form.filter_queryset(Quote.objects.filter(user=request.user).select_related('customer'), 'quote_date')
+    return _paginated_list(
+        request, quotes, ('-quote_date', '-id'), 'invoices/quote_list.html', 'invoices/quote_list_rows.html', 'quotes',
+        lambda quote: {
+            'id': quote.id,
+            'quote_number': quote.quote_number,
+            'customer': quote.customer.name,
+            'quote_date': quote.quote_date,
+            'status': quote.status,
+            'total': str(quote.total),
+            'url': quote.get_absolute_url(),
+        },
+        {'filter_form': filter_form},
+    )
 
 @login_required
 def quote_detail(request, pk):
@@ -259,12 +396,8 @@ def quote_detail(request, pk):
 @login_required
 def quote_create(request):
     # --- START: Free Plan Limit Check ---
-    subscription = request.user.subscription
-    if subscription.plan == 'free':
-        quote_count = Quote.objects.filter(user=request.user).count()
-        if quote_count >= settings.FREE_PLAN_ITEM_LIMIT:
-            messages.warning(request, "You have reached the quote limit for the Free Plan. Please upgrade to Pro to create more.")
-            return redirect('subscription_detail')
+    if usage.limit_reached(request.user, Quote):
+        return _free_plan_limit_redirect(request, "quote")
     # --- END: Free Plan Limit Check ---
 
     first_customer = Customer.objects.filter(user=request.user).first()
@@ -275,21 +408,28 @@ def quote_create(request):
     # Set the tax rate from the user's profile by default
     default_tax_rate = request.user.profile.vat_percentage
 
-    quote = Quote.objects.create(user=request.user, customer=first_customer, tax_rate=default_tax_rate)
+    with transaction.atomic():
+        if usage.limit_reached(request.user, Quote, lock=True):
+            return _free_plan_limit_redirect(request, "quote")
+        quote = Quote.objects.create(user=request.user, customer=first_customer, tax_rate=default_tax_rate)
     messages.info(request, "New quote draft created. You can now add items and details.")
     return redirect('quote_update', pk=quote.pk)
 
 @login_required
 def quote_update(request, pk):
     quote = get_object_or_404(Quote, pk=pk, user=request.user)
-    QuoteItemFormSet = inlineformset_factory(Quote, QuoteItem, form=QuoteItemForm, extra=1, can_delete=True)
 
+    if request.method == 'POST' and request.content_type == 'application/json':
+        return _save_items_json(request, quote, QuoteItemForm)
     if request.method == 'POST':
         form = QuoteForm(request.POST, instance=quote, user=request.user)
         formset = QuoteItemFormSet(request.POST, instance=quote, prefix='items')
         if form.is_valid() and formset.is_valid():
-            form.save()
-            formset.save()
+            # Save the document and its items together so a pre-render only starts once both are stored.
+            with transaction.atomic():
+                form.save()
+                line_items.save_items(quote, line_items.rows_from_formset(formset))
+            pdf_cache.invalidate_document(quote)
             messages.success(request, "Quote saved successfully.")
             return redirect('quote_detail', pk=quote.pk)
     else:
@@ -309,6 +449,7 @@ def quote_update(request, pk):
 def quote_delete(request, pk):
     quote = get_object_or_404(Quote, pk=pk, user=request.user)
     if request.method == 'POST':
+        pdf_cache.invalidate_document(quote)
         quote.delete()
         messages.success(request, "Quote has been deleted.")
         return redirect('quote_list')
@@ -317,14 +458,27 @@ def quote_delete(request, pk):
 
 def quote_public_view(request, public_id):
     """A public view for a customer to see their quote."""
-    quote = get_object_or_404(Quote, public_id=public_id)
+    queryset = Quote.objects.filter(public_id=public_id)
+    # Only anonymous visitors (the customer) get validators: signed-in pages also
+    # show the owner's navigation and notifications, which the validators don't cover.
+    validators = None
+    if not request.user.is_authenticated:
+        validators = http_cache.document_validators(queryset, ['invoices/base.html', 'invoices/quote_public.html'])
+        response = http_cache.not_modified(request, validators) if validators else None
+        if response is not None:
+            return http_cache.add_validators(response, validators)
+
+    quote = get_object_or_404(queryset.select_related('customer', 'user__profile'))
     # We pass the profile of the user who CREATED the quote
     profile = quote.user.profile
     context = {
         'quote': quote,
         'profile': profile,
     }
-    return render(request, 'invoices/quote_public.html', context)
+    response = render(request, 'invoices/quote_public.html', context)
+    if validators:
+        http_cache.add_validators(response, validators)
+    return response
 
 
 def quote_customer_action(request, public_id):
@@ -335,20 +489,22 @@ def quote_customer_action(request, public_id):
         if action == 'accept' and quote.status in ['draft', 'sent']:
             quote.status = 'accepted'
             quote.save()
-            # Create a notification for the business owner
-            Notification.objects.create(
-                user=quote.user,
-                message=f"Quote #{quote.quote_number or quote.id} for {quote.customer.name} has been accepted.",
-                link=quote.get_absolute_url()
+            # Notify the business owner; a repeat answer on the same quote replaces the unread one.
+            notifications.notify(
+                quote.user_id,
+                f"Quote #{quote.quote_number or quote.id} for {quote.customer.name} has been accepted.",
+                link=quote.get_absolute_url(),
+                dedupe_key=f'quote:{quote.pk}',
             )
         elif action == 'reject' and quote.status in ['draft', 'sent']:
             quote.status = 'rejected'
             quote.save()
-            # Create a notification for the business owner
-            Notification.objects.create(
-                user=quote.user,
-                message=f"Quote #{quote.quote_number or quote.id} for {quote.customer.name} has been rejected.",
-                link=quote.get_absolute_url()
+            # Notify the business owner; a repeat answer on the same quote replaces the unread one.
+            notifications.notify(
+                quote.user_id,
+                f"Quote #{quote.quote_number or quote.id} for {quote.customer.name} has been rejected.",
+                link=quote.get_absolute_url(),
+                dedupe_key=f'quote:{quote.pk}',
             )
     return redirect('quote_public_view', public_id=quote.public_id)
 
@@ -359,34 +515,45 @@ def convert_quote_to_invoice(request, pk):
         messages.warning(request, "This quote has already been converted to an invoice.")
         return redirect('invoice_detail', pk=quote.invoice.pk)
 
-    new_invoice = Invoice.objects.create(
-        user=quote.user,
-        customer=quote.customer,
-        invoice_date=timezone.now().date(),
-        due_date=timezone.now().date() + timedelta(days=30),
-        tax_rate=quote.tax_rate,
-        status='unpaid'
-    )
-    for item in quote.items.all():
-        InvoiceItem.objects.create(
-            invoice=new_invoice,
-            description=item.description,
-            long_description=item.long_description,
-            quantity=item.quantity,
-            unit_price=item.unit_price
-        )
-    quote.invoice = new_invoice
-    quote.status = 'accepted'
-    quote.save()
+    converted = conversion.convert_quotes([quote.pk])
+    if quote.pk not in converted:
+        # Converted by a concurrent request since we looked.
+        messages.warning(request, "This quote has already been converted to an invoice.")
+        return redirect('quote_detail', pk=quote.pk)
+    new_invoice = converted[quote.pk]
     messages.success(request, f"Quote {quote.id} successfully converted to Invoice {new_invoice.id}.")
     return redirect('invoice_update', pk=new_invoice.pk)
 
+@login_required
+@require_POST
+def quote_bulk_convert(request):
+    """
+    Converts the picked accepted quotes (by ids and/or quote date range, or all of them) into
+    invoices in one go. Free-plan users get as many as their invoice limit still allows.
+    """
+    ids = _selected_ids(request, Quote.objects.filter(user=request.user, status='accepted', invoice__isnull=True), 'quote_date')
+    with transaction.atomic():
+        converted = conversion.convert_quotes(ids, limit=usage.remaining(request.user, Invoice, lock=True))
+    skipped = len(ids) - len(converted)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'converted': {str(quote_id): invoice.pk for quote_id, invoice in converted.items()},
+            'skipped': skipped,
+        })
+    if converted:
+        messages.success(request, f"{len(converted)} quote(s) converted to invoices.")
+    if skipped:
+        messages.warning(request, f"{skipped} quote(s) were not converted: they were converted meanwhile or the Free Plan invoice limit was reached.")
+    if not ids:
+        messages.warning(request, "No accepted quotes are waiting to be invoiced.")
+    return redirect('invoice_list')
+
 # --- Notifications ---
 
 @login_required
 def mark_notifications_as_read(request):
     """Marks all unread notifications for the current user as read."""
-    request.user.notifications.filter(is_read=False).update(is_read=True)
+    notifications.mark_all_read(request.user)
     return redirect(request.META.get('HTTP_REFERER', 'dashboard'))
 
 @login_required
@@ -394,6 +561,38 @@ def profile_view(request):
     """Displays the user's profile hub page."""
     return render(request, 'invoices/profile.html', {'title': 'My Profile'})
 
+# --- Bulk Import & Export ---
+
+@login_required
+def import_data(request):
+    """Imports customers, inventory items or invoices from an uploaded CSV/XLSX file (see imports.py)."""
+    result = None
+    if request.method == 'POST':
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = imports.run_import(form.cleaned_data['kind'], request.user, upload, upload.name)
+            except spreadsheets.SpreadsheetError as error:
+                form.add_error('file', str(error))
+    else:
+        form = ImportForm(initial={'kind': request.GET.get('kind')})
+    return render(request, 'invoices/import.html', {'form': form, 'result': result, 'title': 'Import Data'})
+
+@login_required
+def export_data(request):
+    """Streams the user's invoices or quotes as a CSV/XLSX download (see exports.py)."""
+    if 'format' not in request.GET:
+        form = ExportForm(initial={'kind': request.GET.get('kind'), 'detail': 'documents', 'format': 'xlsx'})
+    else:
+        form = ExportForm(request.GET)
+        if form.is_valid():
+            data = form.cleaned_data
+            return exports.response(
+                data['kind'], request.user, data['format'], data['date_from'], data['date_to'], lines=data['detail'] == 'lines'
+            )
+    return render(request, 'invoices/export.html', {'form': form, 'title': 'Export Data'})
+
 # --- Settings & Subscription ---
 
 @login_required
@@ -402,7 +601,10 @@ def settings_update(request):
     if request.method == 'POST':
         form = ProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
-            form.save()
+            profile = form.save()
+            pdf_cache.invalidate_user(request.user)
+            if 'logo' in form.changed_data:
+                pdf_assets.prime(profile.logo)
             messages.success(request, "Your settings have been updated.")
             return redirect('settings_update')
     else:
@@ -411,16 +613,15 @@ def settings_update(request):
 
 @login_required
 def subscription_detail(request):
-    # Ensure subscription exists, creating it if necessary.
-    subscription, created = Subscription.objects.get_or_create(user=request.user)
+    counter = usage.get_counter(request.user)
 
     # This context is needed for the template's logic
     context = {
-        'subscription': subscription,
+        'subscription': _subscription(request.user),
         'title': 'My Subscription',
-        'invoice_count': Invoice.objects.filter(user=request.user).count(),
-        'quote_count': Quote.objects.filter(user=request.user).count(),
-        'customer_count': Customer.objects.filter(user=request.user).count(),
+        'invoice_count': counter.invoice_count,
+        'quote_count': counter.quote_count,
+        'customer_count': counter.customer_count,
         # Pass settings constants to the template
         'settings': {'FREE_PLAN_ITEM_LIMIT': settings.FREE_PLAN_ITEM_LIMIT},
         'pro_plan_price': settings.PRO_PLAN_PRICE,
@@ -560,52 +761,162 @@ def payfast_cancel(request):
 
 # --- PDF & PWA Views ---
 
-def invoice_public_pdf(request, public_id):
-    """A public view for a customer to download their invoice PDF."""
-    invoice = get_object_or_404(Invoice, public_id=public_id)
-    # We need the profile and user of the person who CREATED the invoice
-    profile = invoice.user.profile
-    user = invoice.user
-    context = {
-        'invoice': invoice,
-        'profile': profile,
-        'user': user,
-    }
-    html_string = render_to_string('invoices/invoice_pdf.html', context)
-    html = HTML(string=html_string, base_url=request.build_absolute_uri())
-    pdf = html.write_pdf()
+def _pdf_response(request, document, public=False):
+    """
+    Serves a document PDF from the PDF cache, rendering it on a miss.
+    In async mode a miss is handed to the background PDF worker instead, and
+    with PDF_REDIRECT_TO_STORAGE a cached PDF behind a public link is served by the storage
+    backend directly. `public` means the visitor came through the document's public link, which the job's
+    status and download URLs then carry so they work without logging in.
+    """
+    base_url = request.build_absolute_uri()
+    if settings.PDF_REDIRECT_TO_STORAGE and public:
+        # The storage URL needs no login and never expires, so private PDFs are always streamed.
+        entry = pdf_cache.get_entry(document)
+        if entry is not None:
+            return redirect(entry.file.url)
+    if settings.PDF_ASYNC_RENDERING or request.GET.get('async') == '1':
+        pdf = pdf_cache.get_cached(document)
+        if pdf is None:
+            job = pdf_jobs.enqueue(document, base_url=base_url)
+            public_id = document.public_id if public else None
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse(_pdf_job_payload(job, public_id), status=202)
+            return redirect(_pdf_job_url('pdf_job_status', job, public_id, redirect=1))
+    else:
+        pdf = rendering.get_document_pdf(document, base_url=base_url)
     response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="invoice-{invoice.invoice_number or invoice.id}.pdf"'
+    response['Content-Disposition'] = f'attachment; filename="{rendering.pdf_filename(document)}"'
     return response
 
+def _conditional_pdf_response(request, queryset, public=False):
+    """
+    Answers If-None-Match/If-Modified-Since from the document's timestamps with a 304,
+    and only renders (or fetches) the PDF when the client's copy is out of date.
+    """
+    template_name = f'invoices/{queryset.model._meta.model_name}_pdf.html'
+    validators = http_cache.document_validators(queryset, [template_name])
+    if validators is None:
+        raise Http404("No document found.")
+    response = http_cache.not_modified(request, validators)
+    if response is None:
+        document = get_object_or_404(queryset.select_related('customer', 'user__profile'))
+        response = _pdf_response(request, document, public=public)
+        if response.status_code != 200:
+            # A queued background render or a redirect is not the document itself.
+            return response
+    return http_cache.add_validators(response, validators, public=public)
+
+def invoice_public_pdf(request, public_id):
+    """A public view for a customer to download their invoice PDF."""
+    # The PDF uses the profile and user of the person who CREATED the invoice
+    return _conditional_pdf_response(request, Invoice.objects.filter(public_id=public_id), public=True)
+
 @login_required
 def invoice_pdf(request, pk):
-    invoice = get_object_or_404(Invoice, pk=pk, user=request.user)
-    context = {
-        'invoice': invoice,
-        'profile': request.user.profile,
-        'user': request.user, # Add user to context
-    }
-    html_string = render_to_string('invoices/invoice_pdf.html', context)
-    html = HTML(string=html_string, base_url=request.build_absolute_uri())
-    pdf = html.write_pdf()
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="invoice-{invoice.invoice_number or invoice.id}.pdf"'
-    return response
+    return _conditional_pdf_response(request, Invoice.objects.filter(pk=pk, user=request.user))
 
 @login_required
 def quote_pdf(request, pk):
-    quote = get_object_or_404(Quote, pk=pk, user=request.user)
-    context = {
-        'quote': quote,
-        'profile': request.user.profile,
-        'user': request.user, # Add user to context
+    return _conditional_pdf_response(request, Quote.objects.filter(pk=pk, user=request.user))
+
+def _selected_ids(request, queryset, date_field):
+    """Returns the ids of the documents picked for a bulk action, by explicit ids and/or a date range."""
+    ids = request.POST.getlist('ids')
+    if ids:
+        queryset = queryset.filter(pk__in=[pk for pk in ids if pk.isdigit()])
+    date_from = parse_date(request.POST.get('date_from') or '')
+    date_to = parse_date(request.POST.get('date_to') or '')
+    if date_from:
+        queryset = queryset.filter(**{f'{date_field}__gte': date_from})
+    if date_to:
+        queryset = queryset.filter(**{f'{date_field}__lte': date_to})
+    return list(queryset.order_by(date_field, 'id').values_list('pk', flat=True))
+
+@login_required
+@require_POST
+def invoice_bulk_pdf(request):
+    """Streams the selected invoices' PDFs as one ZIP file, e.g. for a month-end pack."""
+    ids = _selected_ids(request, Invoice.objects.filter(user=request.user), 'invoice_date')
+    if not ids:
+        messages.warning(request, "No invoices matched your selection.")
+        return redirect('invoice_list')
+    return bulk_export.zip_response('invoice', ids, 'invoices.zip', base_url=request.build_absolute_uri('/'))
+
+@login_required
+@require_POST
+def quote_bulk_pdf(request):
+    """Streams the selected quotes' PDFs as one ZIP file."""
+    ids = _selected_ids(request, Quote.objects.filter(user=request.user), 'quote_date')
+    if not ids:
+        messages.warning(request, "No quotes matched your selection.")
+        return redirect('quote_list')
+    return bulk_export.zip_response('quote', ids, 'quotes.zip', base_url=request.build_absolute_uri('/'))
+
+def _pdf_job_url(name, job, public_id=None, **params):
+    if public_id:
+        params['public_id'] = public_id
+    url = reverse(name, args=[job.pk])
+    return f"{url}?{urlencode(params)}" if params else url
+
+def _pdf_job_payload(job, public_id=None):
+    payload = {
+        'job_id': str(job.pk),
+        'status': job.status,
+        'status_url': _pdf_job_url('pdf_job_status', job, public_id),
     }
-    html_string = render_to_string('invoices/quote_pdf.html', context)
-    html = HTML(string=html_string, base_url=request.build_absolute_uri())
-    pdf = html.write_pdf()
+    if job.status == 'done':
+        payload['download_url'] = _pdf_job_url('pdf_job_download', job, public_id)
+    elif job.status == 'failed':
+        payload['error'] = "The PDF could not be generated."
+    return payload
+
+def _get_pdf_job(request, job_id, **filters):
+    """
+    Returns a render job the visitor may see: one of their own, or one for a document whose
+    public link they followed (passed along as ?public_id=). Anyone else gets a 404.
+    """
+    job = get_object_or_404(PDFRenderJob, pk=job_id, **filters)
+    if request.user.is_authenticated and job.user_id == request.user.pk:
+        return job
+    try:
+        public_id = uuid.UUID(request.GET.get('public_id', ''))
+    except ValueError:
+        raise Http404("No PDF found.")
+    if not rendering.DOCUMENT_MODELS[job.document_type].objects.filter(pk=job.object_id, public_id=public_id).exists():
+        raise Http404("No PDF found.")
+    return job
+
+def pdf_job_status(request, job_id):
+    """
+    Reports the progress of a background PDF render to the job's owner, or to someone
+    who came through the document's public link.
+    With ?redirect=1 a browser is refreshed until the PDF is ready and then sent to it.
+    """
+    job = _get_pdf_job(request, job_id)
+    public_id = request.GET.get('public_id')
+    if request.GET.get('redirect'):
+        if job.status == 'done':
+            return redirect(_pdf_job_url('pdf_job_download', job, public_id))
+        if job.status != 'failed':
+            response = HttpResponse("Your PDF is being prepared. This page will refresh automatically.", status=202, content_type='text/plain')
+            response['Refresh'] = '2'
+            return response
+    return JsonResponse(_pdf_job_payload(job, public_id))
+
+def pdf_job_download(request, job_id):
+    """Serves the PDF produced by a finished background render job, with the same access rules as its status."""
+    job = _get_pdf_job(request, job_id, status='done')
+    if job.file:
+        filename = job.file.name.rsplit('/', 1)[-1]
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=filename, content_type='application/pdf')
+    # The worker left the PDF in the PDF cache rather than keeping a copy on the job.
+    document = rendering.DOCUMENT_MODELS[job.document_type].objects.filter(pk=job.object_id).select_related('customer', 'user__profile').first()
+    pdf = pdf_cache.get_cached(document) if document is not None else None
+    if pdf is None:
+        raise Http404("This PDF is no longer available.")
     response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="quote-{quote.quote_number or quote.id}.pdf"'
+    response['Content-Disposition'] = f'attachment; filename="{rendering.pdf_filename(document)}"'
     return response
 
 # --- PWA Views ---
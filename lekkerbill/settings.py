@@ -103,6 +103,13 @@ else:
         }
     }
 
+# Loads the user's profile and subscription in the same query as the user (see invoices/accounts.py).
+# ModelBackend stays listed so sessions that logged in through it remain valid.
+AUTHENTICATION_BACKENDS = [
+    'invoices.accounts.AccountBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # --- Password Validation ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -131,9 +138,13 @@ LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 SITE_ID = 1
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+# The invoice/quote editors post 6 fields per line item; Django's default of 1000 rejects ~165+ lines.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
 
 # --- Custom App & PayFast Settings ---
 FREE_PLAN_ITEM_LIMIT = 5
+# Rows per page on the invoice, quote, customer and inventory lists (keyset paginated).
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '50'))
 PRO_PLAN_PRICE = Decimal('69.00')
 
 PAYFAST_MERCHANT_ID = os.getenv('PAYFAST_MERCHANT_ID', '10040564')
@@ -141,6 +152,55 @@ PAYFAST_MERCHANT_KEY = os.getenv('PAYFAST_MERCHANT_KEY', '44jyetpmptdyc')
 PAYFAST_PASSPHRASE = os.getenv('PAYFAST_PASSPHRASE')  # Can be None
 PAYFAST_SANDBOX_MODE = os.getenv('PAYFAST_SANDBOX_MODE', str(DEBUG)) == 'True'
 
+# --- Cache ---
+# The dashboard stats, notification menu, entitlements and (optionally) accounts are cached here, so
+# production should share one cache between web workers: set CACHE_URL to redis://host:6379/0 (needs
+# the `redis` package) or memcached://host:11211 (needs `pymemcache`). CACHE_URL=db uses a database
+# table, created by `createcachetable` in run_release_tasks.py; every hit is then still a query.
+# Unset, development (DEBUG) gets a per-process in-memory cache and production falls back to the table.
+CACHE_URL = os.getenv('CACHE_URL', '' if DEBUG else 'db')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+elif CACHE_URL.startswith('memcached://'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache', 'LOCATION': CACHE_URL.removeprefix('memcached://')}}
+elif CACHE_URL == 'db':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'lekkerbill_cache'}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+DASHBOARD_STATS_TIMEOUT = 15 * 60  # Seconds; saves and deletes invalidate sooner
+NOTIFICATION_CACHE_TIMEOUT = 60 * 60  # Seconds; new and read notifications invalidate sooner
+NOTIFICATION_UNREAD_LIMIT = 100  # Older unread notifications beyond this many are marked read
+NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 90))  # Read notifications older than this are pruned
+ENTITLEMENT_CACHE_TIMEOUT = 60 * 60  # Seconds; subscription changes invalidate sooner, and Pro ends with its paid period
+# Seconds to cache the signed-in user with their profile and subscription. Off by default: with the
+# database cache a hit costs the same single query as loading them; enable it with a Redis/memcached CACHE_URL.
+ACCOUNT_CACHE_TIMEOUT = int(os.getenv('ACCOUNT_CACHE_TIMEOUT', 0))
+
+# --- PDF Cache ---
+# Rendered invoice/quote PDFs are stored in the default storage, keyed by a hash of their inputs.
+PDF_CACHE_ENABLED = os.getenv('PDF_CACHE_ENABLED', 'True') == 'True'
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+PDF_CACHE_MAX_ENTRIES = int(os.getenv('PDF_CACHE_MAX_ENTRIES', 5000))
+PDF_CACHE_VERSION = '1'  # Bump to discard every cached PDF after a rendering change
+
+# --- Background PDF Rendering ---
+# When enabled, PDF downloads are queued for the `run_pdf_worker` process instead of rendering inline.
+PDF_ASYNC_RENDERING = os.getenv('PDF_ASYNC_RENDERING', 'False') == 'True'
+PDF_WORKER_PROCESSES = int(os.getenv('PDF_WORKER_PROCESSES', 0))  # 0 = one per CPU core
+PDF_JOB_TIMEOUT = 300  # Seconds before a running job is assumed lost and re-queued
+PDF_JOB_RETENTION = 24 * 60 * 60  # Seconds to keep finished jobs and their files
+# Queue a render as soon as an invoice is unpaid/paid or a quote is sent, so downloads hit the cache.
+PDF_PRERENDER_ON_SAVE = os.getenv('PDF_PRERENDER_ON_SAVE', 'False') == 'True'
+# Redirect public-link PDF downloads to the stored file (e.g. on Spaces) instead of streaming it through Django.
+# Storage URLs need no login and don't expire, so PDFs behind a login are always streamed.
+PDF_REDIRECT_TO_STORAGE = os.getenv('PDF_REDIRECT_TO_STORAGE', 'False') == 'True'
+
+# --- PDF Assets ---
+# Logos and other media used in PDFs are cached locally instead of being fetched over HTTP during rendering.
+PDF_ASSET_CACHE_DIR = os.getenv('PDF_ASSET_CACHE_DIR')  # Defaults to a folder in the system temp dir
+PDF_ASSET_FETCH_TIMEOUT = 3  # Seconds to wait on the storage backend before falling back to a cached copy
+PDF_ASSET_MTIME_TTL = 300  # Seconds before a cached file's modification time is checked again
+
 # --- DigitalOcean Spaces Configuration (for Media Files) ---
 if 'AWS_STORAGE_BUCKET_NAME' in os.environ:
     # Production settings using DigitalOcean Spaces
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payfast', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payfastitn',
+            name='m_payment_id',
+            field=models.CharField(blank=True, db_index=True, help_text="Merchant's internal payment ID (e.g., Subscription ID)", max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='payfastitn',
+            name='token',
+            field=models.CharField(blank=True, db_index=True, help_text="PayFast's unique token for a recurring subscription", max_length=255, null=True),
+        ),
+    ]
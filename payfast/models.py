@@ -15,8 +15,8 @@ class PayFastITN(models.Model):
     amount_gross = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
     # ✅ ADD THESE TWO NEW FIELDS
-    m_payment_id = models.CharField(max_length=255, blank=True, null=True, help_text="Merchant's internal payment ID (e.g., Subscription ID)")
-    token = models.CharField(max_length=255, blank=True, null=True, help_text="PayFast's unique token for a recurring subscription")
+    m_payment_id = models.CharField(max_length=255, blank=True, null=True, db_index=True, help_text="Merchant's internal payment ID (e.g., Subscription ID)")
+    token = models.CharField(max_length=255, blank=True, null=True, db_index=True, help_text="PayFast's unique token for a recurring subscription")
 
     # Our internal result
     result = models.CharField(max_length=255, blank=True)
@@ -5,27 +5,32 @@ import django
 from django.core.management import call_command
 
 # More verbose logging to pinpoint failures
-print("--- [STEP 1/7] Release task script started.")
+print("--- [STEP 1/8] Release task script started.")
 
 try:
     # Set up the Django environment
-    print("--- [STEP 2/7] Setting DJANGO_SETTINGS_MODULE environment variable.")
+    print("--- [STEP 2/8] Setting DJANGO_SETTINGS_MODULE environment variable.")
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lekkerbill.settings')
-    print("--- [STEP 3/7] Initializing Django with django.setup().")
+    print("--- [STEP 3/8] Initializing Django with django.setup().")
     django.setup()
     print("✅ [SUCCESS] Django initialized successfully.")
 
     # Run the migrate command
-    print("\n--- [STEP 4/7] Calling 'migrate' command...")
+    print("\n--- [STEP 4/8] Calling 'migrate' command...")
     call_command('migrate', '--noinput')
     print("✅ [SUCCESS] Database migrations completed.")
 
+    # Create the database cache table for CACHE_URL=db (does nothing if it exists or another cache is configured)
+    print("\n--- [STEP 5/8] Calling 'createcachetable' command...")
+    call_command('createcachetable')
+    print("✅ [SUCCESS] Cache table check completed.")
+
     # Run the createsu command
-    print("\n--- [STEP 5/7] Calling 'createsu' command...")
+    print("\n--- [STEP 6/8] Calling 'createsu' command...")
     call_command('createsu')
     print("✅ [SUCCESS] Superuser check completed.")
 
-    print("\n--- [STEP 6/7] All tasks finished without raising an exception.")
+    print("\n--- [STEP 7/8] All tasks finished without raising an exception.")
 
 except Exception as e:
     print(f"\n❌ [FATAL] An exception occurred during release tasks.")
@@ -38,4 +43,4 @@ except Exception as e:
     # Exit with a non-zero status code to signal failure to the platform
     sys.exit(1)
 
-print("\n--- [STEP 7/7] Script finished. ALL RELEASE TASKS COMPLETED SUCCESSFULLY ---")
\ No newline at end of file
+print("\n--- [STEP 8/8] Script finished. ALL RELEASE TASKS COMPLETED SUCCESSFULLY ---")
\ No newline at end of file
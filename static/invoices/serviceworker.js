@@ -1,6 +1,6 @@
 // Version 3: A more robust and intelligent service worker
 
-const CACHE_NAME = 'lekkerbill-cache-v2'; // Increment cache name to force update
+const CACHE_NAME = 'lekkerbill-cache-v4'; // Increment cache name to force update
 
 // Core assets that are always needed.
 const CORE_ASSETS = [
@@ -47,13 +47,41 @@ self.addEventListener('activate', event => {
 });
 
 
-// Fetch event: serves assets from the cache first (cache-first strategy).
+// Invoice/quote PDFs and public quote pages change when the document is edited.
+// The server answers them with ETag/Last-Modified, so they must go to the network
+// (a cheap 304 when unchanged) and only fall back to the cache when offline.
+const NETWORK_FIRST_PATTERNS = [/\/pdf\/$/, /\/public-pdf\//, /\/quotes\/view\//, /\/pdf-jobs\//];
+
+function isNetworkFirst(request) {
+    const url = new URL(request.url);
+    // "Load more" list pages are fetched by cursor and must reflect the current data.
+    if (url.searchParams.has('fragment') || url.searchParams.has('cursor')) {
+        return true;
+    }
+    return NETWORK_FIRST_PATTERNS.some(pattern => pattern.test(url.pathname));
+}
+
+// Fetch event: documents are network-first, everything else is served from the cache first (cache-first strategy).
 self.addEventListener('fetch', event => {
     // We only want to cache GET requests.
     if (event.request.method !== 'GET') {
         return;
     }
 
+    if (isNetworkFirst(event.request)) {
+        event.respondWith(
+            caches.open(CACHE_NAME).then(cache => {
+                return fetch(event.request).then(networkResponse => {
+                    if (networkResponse.status === 200) {
+                        cache.put(event.request, networkResponse.clone());
+                    }
+                    return networkResponse;
+                }).catch(() => cache.match(event.request));
+            })
+        );
+        return;
+    }
+
     event.respondWith(
         caches.open(CACHE_NAME).then(cache => {
             return cache.match(event.request).then(response => {